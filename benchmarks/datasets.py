@@ -0,0 +1,81 @@
+import csv
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel, Field
+
+from data_loaders.clients import (
+    SpotClient, PerpClient, OpenInterestClient,
+    FundingRateClient,
+)
+from data_loaders.csv_clients import (
+    CsvClient, CsvSpotClient, CsvPerpClient,
+    CsvOpenInterestClient, CsvFundingRateClient,
+)
+from data_loaders.loader import Loader, save_csv
+from paths import BENCHMARK_DATA_DIR
+
+if TYPE_CHECKING:
+    import binance
+
+SOURCES: dict[str, type[CsvClient]] = {
+    'spot': CsvSpotClient,
+    'perp': CsvPerpClient,
+    'open_interest': CsvOpenInterestClient,
+    'funding_rate': CsvFundingRateClient,
+}
+
+ANCHOR = datetime(year=2024, month=9, day=12, hour=7, minute=0, second=0, tzinfo=timezone.utc)
+
+
+class Dataset(BaseModel):
+    name: str = Field(description="Name of the dataset")
+    start_time: datetime = Field(description="Start of the recorded window in UTC")
+    end_time: datetime = Field(description="End of the recorded window in UTC")
+
+    @property
+    def directory(self) -> Path:
+        return BENCHMARK_DATA_DIR / self.name
+
+    def path(self, source: str) -> Path:
+        return self.directory / f'{source}.csv'
+
+    def is_recorded(self) -> bool:
+        return all(self.path(source).exists() for source in SOURCES)
+
+
+DATASETS = {
+    dataset.name: dataset for dataset in (
+        Dataset(name='1h', start_time=ANCHOR, end_time=ANCHOR + timedelta(hours=1)),
+        Dataset(name='1d', start_time=ANCHOR, end_time=ANCHOR + timedelta(days=1)),
+        Dataset(name='30d', start_time=ANCHOR, end_time=ANCHOR + timedelta(days=30)),
+    )
+}
+
+
+def record(dataset: Dataset, client: 'binance.Client') -> None:
+    """
+    Downloads the dataset window from Binance once, so benchmarks never touch the network
+    """
+    dataset.directory.mkdir(parents=True, exist_ok=True)
+    for source, data_client in {
+        'spot': SpotClient(client=client),
+        'perp': PerpClient(client=client),
+        'open_interest': OpenInterestClient(client=client),
+        'funding_rate': FundingRateClient(client=client),
+    }.items():
+        loader = Loader(data_client=data_client)
+        save_csv(loader.load(start_time=dataset.start_time, end_time=dataset.end_time), dataset.path(source))
+
+
+def recorded_clients(dataset: Dataset) -> dict[str, CsvClient]:
+    return {source: client_class(path=dataset.path(source)) for source, client_class in SOURCES.items()}
+
+
+def count_trades(dataset: Dataset) -> int:
+    trades = 0
+    for source in ('spot', 'perp'):
+        with open(dataset.path(source), newline='') as csv_file:
+            trades += sum(1 for _ in csv.DictReader(csv_file))
+    return trades
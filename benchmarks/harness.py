@@ -0,0 +1,218 @@
+import argparse
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Sized
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+
+from pydantic import BaseModel, Field
+
+from benchmarks.datasets import DATASETS, Dataset, count_trades, record, recorded_clients
+from data_loaders.clients import IClient
+from paths import ROOT_DIR
+
+if TYPE_CHECKING:
+    from data_processors.lazy import LazyCandleProcessor
+    from data_processors.numpy_engine import NumpyCandleProcessor
+    from data_processors.pandas_dataframe import PandasCandleProcessor
+
+
+# processors are imported by their factories, so a case pays only for the imports of its own engine
+def _lazy_processor(clients: dict[str, IClient]) -> 'LazyCandleProcessor':
+    from data_processors.candle_filler import CandleFiller
+    from data_processors.lazy import LazyCandleProcessor
+
+    return LazyCandleProcessor(
+        spot_client=clients['spot'],
+        perp_client=clients['perp'],
+        open_interest_client=clients['open_interest'],
+        funding_rate_client=clients['funding_rate'],
+        candle_filler=CandleFiller(),
+    )
+
+
+def _pandas_processor(clients: dict[str, IClient]) -> 'PandasCandleProcessor':
+    from data_processors.pandas_dataframe import PandasCandleProcessor
+
+    return PandasCandleProcessor(
+        spot_client=clients['spot'],
+        perp_client=clients['perp'],
+        open_interest_client=clients['open_interest'],
+        funding_rate_client=clients['funding_rate'],
+    )
+
+
+def _numpy_processor(clients: dict[str, IClient]) -> 'NumpyCandleProcessor':
+    from data_processors.numpy_engine import NumpyCandleProcessor
+
+    return NumpyCandleProcessor(
+        spot_client=clients['spot'],
+        perp_client=clients['perp'],
+        open_interest_client=clients['open_interest'],
+        funding_rate_client=clients['funding_rate'],
+    )
+
+
+PROCESSORS: dict[str, Callable[[dict[str, IClient]], Any]] = {
+    'lazy': _lazy_processor,
+    'pandas': _pandas_processor,
+    'numpy': _numpy_processor,
+}
+
+# module of every processor, its import time is measured in a fresh interpreter
+PROCESSOR_MODULES = {
+    'lazy': 'data_processors.lazy',
+    'pandas': 'data_processors.pandas_dataframe',
+    'numpy': 'data_processors.numpy_engine',
+}
+
+
+class CaseResult(BaseModel):
+    processor: str = Field(description="Name of the processor")
+    dataset: str = Field(description="Name of the recorded dataset")
+    trades: int = Field(description="Spot and perp trades in the dataset")
+    candles: int = Field(description="Candles produced by a single run")
+    wall_times: list[float] = Field(description="Wall time of every run in seconds")
+    wall_time_mean: float = Field(description="Mean wall time in seconds")
+    wall_time_min: float = Field(description="Best wall time in seconds")
+    trades_per_second: float = Field(description="Trades processed per second of mean wall time")
+    peak_rss_bytes: int = Field(description="Peak resident set size of the process running the case")
+    import_seconds: float = Field(
+        description="Best time of importing the processor module in a fresh interpreter above a bare interpreter"
+    )
+    peak_traced_bytes_per_candle: float | None = Field(
+        None,
+        description="Peak of python memory traced by tracemalloc during one run divided by candles, "
+                    "memory held at once rather than the total allocated",
+    )
+
+
+class BenchmarkReport(BaseModel):
+    created_at: datetime = Field(description="Time the report was created in UTC")
+    python: str = Field(description="Python version")
+    platform: str = Field(description="Platform the benchmark ran on")
+    results: list[CaseResult] = Field(description="Results per processor and dataset")
+
+
+def drain(output: Iterable | Sized) -> int:
+    """
+    Consumes processor output completely, lazy processors do no work until iterated
+    """
+    if isinstance(output, Sized):
+        return len(output)
+    return sum(1 for _ in output)
+
+
+def _peak_rss_bytes() -> int:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+def measure_import_seconds(module: str, runs: int = 3) -> float:
+    """
+    Startup time `module` adds to an entry point: the best time of importing it in a fresh interpreter
+    minus the best startup time of an interpreter importing nothing
+    """
+    def best_wall_time(code: str) -> float:
+        wall_times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, check=True)
+            wall_times.append(time.perf_counter() - start)
+        return min(wall_times)
+
+    return max(best_wall_time(f'import {module}') - best_wall_time('pass'), 0.0)
+
+
+def run_case(processor_name: str, dataset: Dataset, runs: int, trace_allocations: bool) -> CaseResult:
+    processor = PROCESSORS[processor_name](recorded_clients(dataset))
+    trades = count_trades(dataset)
+
+    # warmup file caches
+    drain(processor.process(start_time=dataset.start_time, end_time=dataset.end_time))
+
+    wall_times = []
+    candles = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        candles = drain(processor.process(start_time=dataset.start_time, end_time=dataset.end_time))
+        wall_times.append(time.perf_counter() - start)
+    peak_rss_bytes = _peak_rss_bytes()
+
+    peak_traced_bytes_per_candle = None
+    if trace_allocations and candles:
+        tracemalloc.start()
+        drain(processor.process(start_time=dataset.start_time, end_time=dataset.end_time))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_traced_bytes_per_candle = peak / candles
+
+    wall_time_mean = sum(wall_times) / len(wall_times)
+    return CaseResult(
+        processor=processor_name,
+        dataset=dataset.name,
+        trades=trades,
+        candles=candles,
+        wall_times=wall_times,
+        wall_time_mean=wall_time_mean,
+        wall_time_min=min(wall_times),
+        trades_per_second=trades / wall_time_mean if wall_time_mean else 0.0,
+        peak_rss_bytes=peak_rss_bytes,
+        import_seconds=measure_import_seconds(PROCESSOR_MODULES[processor_name]),
+        peak_traced_bytes_per_candle=peak_traced_bytes_per_candle,
+    )
+
+
+def run(
+    processor_names: Iterable[str], datasets: Iterable[Dataset], runs: int, trace_allocations: bool,
+) -> BenchmarkReport:
+    results = []
+    for dataset in datasets:
+        if not dataset.is_recorded():
+            raise FileNotFoundError(f'Dataset {dataset.name} is not recorded, run with --record first')
+        for processor_name in processor_names:
+            # fresh interpreter per case, so peak rss belongs to that case only
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                results.append(
+                    executor.submit(run_case, processor_name, dataset, runs, trace_allocations).result()
+                )
+    return BenchmarkReport(
+        created_at=datetime.now(timezone.utc),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        results=results,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description='Benchmarks candle processors on recorded datasets')
+    parser.add_argument('--processor', choices=PROCESSORS, action='append', help='Processor to run, all by default')
+    parser.add_argument('--dataset', choices=DATASETS, action='append', help='Dataset to run, all by default')
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs per case')
+    parser.add_argument('--no-allocations', action='store_true', help='Skip the traced run measuring the peak traced memory')
+    parser.add_argument('--record', action='store_true', help='Download datasets that are not recorded yet')
+    args = parser.parse_args(argv)
+
+    datasets = [DATASETS[name] for name in args.dataset or DATASETS]
+    if args.record:
+        import binance
+
+        client = binance.Client()
+        for dataset in datasets:
+            if not dataset.is_recorded():
+                record(dataset, client)
+
+    report = run(
+        processor_names=args.processor or list(PROCESSORS),
+        datasets=datasets,
+        runs=args.runs,
+        trace_allocations=not args.no_allocations,
+    )
+    print(report.model_dump_json(indent=2))
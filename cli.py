@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from paths import CHECKPOINT_DIR, PROCESSED_DIR, SHARED_MEMORY_DIR, STORE_DIR
+
+# Every subcommand imports the engine, sources and sinks it uses inside its handler,
+# so e.g. an incremental run of the lazy engine never imports pandas and only the network sources import binance.
+
+ENGINES = ('lazy', 'pandas', 'numpy')
+SOURCES = ('api', 'recorded', 'store')
+FORMATS = ('ipc', 'stream', 'parquet', 'ring')
+
+
+def parse_time(value: str) -> datetime:
+    """
+    ISO 8601 time, UTC unless it has an offset
+    """
+    time = datetime.fromisoformat(value)
+    return time if time.tzinfo is not None else time.replace(tzinfo=timezone.utc)
+
+
+def api_clients() -> dict:
+    import binance
+
+    from data_loaders.cache import DiskCache
+    from data_loaders.clients import SpotClient, PerpClient, OpenInterestClient, FundingRateClient
+    from data_loaders.rate_limit import RequestScheduler
+
+    client = binance.Client()
+    cache = DiskCache()
+    scheduler = RequestScheduler()
+    return {
+        'spot': SpotClient(client=client, cache=cache, scheduler=scheduler, compact=True),
+        'perp': PerpClient(client=client, cache=cache, scheduler=scheduler, compact=True),
+        'open_interest': OpenInterestClient(client=client, cache=cache, scheduler=scheduler),
+        'funding_rate': FundingRateClient(client=client, cache=cache, scheduler=scheduler),
+    }
+
+
+def store_clients() -> dict:
+    from data_loaders.store import ColumnarStore
+    from data_loaders.store_clients import (
+        StoreSpotClient, StorePerpClient, StoreOpenInterestClient, StoreFundingRateClient,
+    )
+
+    store = ColumnarStore()
+    return {
+        'spot': StoreSpotClient(store),
+        'perp': StorePerpClient(store),
+        'open_interest': StoreOpenInterestClient(store),
+        'funding_rate': StoreFundingRateClient(store),
+    }
+
+
+def processor(engine: str, clients: dict, symbol: str):
+    client_arguments = {
+        'spot_client': clients['spot'],
+        'perp_client': clients['perp'],
+        'open_interest_client': clients['open_interest'],
+        'funding_rate_client': clients['funding_rate'],
+    }
+    if engine == 'pandas':
+        from data_processors.pandas_dataframe import PandasCandleProcessor
+
+        return PandasCandleProcessor(**client_arguments, symbol=symbol)
+    if engine == 'numpy':
+        from data_processors.numpy_engine import NumpyCandleProcessor
+
+        return NumpyCandleProcessor(**client_arguments, symbol=symbol)
+    from data_processors.candle_filler import CandleFiller
+    from data_processors.lazy import LazyCandleProcessor
+
+    return LazyCandleProcessor(**client_arguments, candle_filler=CandleFiller(), symbol=symbol)
+
+
+def process(args: argparse.Namespace):
+    if args.source == 'recorded':
+        from benchmarks.datasets import DATASETS, recorded_clients
+
+        dataset = DATASETS[args.dataset]
+        start_time, end_time = dataset.start_time, dataset.end_time
+        clients = recorded_clients(dataset)
+    else:
+        start_time, end_time = args.start, args.end
+        clients = store_clients() if args.source == 'store' else api_clients()
+
+    candles = processor(args.engine, clients, args.symbol).process(start_time=start_time, end_time=end_time)
+    if args.format == 'ring':
+        from data_processors.sinks import SharedMemoryCandleSink
+
+        output = args.output or SHARED_MEMORY_DIR / f'candles_{args.symbol}'
+        with SharedMemoryCandleSink(output) as sink:
+            sink.write_candles(candles)
+    else:
+        from data_processors.sinks import ArrowCandleSink
+
+        suffix = '.parquet' if args.format == 'parquet' else '.arrow'
+        output = args.output or PROCESSED_DIR / f'result_{args.engine}{suffix}'
+        with ArrowCandleSink(output, format=args.format) as sink:
+            if args.engine == 'lazy':
+                sink.write_candles(candles)
+            else:
+                sink.write_frame(candles)
+    print(f'Wrote {sink.written} candles to {output}')
+
+
+def load(args: argparse.Namespace):
+    from contextlib import closing
+
+    from data_loaders.checkpoint import CheckpointStore
+    from data_loaders.loader import Loader
+    from data_loaders.store import ColumnarStore
+
+    store = ColumnarStore(root=args.store)
+    checkpoints = CheckpointStore(root=args.checkpoints)
+    for data_name, data_client in api_clients().items():
+        loader = Loader(data_client=data_client, symbol=args.symbol, checkpoints=checkpoints)
+        with closing(loader.load(start_time=args.start, end_time=args.end)) as all_data:
+            written = store.write(data_name, args.symbol, all_data)
+        print(f'Saved {written} rows of {data_name} to {store.index_path(data_name, args.symbol).parent}')
+
+
+def incremental(args: argparse.Namespace):
+    from data_processors.incremental import IncrementalCandleRunner, lazy_processor, pandas_processor
+
+    clients = api_clients()
+    # the lazy engine keeps the state and output of `python data_processors/incremental.py`
+    suffix = '' if args.engine == 'lazy' else f'_{args.engine}'
+    runner = IncrementalCandleRunner(
+        spot_client=clients['spot'],
+        perp_client=clients['perp'],
+        open_interest_client=clients['open_interest'],
+        funding_rate_client=clients['funding_rate'],
+        state_path=PROCESSED_DIR / f'incremental_state{suffix}.json',
+        output_path=PROCESSED_DIR / f'result_incremental{suffix}.csv',
+        processor_factory=pandas_processor if args.engine == 'pandas' else lazy_processor,
+    )
+    appended = runner.run(start_time=args.start, end_time=args.end)
+    print(f'Appended {appended} candles')
+
+
+def stream(args: argparse.Namespace):
+    from data_processors.streaming import main
+
+    asyncio.run(main())
+
+
+def benchmark(harness_args: list[str]):
+    from benchmarks.harness import main
+
+    main(harness_args)
+
+
+def _add_window(parser: argparse.ArgumentParser, window: timedelta):
+    now = datetime.now(timezone.utc)
+    parser.add_argument('--start', type=parse_time, default=now - window, help='Start of the window, ISO 8601 in UTC')
+    parser.add_argument('--end', type=parse_time, default=now, help='End of the window, ISO 8601 in UTC')
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description='Loads market data and processes it into candles')
+    parser.add_argument(
+        '--metrics', type=Path, help='Writes metrics when the command ends, JSON for a .json path, Prometheus text otherwise',
+    )
+    parser.add_argument('--metrics-port', type=int, help='Serves /metrics and /metrics.json while the command runs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    process_parser = subparsers.add_parser('process', help='Processes a window into candles')
+    process_parser.add_argument('--engine', choices=ENGINES, default='lazy', help='Candle processor')
+    process_parser.add_argument('--source', choices=SOURCES, default='api', help='Where the data comes from')
+    process_parser.add_argument(
+        '--dataset', default='1h', help='Recorded benchmark dataset of the recorded source, a name of DATASETS',
+    )
+    process_parser.add_argument('--symbol', default='BTCUSDT')
+    process_parser.add_argument('--format', choices=FORMATS, default='ipc', help='Arrow output or shared-memory ring')
+    process_parser.add_argument('--output', type=Path, help='Output path, derived from the engine by default')
+    _add_window(process_parser, timedelta(days=1))
+
+    load_parser = subparsers.add_parser('load', help='Loads a window of every source into the columnar store')
+    load_parser.add_argument('--symbol', default='BTCUSDT')
+    load_parser.add_argument('--store', type=Path, default=STORE_DIR, help='Directory of the columnar store')
+    load_parser.add_argument('--checkpoints', type=Path, default=CHECKPOINT_DIR, help='Directory of load checkpoints')
+    _add_window(load_parser, timedelta(days=1))
+
+    incremental_parser = subparsers.add_parser('incremental', help='Appends candles closed since the last run')
+    incremental_parser.add_argument('--engine', choices=ENGINES[:2], default='lazy', help='Candle processor')
+    _add_window(incremental_parser, timedelta(days=1))
+
+    subparsers.add_parser('stream', help='Builds live candles from the exchange streams')
+    subparsers.add_parser('benchmark', help='Runs the benchmark harness, other arguments are passed to it')
+
+    args, harness_args = parser.parse_known_args(argv)
+    if args.command == 'benchmark':
+        benchmark(harness_args)
+        return
+    if harness_args:
+        parser.error(f'unrecognized arguments: {" ".join(harness_args)}')
+    if args.command == 'process':
+        if args.engine != 'lazy' and args.format == 'ring':
+            parser.error('only the lazy engine publishes to the ring')
+        if args.source == 'recorded':
+            # choices would import the benchmarks and binance for every command
+            from benchmarks.datasets import DATASETS
+
+            if args.dataset not in DATASETS:
+                names = ', '.join(sorted(DATASETS))
+                process_parser.error(f'argument --dataset: invalid choice: {args.dataset!r} (choose from {names})')
+
+    from data_loaders.metrics import METRICS
+
+    server = METRICS.serve(args.metrics_port) if args.metrics_port is not None else None
+    try:
+        {'process': process, 'load': load, 'incremental': incremental, 'stream': stream}[args.command](args)
+    finally:
+        if args.metrics is not None:
+            METRICS.write(args.metrics)
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+import abc
+import asyncio
+import json
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Generic, Mapping
+
+import aiohttp
+
+from data_loaders.cache import ICache, DiskCache, window_key, is_settled_window, from_id_key, is_settled_page
+from data_loaders.clients import TData, USED_WEIGHT_HEADER, TRADES_PAGE_LIMIT
+from data_loaders.decoders import decode_trades
+from data_loaders.metrics import PAGE_FETCH_SECONDS, PAGE_SIZE, DECODE_SECONDS
+from data_loaders.models.compact_trade import CompactTrade, CompactFutureTrade
+from data_loaders.models.funding_rate import FundingRate
+from data_loaders.models.open_interest import OpenInterest, Period
+from data_loaders.models.trade import Trade, FutureTrade
+from data_loaders.rate_limit import RequestScheduler, ENDPOINTS, default_scheduler
+from data_loaders.time_conversion import to_timestamp, as_timestamp
+
+# base url of every pool of endpoints, replaced by the url of a stub server in tests
+BASE_URLS = {
+    'spot': 'https://api.binance.com',
+    'futures': 'https://fapi.binance.com',
+}
+
+PATHS = {
+    'aggTrades': '/api/v3/aggTrades',
+    'futures/aggTrades': '/fapi/v1/aggTrades',
+    'futures/openInterestHist': '/futures/data/openInterestHist',
+    'futures/fundingRate': '/fapi/v1/fundingRate',
+}
+
+
+class AsyncTransport:
+    """
+    One aiohttp session shared by the async clients: keep-alive connections are pooled and limited per host,
+    and every endpoint has at most `max_in_flight` requests in flight.
+    Requests are paced by the scheduler, the process-wide `default_scheduler()` unless one is given,
+    throttled requests are retried after its backoff
+    """
+    def __init__(
+        self,
+        base_urls: Mapping[str, str] = BASE_URLS,
+        scheduler: RequestScheduler | None = None,
+        limit_per_host: int = 16,
+        max_in_flight: int = 8,
+        keepalive_timeout: float = 30.0,
+        timeout: timedelta = timedelta(seconds=30),
+    ):
+        """
+        :param base_urls: base url of every pool of `ENDPOINTS`
+        :param limit_per_host: open connections per host
+        :param max_in_flight: requests in flight per endpoint
+        :param keepalive_timeout: seconds an idle connection is kept open for the next request
+        """
+        self._base_urls = dict(base_urls)
+        self._scheduler = scheduler if scheduler is not None else default_scheduler()
+        self._limit_per_host = limit_per_host
+        self._max_in_flight = max_in_flight
+        self._keepalive_timeout = keepalive_timeout
+        self._timeout = timeout
+        self._session: aiohttp.ClientSession | None = None
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self) -> 'AsyncTransport':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, endpoint: str, **params) -> list[dict]:
+        pool, _ = ENDPOINTS[endpoint]
+        url = self._base_urls[pool] + PATHS[endpoint]
+        params = {name: str(value) for name, value in params.items()}
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(self._max_in_flight)
+
+        async with semaphore:
+            attempt = 0
+            while True:
+                await asyncio.to_thread(self._scheduler.acquire, endpoint)
+                async with self._get_session().get(url, params=params) as response:
+                    text = await response.text()
+                    if response.status >= 300:
+                        from binance.exceptions import BinanceAPIException
+
+                        error = BinanceAPIException(response, response.status, text)
+                        if self._scheduler.back_off(endpoint, error, attempt):
+                            attempt += 1
+                            continue
+                        raise error
+                    used_weight = response.headers.get(USED_WEIGHT_HEADER)
+                    if used_weight is not None:
+                        self._scheduler.observe_used_weight(endpoint, int(used_weight))
+                    return json.loads(text)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # the session is bound to the running event loop, so it is created on the first request
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=0, limit_per_host=self._limit_per_host, keepalive_timeout=self._keepalive_timeout,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self._timeout.total_seconds()),
+            )
+        return self._session
+
+
+class IAsyncClient(abc.ABC, Generic[TData]):
+    @abc.abstractmethod
+    async def get(self, symbol: str, start_time: int, end_time: int) -> list[TData]:
+        pass
+
+
+class IAsyncFromIdClient(IAsyncClient[TData], abc.ABC):
+    """
+    Async client of aggregate trades that can also page by trade id
+    """
+    @abc.abstractmethod
+    async def get_from_id(self, symbol: str, from_id: int) -> list[TData]:
+        pass
+
+
+class AsyncBinanceClient(IAsyncClient[TData], abc.ABC):
+    """
+    Requests pages of an endpoint over the shared transport through the cache when it is set,
+    pages are cached under the same keys as the pages of the sync clients
+    """
+    def __init__(self, transport: AsyncTransport, cache: ICache | None = None):
+        self._transport = transport
+        self._cache = cache
+
+    async def _request(self, endpoint: str, symbol: str, start_time: int, end_time: int, **params) -> list[dict]:
+        key = window_key(endpoint, symbol, start_time, end_time, **params)
+        page = self._cache.get(key) if self._cache is not None else None
+        if page is None:
+            with PAGE_FETCH_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+                page = await self._transport.request(
+                    endpoint, symbol=symbol, startTime=start_time, endTime=end_time, **params,
+                )
+            PAGE_SIZE.observe(len(page), client=self.__class__.__name__, symbol=symbol)
+            if self._cache is not None and is_settled_window(end_time):
+                self._cache.set(key, page)
+        return page
+
+    async def _request_from_id(self, endpoint: str, symbol: str, from_id: int, limit: int) -> list[dict]:
+        key = from_id_key(endpoint, symbol, from_id, limit)
+        page = self._cache.get(key) if self._cache is not None else None
+        if page is None:
+            with PAGE_FETCH_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+                page = await self._transport.request(endpoint, symbol=symbol, fromId=from_id, limit=limit)
+            PAGE_SIZE.observe(len(page), client=self.__class__.__name__, symbol=symbol)
+            if self._cache is not None and is_settled_page(page, limit):
+                self._cache.set(key, page)
+        return page
+
+
+class AsyncTradeClient(AsyncBinanceClient[TData], IAsyncFromIdClient[TData], abc.ABC):
+    """
+    Returns pydantic trades by default or compact records when `compact` is set,
+    pages are requested with the max page size
+    """
+    endpoint: str
+    model: type[Trade]
+    compact_model: type[CompactTrade]
+
+    def __init__(self, transport: AsyncTransport, cache: ICache | None = None, compact: bool = False):
+        super().__init__(transport, cache)
+        self._compact = compact
+
+    async def get(self, symbol: str, start_time: int, end_time: int) -> list[TData]:
+        return self._decode(symbol, await self._request(
+            self.endpoint, symbol, start_time, end_time, limit=TRADES_PAGE_LIMIT,
+        ))
+
+    async def get_from_id(self, symbol: str, from_id: int) -> list[TData]:
+        return self._decode(symbol, await self._request_from_id(self.endpoint, symbol, from_id, TRADES_PAGE_LIMIT))
+
+    def _decode(self, symbol: str, page: list[dict]) -> list[Trade] | list[CompactTrade]:
+        with DECODE_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+            if self._compact:
+                return decode_trades(page, self.compact_model)
+            return [self.model.model_validate(trade) for trade in page]
+
+
+class AsyncSpotClient(AsyncTradeClient[Trade]):
+    endpoint = 'aggTrades'
+    model = Trade
+    compact_model = CompactTrade
+
+
+class AsyncPerpClient(AsyncTradeClient[FutureTrade]):
+    endpoint = 'futures/aggTrades'
+    model = FutureTrade
+    compact_model = CompactFutureTrade
+
+
+class AsyncOpenInterestClient(AsyncBinanceClient[OpenInterest]):
+    async def get(self, symbol: str, start_time: int, end_time: int) -> list[OpenInterest]:
+        page = await self._request(
+            'futures/openInterestHist', symbol, start_time, end_time, period=Period.FIVE_MINUTES,
+        )
+        with DECODE_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+            return [OpenInterest.model_validate(raw_data) for raw_data in page]
+
+
+class AsyncFundingRateClient(AsyncBinanceClient[FundingRate]):
+    async def get(self, symbol: str, start_time: int, end_time: int) -> list[FundingRate]:
+        page = await self._request('futures/fundingRate', symbol, start_time, end_time)
+        with DECODE_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+            return [FundingRate.model_validate(raw_data) for raw_data in page]
+
+
+class AsyncLoader(Generic[TData]):
+    """
+    Loads data within specified time bounds from an async client.
+    Aggregate trade ids are consecutive, so after the first page `pages_in_flight` pages of the next id ranges
+    are requested at once instead of one round trip per page
+    """
+    def __init__(self, data_client: IAsyncClient[TData], symbol: str = 'BTCUSDT', pages_in_flight: int = 4):
+        self._data_client = data_client
+        self._symbol = symbol
+        self._pages_in_flight = pages_in_flight
+
+    async def load(self, start_time: datetime, end_time: datetime) -> AsyncIterator[TData]:
+        """
+        Yields trades once by trade_id and other data once by timestamp like `Loader`
+        """
+        start_timestamp = to_timestamp(start_time)
+        end_timestamp = to_timestamp(end_time)
+        page = await self._data_client.get(self._symbol, start_timestamp, end_timestamp)
+        if isinstance(self._data_client, IAsyncFromIdClient):
+            pages = self._pages_from_id(page, end_timestamp)
+        else:
+            pages = self._pages_by_timestamp(page, end_timestamp)
+
+        last_key = None
+        async with aclosing(pages):
+            async for page in pages:
+                for data in page:
+                    timestamp = as_timestamp(data.timestamp)
+                    if timestamp > end_timestamp:
+                        return
+                    key = getattr(data, 'trade_id', timestamp)
+                    if last_key is not None and key <= last_key:
+                        continue
+                    last_key = key
+                    yield data
+
+    async def _pages_from_id(self, first_page: list[TData], end_timestamp: int) -> AsyncIterator[list[TData]]:
+        yield first_page
+        if len(first_page) < TRADES_PAGE_LIMIT or as_timestamp(first_page[-1].timestamp) > end_timestamp:
+            return
+        next_id = first_page[-1].trade_id + 1
+        requests: deque[asyncio.Task] = deque()
+        try:
+            while True:
+                while len(requests) < self._pages_in_flight:
+                    requests.append(asyncio.create_task(self._data_client.get_from_id(self._symbol, next_id)))
+                    next_id += TRADES_PAGE_LIMIT
+                page = await requests.popleft()
+                if page:
+                    yield page
+                if len(page) < TRADES_PAGE_LIMIT or as_timestamp(page[-1].timestamp) > end_timestamp:
+                    return
+        finally:
+            for request in requests:
+                request.cancel()
+            await asyncio.gather(*requests, return_exceptions=True)
+
+    async def _pages_by_timestamp(self, first_page: list[TData], end_timestamp: int) -> AsyncIterator[list[TData]]:
+        page = first_page
+        current_timestamp = None
+        while page:
+            yield page
+            last_timestamp = as_timestamp(page[-1].timestamp)
+            if last_timestamp >= end_timestamp or (current_timestamp is not None and last_timestamp <= current_timestamp):
+                return
+            current_timestamp = last_timestamp
+            page = await self._data_client.get(self._symbol, current_timestamp, end_timestamp)
+
+
+async def main():
+    now = datetime(year=2024, month=9, day=13, hour=7, minute=0, second=0, tzinfo=timezone.utc)
+    start = now - timedelta(hours=1)
+    end = now
+
+    cache = DiskCache()
+    async with AsyncTransport(scheduler=RequestScheduler()) as transport:
+        for data_client in (
+            AsyncSpotClient(transport, cache, compact=True),
+            AsyncPerpClient(transport, cache, compact=True),
+            AsyncOpenInterestClient(transport, cache),
+            AsyncFundingRateClient(transport, cache),
+        ):
+            count = 0
+            async for _ in AsyncLoader(data_client).load(start_time=start, end_time=end):
+                count += 1
+            print(f'Loaded {count} rows with {data_client.__class__.__name__}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
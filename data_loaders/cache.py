@@ -0,0 +1,201 @@
+import abc
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+from paths import CACHE_DIR
+
+CacheKey = tuple[str, str, int, int]
+
+# windows ending this close to now may still get trades, they are not cached
+SETTLE_MS = 60 * 1000
+
+
+class ICache(abc.ABC):
+    @abc.abstractmethod
+    def get(self, key: CacheKey) -> list[dict] | None:
+        pass
+
+    @abc.abstractmethod
+    def set(self, key: CacheKey, page: list[dict]) -> None:
+        pass
+
+
+class MemoryCache(ICache):
+    """
+    In-process LRU cache of raw pages bounded by the number of pages
+    """
+    def __init__(self, max_pages: int = 1024):
+        self._max_pages = max_pages
+        self._pages: OrderedDict[CacheKey, list[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: CacheKey) -> list[dict] | None:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def set(self, key: CacheKey, page: list[dict]) -> None:
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self._max_pages:
+                self._pages.popitem(last=False)
+
+
+class DiskCache(ICache):
+    """
+    SQLite cache of zlib compressed json pages bounded by the compressed size,
+    survives restarts and is shared between threads and processes
+    """
+    def __init__(self, path: Path = CACHE_DIR / 'responses.sqlite', max_bytes: int = 1024 ** 3):
+        """
+        :param path: database file
+        :param max_bytes: size budget of compressed pages, least recently used pages are evicted above it
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'endpoint TEXT, symbol TEXT, start_time INTEGER, end_time INTEGER, '
+            'page BLOB, size INTEGER, accessed REAL, '
+            'PRIMARY KEY (endpoint, symbol, start_time, end_time))'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)')
+        # running size of all pages kept by triggers, so a set does not sum the table to know when to evict
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS total_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER)'
+            )
+            self._connection.execute(
+                'INSERT INTO total_size SELECT 0, (SELECT COALESCE(SUM(size), 0) FROM pages) '
+                'WHERE NOT EXISTS (SELECT 1 FROM total_size)'
+            )
+            self._connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS pages_insert AFTER INSERT ON pages BEGIN '
+                'UPDATE total_size SET bytes = bytes + new.size; END'
+            )
+            self._connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS pages_update AFTER UPDATE OF size ON pages BEGIN '
+                'UPDATE total_size SET bytes = bytes + new.size - old.size; END'
+            )
+            self._connection.execute(
+                'CREATE TRIGGER IF NOT EXISTS pages_delete AFTER DELETE ON pages BEGIN '
+                'UPDATE total_size SET bytes = bytes - old.size; END'
+            )
+            self._connection.execute('COMMIT')
+        except BaseException:
+            self._connection.execute('ROLLBACK')
+            raise
+
+    def get(self, key: CacheKey) -> list[dict] | None:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT page FROM pages WHERE endpoint = ? AND symbol = ? AND start_time = ? AND end_time = ?', key,
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                'UPDATE pages SET accessed = ? WHERE endpoint = ? AND symbol = ? AND start_time = ? AND end_time = ?',
+                (time.time(), *key),
+            )
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key: CacheKey, page: list[dict]) -> None:
+        blob = zlib.compress(json.dumps(page, separators=(',', ':')).encode())
+        with self._lock:
+            # an upsert rather than a replace, the delete of a replace does not fire the delete trigger
+            self._connection.execute(
+                'INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (endpoint, symbol, start_time, end_time) DO UPDATE '
+                'SET page = excluded.page, size = excluded.size, accessed = excluded.accessed',
+                (*key, blob, len(blob), time.time()),
+            )
+            total_bytes, = self._connection.execute('SELECT bytes FROM total_size').fetchone()
+            if total_bytes > self._max_bytes:
+                self._evict(total_bytes)
+
+    def _evict(self, total_bytes: int):
+        evicted_bytes = 0
+        evicted = []
+        for rowid, size in self._connection.execute('SELECT rowid, size FROM pages ORDER BY accessed'):
+            if total_bytes - evicted_bytes <= self._max_bytes:
+                break
+            evicted.append((rowid,))
+            evicted_bytes += size
+        self._connection.executemany('DELETE FROM pages WHERE rowid = ?', evicted)
+
+
+def window_key(endpoint: str, symbol: str, start_time: int, end_time: int, **params) -> CacheKey:
+    return '/'.join([endpoint, *map(str, params.values())]), symbol, start_time, end_time
+
+
+def is_settled_window(end_time: int) -> bool:
+    return end_time <= time.time() * 1000 - SETTLE_MS
+
+
+def from_id_key(endpoint: str, symbol: str, from_id: int, limit: int) -> CacheKey:
+    return f'{endpoint}/fromId', symbol, from_id, limit
+
+
+def is_settled_page(page: list[dict], limit: int) -> bool:
+    return len(page) == limit and page[-1]['T'] <= time.time() * 1000 - SETTLE_MS
+
+
+def cached_request(
+    cache: ICache | None,
+    endpoint: str,
+    request: Callable[..., list[dict]],
+    symbol: str,
+    start_time: int,
+    end_time: int,
+    **params,
+) -> list[dict]:
+    """
+    Requests a page through the cache, only windows that can not change anymore are stored
+    """
+    if cache is None:
+        return request(symbol=symbol, startTime=start_time, endTime=end_time, **params)
+
+    key = window_key(endpoint, symbol, start_time, end_time, **params)
+    page = cache.get(key)
+    if page is None:
+        page = request(symbol=symbol, startTime=start_time, endTime=end_time, **params)
+        if is_settled_window(end_time):
+            cache.set(key, page)
+    return page
+
+
+def cached_id_request(
+    cache: ICache | None,
+    endpoint: str,
+    request: Callable[..., list[dict]],
+    symbol: str,
+    from_id: int,
+    limit: int,
+) -> list[dict]:
+    """
+    Requests a page of aggregate trades starting at an id through the cache,
+    only full pages whose last trade is settled are stored
+    """
+    if cache is None:
+        return request(symbol=symbol, fromId=from_id, limit=limit)
+
+    key = from_id_key(endpoint, symbol, from_id, limit)
+    page = cache.get(key)
+    if page is None:
+        page = request(symbol=symbol, fromId=from_id, limit=limit)
+        if is_settled_page(page, limit):
+            cache.set(key, page)
+    return page
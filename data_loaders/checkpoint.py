@@ -0,0 +1,56 @@
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from data_loaders.time_conversion import as_timestamp
+from paths import CHECKPOINT_DIR
+
+
+class Checkpoint(BaseModel):
+    """
+    Last data handed to the consumer of a load, trade_id is None for data without ids
+    """
+    timestamp: int
+    trade_id: int | None = None
+
+    @classmethod
+    def of(cls, data) -> 'Checkpoint':
+        return cls(timestamp=as_timestamp(data.timestamp), trade_id=getattr(data, 'trade_id', None))
+
+    def is_passed_by(self, data) -> bool:
+        """
+        Whether the data comes after the checkpoint, data at the checkpoint timestamp is compared by trade_id
+        """
+        timestamp = as_timestamp(data.timestamp)
+        if timestamp != self.timestamp:
+            return timestamp > self.timestamp
+        trade_id = getattr(data, 'trade_id', None)
+        return trade_id is not None and self.trade_id is not None and trade_id > self.trade_id
+
+
+class CheckpointStore:
+    """
+    Keeps a checkpoint per (client, symbol, start of the loaded range) as json files:
+    `<root>/<client>/<symbol>/<start timestamp>.json`
+    """
+    def __init__(self, root: Path = CHECKPOINT_DIR):
+        self._root = root
+
+    def path(self, client: str, symbol: str, start_timestamp: int) -> Path:
+        return self._root / client / symbol / f'{start_timestamp}.json'
+
+    def load(self, client: str, symbol: str, start_timestamp: int) -> Checkpoint | None:
+        path = self.path(client, symbol, start_timestamp)
+        if not path.exists():
+            return None
+        return Checkpoint.model_validate_json(path.read_text())
+
+    def save(self, client: str, symbol: str, start_timestamp: int, checkpoint: Checkpoint):
+        path = self.path(client, symbol, start_timestamp)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix('.tmp')
+        temporary_path.write_text(checkpoint.model_dump_json())
+        temporary_path.replace(path)
+
+    def delete(self, client: str, symbol: str, start_timestamp: int):
+        self.path(client, symbol, start_timestamp).unlink(missing_ok=True)
@@ -1,16 +1,25 @@
 import abc
-from functools import lru_cache
-from typing import TypeVar, Generic, Iterable
-
-import binance
+from typing import TYPE_CHECKING, TypeVar, Generic, Iterable, Callable
 
+from data_loaders.cache import ICache, cached_request, cached_id_request
+from data_loaders.decoders import decode_trades
+from data_loaders.metrics import PAGE_FETCH_SECONDS, PAGE_SIZE, DECODE_SECONDS
+from data_loaders.models.compact_trade import CompactTrade, CompactFutureTrade
 from data_loaders.models.funding_rate import FundingRate
 from data_loaders.models.open_interest import OpenInterest, Period
 from data_loaders.models.timedata import TimeData
 from data_loaders.models.trade import Trade, FutureTrade
+from data_loaders.rate_limit import RequestScheduler, default_scheduler
+
+if TYPE_CHECKING:
+    import binance
 
 TData = TypeVar('TData', bound=TimeData)
 
+USED_WEIGHT_HEADER = 'x-mbx-used-weight-1m'
+# max page size of the aggregate trades endpoints
+TRADES_PAGE_LIMIT = 1000
+
 
 class IClient(abc.ABC, Generic[TData]):
     @abc.abstractmethod
@@ -18,41 +27,129 @@ class IClient(abc.ABC, Generic[TData]):
         pass
 
 
-class SpotClient(IClient[Trade]):
-    def __init__(self, client: binance.Client):
-        self._client = client
-        self._get_aggregate_trades = lru_cache()(self._client.get_aggregate_trades)
-
-    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[Trade]:
-        for trade in self._get_aggregate_trades(symbol=symbol, startTime=start_time, endTime=end_time):
-            yield Trade.model_validate(trade)
-
-
-class PerpClient(IClient[FutureTrade]):
-    def __init__(self, client: binance.Client):
-        self._client = client
-        self._futures_aggregate_trades = lru_cache()(self._client.futures_aggregate_trades)
-
-    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[FutureTrade]:
-        for trade in self._futures_aggregate_trades(symbol=symbol, startTime=start_time, endTime=end_time):
-            yield FutureTrade.model_validate(trade)
+class IFromIdClient(IClient[TData], abc.ABC):
+    """
+    Client of aggregate trades that can also page by trade id
+    """
+    @abc.abstractmethod
+    def get_from_id(self, symbol: str, from_id: int) -> Iterable[TData]:
+        pass
 
 
-class OpenInterestClient(IClient[OpenInterest]):
-    def __init__(self, client: binance.Client):
+class BinanceClient(IClient[TData], abc.ABC):
+    """
+    Requests pages of an endpoint through the cache when it is set and through the scheduler,
+    the process-wide `default_scheduler()` unless one is given
+    """
+    def __init__(
+        self, client: 'binance.Client', cache: ICache | None = None, scheduler: RequestScheduler | None = None,
+    ):
         self._client = client
-        self._futures_open_interest_hist = lru_cache()(self._client.futures_open_interest_hist)
-
+        self._cache = cache
+        self._scheduler = scheduler if scheduler is not None else default_scheduler()
+
+    def _request(
+        self, endpoint: str, request: Callable[..., list[dict]], symbol: str, start_time: int, end_time: int,
+        **params,
+    ) -> list[dict]:
+        request = self._observed(symbol, self._scheduled(endpoint, request))
+        return cached_request(self._cache, endpoint, request, symbol, start_time, end_time, **params)
+
+    def _request_from_id(
+        self, endpoint: str, request: Callable[..., list[dict]], symbol: str, from_id: int, limit: int,
+    ) -> list[dict]:
+        request = self._observed(symbol, self._scheduled(endpoint, request))
+        return cached_id_request(self._cache, endpoint, request, symbol, from_id, limit)
+
+    def _scheduled(self, endpoint: str, request: Callable[..., list[dict]]) -> Callable[..., list[dict]]:
+        def scheduled_request(**params) -> list[dict]:
+            page = self._scheduler.call(endpoint, lambda: request(**params))
+            used_weight = getattr(getattr(self._client, 'response', None), 'headers', {}).get(USED_WEIGHT_HEADER)
+            if used_weight is not None:
+                self._scheduler.observe_used_weight(endpoint, int(used_weight))
+            return page
+        return scheduled_request
+
+    def _observed(self, symbol: str, request: Callable[..., list[dict]]) -> Callable[..., list[dict]]:
+        """
+        Observes latency and size of pages requested from the exchange, pages served by the cache are not observed
+        """
+        fetch_seconds = PAGE_FETCH_SECONDS.labels(client=self.__class__.__name__, symbol=symbol)
+        page_size = PAGE_SIZE.labels(client=self.__class__.__name__, symbol=symbol)
+
+        def observed_request(**params) -> list[dict]:
+            with fetch_seconds.time():
+                page = request(**params)
+            page_size.observe(len(page))
+            return page
+        return observed_request
+
+
+class TradeClient(BinanceClient[TData], IFromIdClient[TData], abc.ABC):
+    """
+    Yields pydantic trades by default or compact records decoded page by page when `compact` is set,
+    pages are requested with the max page size
+    """
+    model: type[Trade]
+    compact_model: type[CompactTrade]
+
+    def __init__(
+        self, client: 'binance.Client', cache: ICache | None = None, scheduler: RequestScheduler | None = None,
+        compact: bool = False,
+    ):
+        super().__init__(client, cache, scheduler)
+        self._compact = compact
+
+    def _decode(self, symbol: str, page: list[dict]) -> list[Trade] | list[CompactTrade]:
+        with DECODE_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+            if self._compact:
+                return decode_trades(page, self.compact_model)
+            return [self.model.model_validate(trade) for trade in page]
+
+
+class SpotClient(TradeClient[Trade]):
+    model = Trade
+    compact_model = CompactTrade
+
+    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[Trade | CompactTrade]:
+        return self._decode(symbol, self._request(
+            'aggTrades', self._client.get_aggregate_trades, symbol, start_time, end_time, limit=TRADES_PAGE_LIMIT,
+        ))
+
+    def get_from_id(self, symbol: str, from_id: int) -> Iterable[Trade | CompactTrade]:
+        return self._decode(symbol, self._request_from_id(
+            'aggTrades', self._client.get_aggregate_trades, symbol, from_id, TRADES_PAGE_LIMIT,
+        ))
+
+
+class PerpClient(TradeClient[FutureTrade]):
+    model = FutureTrade
+    compact_model = CompactFutureTrade
+
+    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[FutureTrade | CompactFutureTrade]:
+        return self._decode(symbol, self._request(
+            'futures/aggTrades', self._client.futures_aggregate_trades, symbol, start_time, end_time,
+            limit=TRADES_PAGE_LIMIT,
+        ))
+
+    def get_from_id(self, symbol: str, from_id: int) -> Iterable[FutureTrade | CompactFutureTrade]:
+        return self._decode(symbol, self._request_from_id(
+            'futures/aggTrades', self._client.futures_aggregate_trades, symbol, from_id, TRADES_PAGE_LIMIT,
+        ))
+
+
+class OpenInterestClient(BinanceClient[OpenInterest]):
     def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[OpenInterest]:
-        for raw_data in self._futures_open_interest_hist(symbol=symbol, period=Period.FIVE_MINUTES, startTime=start_time, endTime=end_time):
-            yield OpenInterest.model_validate(raw_data)
-
+        page = self._request(
+            'futures/openInterestHist', self._client.futures_open_interest_hist, symbol, start_time, end_time,
+            period=Period.FIVE_MINUTES,
+        )
+        with DECODE_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+            return [OpenInterest.model_validate(raw_data) for raw_data in page]
 
-class FundingRateClient(IClient[FundingRate]):
-    def __init__(self, client: binance.Client):
-        self._client = client
-        self._futures_funding_rate = lru_cache()(self._client.futures_funding_rate)
 
+class FundingRateClient(BinanceClient[FundingRate]):
     def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[FundingRate]:
-        for raw_data in self._futures_funding_rate(symbol=symbol, startTime=start_time, endTime=end_time):
-            yield FundingRate.model_validate(raw_data)
+        page = self._request('futures/fundingRate', self._client.futures_funding_rate, symbol, start_time, end_time)
+        with DECODE_SECONDS.time(client=self.__class__.__name__, symbol=symbol):
+            return [FundingRate.model_validate(raw_data) for raw_data in page]
@@ -0,0 +1,113 @@
+import csv
+import io
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable
+
+from data_loaders.clients import IClient, IFromIdClient, TData
+from data_loaders.models.funding_rate import FundingRate
+from data_loaders.models.open_interest import OpenInterest
+from data_loaders.models.trade import Trade, FutureTrade
+from data_loaders.time_conversion import to_timestamp
+
+# below this many bytes the window start is found by reading lines
+SCAN_BYTES = 64 * 1024
+
+
+class CsvClient(IClient[TData]):
+    """
+    Serves data saved by `data_loaders.loader.save_csv` without touching the network.
+    The file holds a single symbol sorted by timestamp, so `symbol` is not checked.
+    The requested window is found by binary search over byte offsets.
+    """
+    model: type[TData]
+
+    def __init__(self, path: Path, limit: int | None = None):
+        """
+        :param path: csv file to serve
+        :param limit: max rows per `get` like the exchange page limit, whole window if None
+        """
+        self._path = path
+        self._limit = limit
+
+    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[TData]:
+        for row in self._read('timestamp', self._parse_timestamp, start_time):
+            if self._parse_timestamp(row['timestamp']) > end_time:
+                break
+            yield self.model.model_validate(row)
+
+    def _read(self, column: str, parse: Callable[[str], int], start: int) -> Iterable[dict[str, str]]:
+        """
+        Yields up to `limit` rows from the first row whose `column` is >= start,
+        the file must be sorted by `column`
+        """
+        with open(self._path, 'rb') as csv_file:
+            header = csv_file.readline()
+            if not header:
+                return
+            fieldnames = self._parse_row(header)
+            index = fieldnames.index(column)
+
+            csv_file.seek(self._seek(csv_file, csv_file.tell(), start, lambda line: parse(self._parse_row(line)[index])))
+            for count, line in enumerate(csv_file):
+                if self._limit is not None and count >= self._limit:
+                    break
+                yield dict(zip(fieldnames, self._parse_row(line)))
+
+    def _seek(self, csv_file: BinaryIO, lo: int, start: int, line_key: Callable[[bytes], int]) -> int:
+        """
+        Returns offset of the first line with key >= start,
+        `lo` is the offset of the first data line
+        """
+        hi = csv_file.seek(0, io.SEEK_END)
+        # invariant: the answer is a line start >= lo and <= the first line start >= hi
+        while hi - lo > SCAN_BYTES:
+            mid = (lo + hi) // 2
+            csv_file.seek(mid - 1)
+            csv_file.readline()
+            position = csv_file.tell()
+            line = csv_file.readline()
+            if not line or line_key(line) >= start:
+                hi = mid
+            else:
+                lo = position + len(line)
+
+        csv_file.seek(lo)
+        while line := csv_file.readline():
+            if line_key(line) >= start:
+                break
+            lo += len(line)
+        return lo
+
+    @staticmethod
+    def _parse_row(line: bytes) -> list[str]:
+        return next(csv.reader([line.decode()]))
+
+    @staticmethod
+    def _parse_timestamp(value: str) -> int:
+        return to_timestamp(datetime.fromisoformat(value))
+
+
+class CsvTradeClient(CsvClient[TData], IFromIdClient[TData]):
+    """
+    Serves recorded trades by time or by aggregate trade id
+    """
+    def get_from_id(self, symbol: str, from_id: int) -> Iterable[TData]:
+        for row in self._read('trade_id', int, from_id):
+            yield self.model.model_validate(row)
+
+
+class CsvSpotClient(CsvTradeClient[Trade]):
+    model = Trade
+
+
+class CsvPerpClient(CsvTradeClient[FutureTrade]):
+    model = FutureTrade
+
+
+class CsvOpenInterestClient(CsvClient[OpenInterest]):
+    model = OpenInterest
+
+
+class CsvFundingRateClient(CsvClient[FundingRate]):
+    model = FundingRate
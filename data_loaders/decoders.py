@@ -0,0 +1,29 @@
+from typing import TYPE_CHECKING
+
+from data_loaders.models.compact_trade import CompactTrade
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def decode_trades(page: list[dict], record: type[CompactTrade] = CompactTrade) -> list[CompactTrade]:
+    """
+    Decodes a raw page of Binance aggregate trades into compact records
+    """
+    return [record(trade['T'], trade['a'], float(trade['p']), float(trade['q']), trade['m']) for trade in page]
+
+
+def decode_trade_columns(page: list[dict]) -> dict[str, 'np.ndarray']:
+    """
+    Decodes a raw page of Binance aggregate trades into column arrays like `ColumnarStore.read_arrays`
+    """
+    import numpy as np
+
+    count = len(page)
+    return {
+        'timestamp': np.fromiter((trade['T'] for trade in page), dtype=np.int64, count=count),
+        'trade_id': np.fromiter((trade['a'] for trade in page), dtype=np.int64, count=count),
+        'price': np.fromiter((trade['p'] for trade in page), dtype=np.float64, count=count),
+        'quantity': np.fromiter((trade['q'] for trade in page), dtype=np.float64, count=count),
+        'is_buyer_maker': np.fromiter((trade['m'] for trade in page), dtype=bool, count=count),
+    }
@@ -0,0 +1,131 @@
+import abc
+import asyncio
+from datetime import timedelta
+from typing import TYPE_CHECKING, AsyncIterator
+
+from data_loaders.models.compact_trade import CompactTrade, CompactFutureTrade
+from data_loaders.models.funding_rate import FundingRate
+from data_loaders.models.open_interest import OpenInterest
+from data_loaders.models.timedata import TimeData
+
+if TYPE_CHECKING:
+    from binance import AsyncClient
+
+FeedData = CompactTrade | TimeData | OpenInterest | FundingRate
+
+_CLOSED = object()
+
+
+class IFeed(abc.ABC):
+    """
+    Push source of trades, open interest and funding rate updates in arrival order
+    """
+    @abc.abstractmethod
+    def __aiter__(self) -> AsyncIterator[FeedData]:
+        pass
+
+
+class QueueFeed(IFeed):
+    """
+    In-process feed driven by a producer calling `put`, the stream ends after `close`
+    """
+    def __init__(self, maxsize: int = 0):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    async def put(self, data: FeedData):
+        await self._queue.put(data)
+
+    async def close(self):
+        await self._queue.put(_CLOSED)
+
+    async def __aiter__(self) -> AsyncIterator[FeedData]:
+        while True:
+            data = await self._queue.get()
+            if data is _CLOSED:
+                return
+            yield data
+
+
+class BinanceFeed(IFeed):
+    """
+    Live feed of a symbol: aggregate trade streams of spot and perp, funding rate from the mark price stream
+    and open interest polled over REST, the exchange has no open interest stream
+    """
+    def __init__(
+        self, client: 'AsyncClient', symbol: str = 'BTCUSDT',
+        open_interest_interval: timedelta = timedelta(seconds=10),
+    ):
+        self._client = client
+        self._symbol = symbol
+        self._open_interest_interval = open_interest_interval
+        self._mark_price = 0.0
+
+    async def __aiter__(self) -> AsyncIterator[FeedData]:
+        from binance import BinanceSocketManager
+
+        socket_manager = BinanceSocketManager(self._client)
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks = [
+            asyncio.create_task(self._listen(socket_manager.aggtrade_socket(self._symbol), self._spot_trade, queue)),
+            asyncio.create_task(
+                self._listen(socket_manager.aggtrade_futures_socket(self._symbol), self._perp_trade, queue)
+            ),
+            asyncio.create_task(
+                self._listen(socket_manager.symbol_mark_price_socket(self._symbol), self._funding_rate, queue)
+            ),
+            asyncio.create_task(self._poll_open_interest(queue)),
+        ]
+        try:
+            while True:
+                data = await queue.get()
+                if isinstance(data, BaseException):
+                    raise data
+                yield data
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _listen(self, socket, decode, queue: asyncio.Queue):
+        try:
+            async with socket as stream:
+                while True:
+                    message = await stream.recv()
+                    message = message.get('data', message)
+                    if message.get('e') == 'error':
+                        raise ConnectionError(f'Stream of {self._symbol} failed: {message}')
+                    await queue.put(decode(message))
+        except Exception as error:
+            await queue.put(error)
+
+    async def _poll_open_interest(self, queue: asyncio.Queue):
+        try:
+            while True:
+                response = await self._client.futures_open_interest(symbol=self._symbol)
+                open_interest = float(response['openInterest'])
+                await queue.put(OpenInterest(
+                    symbol=self._symbol,
+                    sum_open_interest=open_interest,
+                    sum_open_interest_value=open_interest * self._mark_price,
+                    timestamp=response['time'],
+                ))
+                await asyncio.sleep(self._open_interest_interval.total_seconds())
+        except Exception as error:
+            await queue.put(error)
+
+    @staticmethod
+    def _spot_trade(message: dict) -> CompactTrade:
+        return CompactTrade(message['T'], message['a'], float(message['p']), float(message['q']), message['m'])
+
+    @staticmethod
+    def _perp_trade(message: dict) -> CompactFutureTrade:
+        return CompactFutureTrade(message['T'], message['a'], float(message['p']), float(message['q']), message['m'])
+
+    def _funding_rate(self, message: dict) -> FundingRate:
+        self._mark_price = float(message['p'])
+        return FundingRate(
+            symbol=message['s'],
+            funding_rate=float(message['r']),
+            mark_price=self._mark_price,
+            timestamp=message['E'],
+        )
@@ -2,18 +2,23 @@ import abc
 import csv
 import itertools
 import logging
+from concurrent.futures import Executor, Future
+from contextlib import closing
 from datetime import datetime, timedelta, timezone
-from time import sleep
-from typing import Iterable, Generic, TypeVar
-import tqdm
-import binance
-from binance.exceptions import BinanceAPIException
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Generic, TypeVar
 
-from data_loaders.clients import IClient, SpotClient, PerpClient, FundingRateClient, OpenInterestClient
+from data_loaders.cache import DiskCache
+from data_loaders.checkpoint import Checkpoint, CheckpointStore
+from data_loaders.clients import IClient, IFromIdClient, SpotClient, PerpClient, FundingRateClient, OpenInterestClient
 from data_loaders.models.timedata import TimeData
 from data_loaders.models.trade import Trade
-from paths import DATA_DIR
-from data_loaders.time_conversion import to_timestamp
+from data_loaders.rate_limit import RequestScheduler
+from data_loaders.time_conversion import to_timestamp, from_timestamp, as_timestamp
+
+if TYPE_CHECKING:
+    import tqdm
+
 logger = logging.getLogger(__name__)
 TData = TypeVar('TData', bound=TimeData)
 
@@ -29,15 +34,54 @@ class Loader(ILoader[TData]):
     Loads data within specified time bounds
     """
 
-    def __init__(self, data_client: IClient[TData]):
+    def __init__(
+        self, data_client: IClient[TData], symbol: str = 'BTCUSDT', executor: Executor | None = None,
+        checkpoints: CheckpointStore | None = None,
+    ):
+        """
+        :param executor: when set, the next page is requested on it while the current page is consumed,
+            one executor can be shared by the loaders of many symbols and sources
+        :param checkpoints: when set, the last data handed to the consumer is saved after every page and when the load
+            is interrupted, a load of the same range resumes after it and the checkpoint is deleted once a load completes
+        """
         self._data_client = data_client
+        self._symbol = symbol
+        self._executor = executor
+        self._checkpoints = checkpoints
 
     def load(self, start_time: datetime, end_time: datetime) -> Iterable[Trade]:
+        """
+        With an executor the first page is requested right away, before the data is iterated
+        """
+        checkpoint = None
+        if self._checkpoints is not None:
+            checkpoint = self._checkpoints.load(self._client_name, self._symbol, to_timestamp(start_time))
+        first_page = None
+        if self._executor is not None:
+            page_start = checkpoint.timestamp if checkpoint is not None else to_timestamp(start_time)
+            first_page = self._executor.submit(
+                self._get_page, page_start, to_timestamp(end_time), self._resume_from_id(checkpoint),
+            )
+        return self._load(start_time, end_time, first_page, checkpoint)
+
+    def _load(
+        self, start_time: datetime, end_time: datetime, first_page: Future | None, checkpoint: Checkpoint | None,
+    ) -> Iterable[Trade]:
         start_timestamp = to_timestamp(start_time)
         current_timestamp = start_timestamp
         end_timestamp = to_timestamp(end_time)
         current_time = start_time
-        with tqdm.tqdm(total=end_timestamp-start_timestamp, desc=f"Processing {self._data_client.__class__.__name__}", unit="s") as pbar:
+        if checkpoint is not None:
+            current_timestamp = checkpoint.timestamp
+            current_time = from_timestamp(current_timestamp)
+        # the progress bar is the only user of tqdm, so entry points which never load do not import it
+        import tqdm
+
+        with tqdm.tqdm(
+            total=end_timestamp-start_timestamp,
+            desc=f"Processing {self._client_name} {self._symbol}",
+            unit="s",
+        ) as pbar:
             is_timestamp_changed = True
 
             yield from self.load_by_timestamp(
@@ -48,80 +92,187 @@ class Loader(ILoader[TData]):
                 is_timestamp_changed,
                 pbar,
                 start_timestamp,
+                first_page,
+                checkpoint,
             )
 
+    @property
+    def _client_name(self) -> str:
+        return self._data_client.__class__.__name__
+
+    @property
+    def _pages_by_id(self) -> bool:
+        return isinstance(self._data_client, IFromIdClient)
+
+    def _resume_from_id(self, checkpoint: Checkpoint | None) -> int | None:
+        if self._pages_by_id and checkpoint is not None and checkpoint.trade_id is not None:
+            return checkpoint.trade_id + 1
+        return None
+
     def load_by_timestamp(
         self, current_time: datetime,
         current_timestamp: int,
         end_time: datetime,
         end_timestamp: int,
         is_timestamp_changed: bool,
-        pbar: tqdm.tqdm,
+        pbar: 'tqdm.tqdm',
         start_timestamp: int,
+        next_page: Future | None = None,
+        checkpoint: Checkpoint | None = None,
     ):
-        while current_time - end_time < timedelta(seconds=1) and is_timestamp_changed:
-            try:
-                timed_data = self._data_client.get(
-                    symbol='BTCUSDT',
-                    start_time=current_timestamp,
-                    end_time=end_timestamp,
-                )
-
-                is_timestamp_changed = False
-                yielded = False
-                for data in timed_data:
-                    yielded = True
-                    yield data
-                if yielded and data.timestamp > current_time:
-                    is_timestamp_changed = True
-                    current_time = data.timestamp
-                    current_timestamp = to_timestamp(current_time)
-                pbar.n = current_timestamp - start_timestamp
-                pbar.refresh()
-
-            except BinanceAPIException:
-                logger.exception('Exception, sleeping')
-                sleep(42)
-            except KeyboardInterrupt:
-                break
+        """
+        Pages of trades after the first one are requested from the id after the last trade when the client supports it,
+        other data is requested from the timestamp of the last data.
+        Trades are yielded once by trade_id and other data once by timestamp even if pages overlap.
+        Data up to the checkpoint is skipped, it was taken by the consumer of an interrupted load
+        """
+        by_id = self._pages_by_id
+        from_id = self._resume_from_id(checkpoint)
+        last_trade_id = last_timestamp = None
+        consumed = saved = None
+        completed = False
+        try:
+            while current_time - end_time < timedelta(seconds=1) and is_timestamp_changed:
+                try:
+                    if next_page is not None:
+                        timed_data = next_page.result()
+                        next_page = None
+                    elif self._executor is not None:
+                        timed_data = self._get_page(current_timestamp, end_timestamp, from_id)
+                    else:
+                        timed_data = self._request_page(current_timestamp, end_timestamp, from_id)
+                    if self._executor is not None and timed_data:
+                        next_cursor = self._next_cursor(timed_data[-1], current_timestamp, end_time, by_id)
+                        if next_cursor is not None:
+                            next_page = self._executor.submit(
+                                self._get_page, next_cursor[0], end_timestamp, next_cursor[1],
+                            )
+
+                    is_timestamp_changed = False
+                    yielded = False
+                    for data in timed_data:
+                        yielded = True
+                        trade_id = getattr(data, 'trade_id', None)
+                        if trade_id is not None:
+                            if by_id and as_timestamp(data.timestamp) > end_timestamp:
+                                break
+                            if last_trade_id is not None and trade_id <= last_trade_id:
+                                continue
+                            last_trade_id = trade_id
+                        else:
+                            timestamp = as_timestamp(data.timestamp)
+                            if last_timestamp is not None and timestamp <= last_timestamp:
+                                continue
+                            last_timestamp = timestamp
+                        if checkpoint is not None:
+                            if not checkpoint.is_passed_by(data):
+                                continue
+                            checkpoint = None
+                        # the data counts as taken once handed over, closing the generator at the yield must not repeat it
+                        consumed = data
+                        yield data
+                    if self._checkpoints is not None and consumed is not saved:
+                        self._save_checkpoint(start_timestamp, consumed)
+                        saved = consumed
+                    if yielded:
+                        next_cursor = self._next_cursor(data, current_timestamp, end_time, by_id)
+                        if next_cursor is not None:
+                            is_timestamp_changed = True
+                            current_timestamp, from_id = next_cursor
+                            current_time = from_timestamp(current_timestamp)
+                    pbar.n = current_timestamp - start_timestamp
+                    pbar.refresh()
+
+                except KeyboardInterrupt:
+                    break
+            else:
+                completed = True
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+            if self._checkpoints is not None:
+                if completed:
+                    self._checkpoints.delete(self._client_name, self._symbol, start_timestamp)
+                elif consumed is not saved:
+                    self._save_checkpoint(start_timestamp, consumed)
+
+    @staticmethod
+    def _next_cursor(
+        last_data: TData, current_timestamp: int, end_time: datetime, by_id: bool,
+    ) -> tuple[int, int | None] | None:
+        """
+        Returns (start timestamp, from id) of the page after the page ending with `last_data`, None after the last page
+        """
+        last_timestamp = as_timestamp(last_data.timestamp)
+        if from_timestamp(last_timestamp) - end_time >= timedelta(seconds=1):
+            return None
+        if by_id:
+            if last_timestamp > to_timestamp(end_time):
+                return None
+            return last_timestamp, last_data.trade_id + 1
+        if last_timestamp > current_timestamp:
+            return last_timestamp, None
+        return None
+
+    def _save_checkpoint(self, start_timestamp: int, data: TData):
+        self._checkpoints.save(self._client_name, self._symbol, start_timestamp, Checkpoint.of(data))
+
+    def _request_page(self, start_timestamp: int, end_timestamp: int, from_id: int | None) -> Iterable[TData]:
+        if from_id is not None:
+            return self._data_client.get_from_id(symbol=self._symbol, from_id=from_id)
+        return self._data_client.get(symbol=self._symbol, start_time=start_timestamp, end_time=end_timestamp)
+
+    def _get_page(self, start_timestamp: int, end_timestamp: int, from_id: int | None = None) -> list[TData]:
+        return list(self._request_page(start_timestamp, end_timestamp, from_id))
+
+
+def save_csv(all_data: Iterable[TimeData], csv_file_path: Path) -> None:
+    """
+    Writes loaded data to csv, one row per model
+    """
+    all_data = iter(all_data)
+    first_data = next(all_data, None)
+    if first_data is None:
+        csv_file_path.touch()
+        return
+    fieldnames = list(first_data.__class__.__fields__.keys())
+
+    with open(csv_file_path, mode="w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+
+        writer.writeheader()
+        writer.writerows((data.dict() for data in itertools.chain([first_data], all_data)))
 
 
 if __name__ == '__main__':
+    import binance
+
+    from data_loaders.store import ColumnarStore
+
     client = binance.Client()
-    spot_client = SpotClient(client=client)
-    perp_client = PerpClient(client=client)
-    open_interest_client = OpenInterestClient(client=client)
-    funding_rate_client = FundingRateClient(client=client)
+    cache = DiskCache()
+    scheduler = RequestScheduler()
+    spot_client = SpotClient(client=client, cache=cache, scheduler=scheduler)
+    perp_client = PerpClient(client=client, cache=cache, scheduler=scheduler)
+    open_interest_client = OpenInterestClient(client=client, cache=cache, scheduler=scheduler)
+    funding_rate_client = FundingRateClient(client=client, cache=cache, scheduler=scheduler)
 
     # now = datetime.now(timezone.utc)
     now = datetime(year=2024, month=9, day=13, hour=7, minute=0, second=0, tzinfo=timezone.utc)
     start = now - timedelta(days=1)
     end = start + timedelta(days=1)
+    symbol = 'BTCUSDT'
 
+    store = ColumnarStore()
+    checkpoints = CheckpointStore()
     for data_name, data_client in {
         'spot': spot_client,
         'perp': perp_client,
         'open_interest': open_interest_client,
         'funding_rate': funding_rate_client,
     }.items():
-        loader = Loader(data_client=data_client)
-        all_data = (
-            loader.load(
-                start_time=start,
-                end_time=end,
-            )
-        )
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-        csv_file_path = DATA_DIR / f"{data_name}_{start}_{end}.csv"
-
-        first_data = next(all_data)
-        fieldnames = list(first_data.__class__.__fields__.keys())
-
-        with open(csv_file_path, mode="w", newline="") as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-
-            writer.writeheader()
-            writer.writerows((data.dict() for data in itertools.chain([first_data], all_data)))
+        loader = Loader(data_client=data_client, symbol=symbol, checkpoints=checkpoints)
+        with closing(loader.load(start_time=start, end_time=end)) as all_data:
+            written = store.write(data_name, symbol, all_data)
 
-        print(f"Saved data to {csv_file_path}")
+        print(f'Saved {written} rows of {data_name} to {store.index_path(data_name, symbol).parent}')
@@ -0,0 +1,76 @@
+import heapq
+from typing import Hashable, Iterable, Iterator, Mapping, TypeVar
+
+from data_loaders.models.timedata import TimeData
+from data_loaders.time_conversion import as_timestamp
+
+TData = TypeVar('TData', bound=TimeData)
+TSource = TypeVar('TSource', bound=Hashable)
+
+
+class CommitIterator(Iterator[TData]):
+    """
+    Iterator that repeats the last element if it was not committed
+    """
+    def __init__(self, iterator: Iterator[TData]):
+        self._iterator = iterator
+        self._uncommitted: TData | None = None
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._uncommitted is None:
+            try:
+                self._uncommitted = next(self._iterator)
+            except StopIteration:
+                self.exhausted = True
+                raise
+        return self._uncommitted
+
+    def commit(self):
+        if self._uncommitted is None:
+            raise ValueError('No uncommitted data')
+        self._uncommitted = None
+
+    def close(self):
+        if hasattr(self._iterator, 'close'):
+            self._iterator.close()
+
+
+def merge_sources(sources: Mapping[TSource, Iterable[TData]]) -> Iterator[tuple[int, TSource, TData]]:
+    """
+    Merges sources sorted by timestamp into one stream of (timestamp in milliseconds, source, data) in timestamp order.
+    A heap holds the next data of every source, so every data costs O(log k) for k sources,
+    data with equal timestamps comes in the order of the sources.
+    Closing the stream closes the sources
+    """
+    iterators = [iter(source) for source in sources.values()]
+    heap = []
+    try:
+        # the index breaks timestamp ties, so data is never compared
+        for index, (source, iterator) in enumerate(zip(sources, iterators)):
+            for data in iterator:
+                heap.append((as_timestamp(data.timestamp), index, source, data, iterator))
+                break
+        heapq.heapify(heap)
+
+        while len(heap) > 1:
+            timestamp, index, source, data, iterator = heap[0]
+            yield timestamp, source, data
+            for data in iterator:
+                heapq.heapreplace(heap, (as_timestamp(data.timestamp), index, source, data, iterator))
+                break
+            else:
+                heapq.heappop(heap)
+
+        if heap:
+            timestamp, _, source, data, iterator = heap[0]
+            yield timestamp, source, data
+            for data in iterator:
+                yield as_timestamp(data.timestamp), source, data
+    finally:
+        for iterator in iterators:
+            if hasattr(iterator, 'close'):
+                iterator.close()
@@ -0,0 +1,292 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import TYPE_CHECKING, Sequence
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# upper bounds of histogram buckets, every histogram also has a +Inf bucket
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 15.0, 60.0, 300.0, 3600.0, 86400.0)
+WRITE_BUCKETS = (*FAST_BUCKETS, 0.05, 0.1, 0.5, 1.0)
+AGGREGATE_BUCKETS = (*WRITE_BUCKETS, 5.0, 30.0, 120.0)
+SIZE_BUCKETS = (0, 1, 10, 100, 250, 500, 750, 1000, 10_000, 100_000)
+
+
+class Counter:
+    """
+    Value of one label combination of a `CounterFamily`
+    """
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """
+    Bucket counts and sum of one label combination of a `HistogramFamily`,
+    an observation costs a binary search over the bucket bounds and a lock
+    """
+    __slots__ = ('_lock', '_bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Sequence[float]):
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        # the last count is the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> '_Timer':
+        """
+        Context manager observing the seconds spent inside it
+        """
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class MetricFamily:
+    """
+    Metric with a child per combination of label values,
+    hot paths keep the child returned by `labels` instead of looking it up for every observation
+    """
+    type: str
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children: dict[tuple[str, ...], Counter | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self) -> list[tuple[dict[str, str], Counter | Histogram]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.label_names, key)), child) for key, child in items]
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+class CounterFamily(MetricFamily):
+    type = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        self.labels(**labels).inc(amount)
+
+    def _new_child(self) -> Counter:
+        return Counter()
+
+
+class HistogramFamily(MetricFamily):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: str):
+        self.labels(**labels).observe(value)
+
+    def time(self, **labels: str) -> _Timer:
+        return self.labels(**labels).time()
+
+    def _new_child(self) -> Histogram:
+        return Histogram(self.buckets)
+
+
+class MetricsRegistry:
+    """
+    Metrics of the process, exposed in the Prometheus text format or as JSON,
+    written to a file (e.g. for the node exporter textfile collector) or served over HTTP
+    """
+    def __init__(self):
+        self._families: dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> CounterFamily:
+        return self._register(CounterFamily(name, documentation, label_names))
+
+    def histogram(
+        self, name: str, documentation: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> HistogramFamily:
+        return self._register(HistogramFamily(name, documentation, label_names, buckets))
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for family in self._snapshot():
+            lines.append(f'# HELP {family.name} {family.documentation}')
+            lines.append(f'# TYPE {family.name} {family.type}')
+            for labels, child in family.children():
+                if isinstance(child, Counter):
+                    lines.append(f'{family.name}{_format_labels(labels)} {child.value!r}')
+                    continue
+                cumulative = 0
+                for bound, count in zip((*family.buckets, float('inf')), child.counts):
+                    cumulative += count
+                    bucket_labels = _format_labels({**labels, 'le': _format_bound(bound)})
+                    lines.append(f'{family.name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{family.name}_sum{_format_labels(labels)} {child.sum!r}')
+                lines.append(f'{family.name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> dict:
+        metrics = {}
+        for family in self._snapshot():
+            samples = []
+            for labels, child in family.children():
+                if isinstance(child, Counter):
+                    samples.append({'labels': labels, 'value': child.value})
+                else:
+                    samples.append({
+                        'labels': labels,
+                        'count': sum(child.counts),
+                        'sum': child.sum,
+                        'buckets': {
+                            _format_bound(bound): count
+                            for bound, count in zip((*family.buckets, float('inf')), child.counts)
+                        },
+                    })
+            metrics[family.name] = {'type': family.type, 'help': family.documentation, 'samples': samples}
+        return metrics
+
+    def write(self, path: Path):
+        """
+        Replaces the file atomically, JSON for a `.json` path and the Prometheus text format otherwise
+        """
+        content = json.dumps(self.to_dict()) if path.suffix == '.json' else self.to_prometheus()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_name(path.name + '.tmp')
+        temporary_path.write_text(content)
+        temporary_path.replace(path)
+
+    def serve(self, port: int, host: str = '0.0.0.0') -> 'ThreadingHTTPServer':
+        """
+        Serves `/metrics` in the Prometheus text format and `/metrics.json` on a daemon thread,
+        call `shutdown` on the returned server to stop it
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = registry.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body, content_type = json.dumps(registry.to_dict()), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                encoded = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+    def _register(self, family: MetricFamily):
+        with self._lock:
+            if family.name in self._families:
+                raise ValueError(f'Metric {family.name} is already registered')
+            self._families[family.name] = family
+        return family
+
+    def _snapshot(self) -> list[MetricFamily]:
+        with self._lock:
+            return list(self._families.values())
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+METRICS = MetricsRegistry()
+
+PAGE_FETCH_SECONDS = METRICS.histogram(
+    'page_fetch_seconds', 'Time of requesting a page from the exchange, including rate limit waits',
+    ('client', 'symbol'),
+)
+PAGE_SIZE = METRICS.histogram(
+    'page_size', 'Rows of a page from the exchange', ('client', 'symbol'), buckets=SIZE_BUCKETS,
+)
+DECODE_SECONDS = METRICS.histogram(
+    'decode_seconds', 'Time of decoding a raw page into models or compact records', ('client', 'symbol'),
+)
+CANDLE_PROCESS_SECONDS = METRICS.histogram(
+    'candle_process_seconds',
+    'Wall time from the first data of a candle to its close, including pages fetched meanwhile',
+    ('processor', 'symbol'),
+)
+CANDLE_AGGREGATE_SECONDS = METRICS.histogram(
+    'candle_aggregate_seconds',
+    'Time of aggregating loaded data into candles without page fetches and decoding, per candle for the lazy '
+    'and streaming processors and per processed window or chunk for the pandas and numpy engines',
+    ('processor', 'symbol'), buckets=AGGREGATE_BUCKETS,
+)
+CANDLE_FILL_SECONDS = METRICS.histogram(
+    'candle_fill_seconds', 'Time of CandleFiller.fill_candle rolling a candle up into a coarser period',
+    ('period', 'symbol'), buckets=FAST_BUCKETS,
+)
+CANDLE_EMIT_LAG_SECONDS = METRICS.histogram(
+    'candle_emit_lag_seconds', 'Wall time between the close of a candle bucket and the candle being yielded',
+    ('processor', 'symbol'), buckets=LAG_BUCKETS,
+)
+CANDLES_TOTAL = METRICS.counter('candles_total', 'Candles yielded or returned', ('processor', 'symbol'))
+SINK_WRITE_SECONDS = METRICS.histogram(
+    'sink_write_seconds', 'Time of writing a candle, a record batch or a dataframe to a sink', ('sink',),
+    buckets=WRITE_BUCKETS,
+)
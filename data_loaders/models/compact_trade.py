@@ -0,0 +1,16 @@
+from typing import NamedTuple
+
+
+class CompactTrade(NamedTuple):
+    """
+    Aggregate trade without validation for the hot path, timestamp is int64 milliseconds in UTC
+    """
+    timestamp: int
+    trade_id: int
+    price: float
+    quantity: float
+    is_buyer_maker: bool
+
+
+class CompactFutureTrade(CompactTrade):
+    __slots__ = ()
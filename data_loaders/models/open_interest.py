@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import StrEnum
 
 from pydantic import BaseModel, Field, ConfigDict
@@ -32,3 +32,8 @@ class Period(StrEnum):
     SIX_HOURS = '6h'
     TWELVE_HOURS = '12h'
     ONE_DAY = '1d'
+
+    @property
+    def duration(self) -> timedelta:
+        units = {'m': timedelta(minutes=1), 'h': timedelta(hours=1), 'd': timedelta(days=1)}
+        return int(self[:-1]) * units[self[-1]]
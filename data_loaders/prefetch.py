@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import Executor
+from typing import Iterable, Iterator, Generic, TypeVar
+
+T = TypeVar('T')
+
+
+class PrefetchIterator(Iterator[T], Generic[T]):
+    """
+    Iterates the source on an executor worker into a bounded buffer,
+    so the consumer never waits on source I/O while the buffer has data.
+    The consumer takes the whole buffer at once to keep the synchronization cost per item low.
+    """
+    def __init__(self, iterable: Iterable[T], executor: Executor, buffer_size: int = 10_000):
+        """
+        :param buffer_size: max items waiting for the consumer, the worker blocks when the buffer is full
+        """
+        self._iterable = iterable
+        self._buffer_size = buffer_size
+        self._condition = threading.Condition()
+        self._buffer: list[T] = []
+        self._batch: list[T] = []
+        self._position = 0
+        self._exhausted = False
+        self._error: BaseException | None = None
+        self._closed = False
+        self._future = executor.submit(self._produce)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> T:
+        if self._position >= len(self._batch):
+            self._take_buffer()
+        item = self._batch[self._position]
+        self._position += 1
+        return item
+
+    def close(self):
+        """
+        Stops the worker, buffered items are dropped
+        """
+        with self._condition:
+            self._closed = True
+            self._buffer = []
+            self._condition.notify_all()
+
+    def _take_buffer(self):
+        with self._condition:
+            while not self._buffer and not self._exhausted and not self._closed:
+                self._condition.wait()
+            if not self._buffer:
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+                raise StopIteration
+            self._batch, self._buffer = self._buffer, []
+            self._position = 0
+            self._condition.notify_all()
+
+    def _produce(self):
+        iterator = iter(self._iterable)
+        condition = self._condition
+        try:
+            for item in iterator:
+                with condition:
+                    while len(self._buffer) >= self._buffer_size and not self._closed:
+                        condition.wait()
+                    if self._closed:
+                        break
+                    self._buffer.append(item)
+                    if len(self._buffer) == 1:
+                        condition.notify_all()
+        except BaseException as error:
+            self._error = error
+        finally:
+            if self._closed and hasattr(iterator, 'close'):
+                iterator.close()
+            with condition:
+                self._exhausted = True
+                condition.notify_all()
@@ -0,0 +1,178 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Mapping, TypeVar
+
+if TYPE_CHECKING:
+    from binance.exceptions import BinanceAPIException
+
+logger = logging.getLogger(__name__)
+T = TypeVar('T')
+
+THROTTLING_STATUS_CODES = (418, 429)
+# api error codes of a request that may succeed when repeated: disconnected and timeout waiting for the backend
+TRANSIENT_ERROR_CODES = (-1001, -1007)
+
+# request weight per minute allowed by the exchange for every pool of endpoints
+DEFAULT_BUDGETS = {
+    'spot': 6000,
+    'futures': 2400,
+}
+
+# pool and request weight of every endpoint
+ENDPOINTS: dict[str, tuple[str, int]] = {
+    'aggTrades': ('spot', 2),
+    'futures/aggTrades': ('futures', 20),
+    'futures/openInterestHist': ('futures', 1),
+    'futures/fundingRate': ('futures', 1),
+}
+
+
+class RequestScheduler:
+    """
+    Paces requests against weight budgets of endpoint pools over a sliding window,
+    so the exchange does not have to throttle us. Backs off with jitter on throttling responses
+    and on transient server errors, other errors are raised.
+    One scheduler is meant to be shared between all clients and threads.
+    """
+    def __init__(
+        self,
+        budgets: Mapping[str, int] = DEFAULT_BUDGETS,
+        endpoints: Mapping[str, tuple[str, int]] = ENDPOINTS,
+        window: float = 60.0,
+        max_retries: int = 8,
+        backoff_base: float = 1.0,
+        backoff_max: float = 120.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        :param budgets: max weight per `window` seconds of every pool
+        :param endpoints: pool and weight of every endpoint
+        :param max_retries: throttled or failed attempts of one request before the error is raised
+        :param backoff_base: first backoff in seconds when the exchange gives no Retry-After
+        :param backoff_max: backoff cap in seconds
+        """
+        self._budgets = dict(budgets)
+        self._endpoints = dict(endpoints)
+        self._window = window
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._requests: dict[str, deque[tuple[float, int]]] = {pool: deque() for pool in self._budgets}
+        self._used: dict[str, int] = {pool: 0 for pool in self._budgets}
+        self._blocked_until: dict[str, float] = {pool: 0.0 for pool in self._budgets}
+
+    def call(self, endpoint: str, request: Callable[[], T]) -> T:
+        from binance.exceptions import BinanceAPIException
+
+        attempt = 0
+        while True:
+            self.acquire(endpoint)
+            try:
+                return request()
+            except BinanceAPIException as error:
+                if not self.back_off(endpoint, error, attempt):
+                    raise
+                attempt += 1
+
+    def acquire(self, endpoint: str):
+        """
+        Waits until a request to the endpoint fits the budget of its pool and counts its weight
+        """
+        pool, weight = self._endpoints[endpoint]
+        self._acquire(pool, weight)
+
+    def back_off(self, endpoint: str, error: 'BinanceAPIException', attempt: int) -> bool:
+        """
+        Blocks the pool of the endpoint after a throttling response or a transient server error (5xx, disconnected)
+        of the `attempt`-th retry, returns False when the error is a client error or retries are used up
+        and the error should be raised
+        """
+        if attempt >= self._max_retries:
+            return False
+        if error.status_code in THROTTLING_STATUS_CODES:
+            delay = self._retry_after(error)
+        elif error.status_code >= 500 or error.code in TRANSIENT_ERROR_CODES:
+            delay = None
+        else:
+            return False
+        if delay is None:
+            delay = random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+        logger.warning('%s failed with %s (%s), backing off %.1fs', endpoint, error.status_code, error.code, delay)
+        pool, _ = self._endpoints[endpoint]
+        self._block(pool, delay)
+        return True
+
+    def observe_used_weight(self, endpoint: str, used_weight: int):
+        """
+        Aligns the tracked weight with the weight the exchange reports as used,
+        e.g. when other processes share the same IP
+        """
+        pool, _ = self._endpoints[endpoint]
+        with self._lock:
+            now = self._clock()
+            self._expire(pool, now)
+            if used_weight > self._used[pool]:
+                self._add(pool, now, used_weight - self._used[pool])
+
+    def _acquire(self, pool: str, weight: int):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._expire(pool, now)
+                wait = self._blocked_until[pool] - now
+                if wait <= 0:
+                    requests = self._requests[pool]
+                    if self._used[pool] + weight <= self._budgets[pool] or not requests:
+                        self._add(pool, now, weight)
+                        return
+                    # wait until enough of the oldest requests leave the window
+                    released = self._used[pool] + weight - self._budgets[pool]
+                    for timestamp, request_weight in requests:
+                        released -= request_weight
+                        if released <= 0:
+                            wait = timestamp + self._window - now
+                            break
+            self._sleep(max(wait, 0.0))
+
+    def _block(self, pool: str, delay: float):
+        with self._lock:
+            self._blocked_until[pool] = max(self._blocked_until[pool], self._clock() + delay)
+
+    def _add(self, pool: str, now: float, weight: int):
+        self._requests[pool].append((now, weight))
+        self._used[pool] += weight
+
+    def _expire(self, pool: str, now: float):
+        requests = self._requests[pool]
+        while requests and requests[0][0] <= now - self._window:
+            _, weight = requests.popleft()
+            self._used[pool] -= weight
+
+    @staticmethod
+    def _retry_after(error: 'BinanceAPIException') -> float | None:
+        headers = getattr(error.response, 'headers', None) or {}
+        retry_after = headers.get('Retry-After')
+        return float(retry_after) if retry_after is not None else None
+
+
+_default_scheduler: RequestScheduler | None = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_scheduler() -> RequestScheduler:
+    """
+    Scheduler with the default budgets shared by every client created without one,
+    so throttled requests are retried and clients of one process share the budgets
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
@@ -0,0 +1,291 @@
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from data_loaders.models.funding_rate import FundingRate
+from data_loaders.models.open_interest import OpenInterest
+from data_loaders.models.timedata import TimeData
+from data_loaders.models.trade import Trade, FutureTrade
+from data_loaders.time_conversion import as_timestamp
+from paths import STORE_DIR
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+SOURCES: dict[str, type[TimeData]] = {
+    'spot': Trade,
+    'perp': FutureTrade,
+    'open_interest': OpenInterest,
+    'funding_rate': FundingRate,
+}
+
+_ARROW_TYPES = {
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    str: pa.string(),
+    datetime: pa.int64(),
+}
+
+
+def _schema(model: type[TimeData]) -> pa.Schema:
+    # symbol is the partition key, timestamps are int64 milliseconds in UTC
+    return pa.schema([
+        (name, _ARROW_TYPES[field.annotation])
+        for name, field in model.model_fields.items()
+        if name != 'symbol'
+    ])
+
+
+SCHEMAS = {source: _schema(model) for source, model in SOURCES.items()}
+
+# values of columns compact records do not have (e.g. first_trade_id of a `CompactTrade`)
+DEFAULTS = {
+    source: {name: field.default for name, field in model.model_fields.items() if not field.is_required()}
+    for source, model in SOURCES.items()
+}
+
+# one entry per parquet row group of a source and symbol, sorted by first timestamp
+INDEX_SCHEMA = pa.schema([
+    ('first_timestamp', pa.int64()),
+    ('last_timestamp', pa.int64()),
+    ('path', pa.string()),
+    ('row_group', pa.int32()),
+    ('rows', pa.int64()),
+])
+INDEX_FILE = '_index.arrow'
+
+
+class ColumnarStore:
+    """
+    Stores loaded data as parquet files partitioned by source, symbol and UTC day:
+    `<root>/<source>/symbol=<symbol>/date=<YYYY-MM-DD>/part-<first timestamp>.parquet`.
+    A sparse time index per source and symbol, `<root>/<source>/symbol=<symbol>/_index.arrow`,
+    keeps the time range of every row group so a window is read from the overlapping row groups only
+    """
+
+    def __init__(self, root: Path = STORE_DIR, batch_size: int = 100_000):
+        """
+        :param root: directory of the store
+        :param batch_size: rows per parquet row group, the granularity of the time index
+        """
+        self._root = root
+        self._batch_size = batch_size
+
+    def partition(self, source: str, symbol: str, day: date) -> Path:
+        return self._root / source / f'symbol={symbol}' / f'date={day.isoformat()}'
+
+    def index_path(self, source: str, symbol: str) -> Path:
+        return self._root / source / f'symbol={symbol}' / INDEX_FILE
+
+    def write(self, source: str, symbol: str, data: Iterable[TimeData]) -> int:
+        """
+        Writes data sorted by timestamp, one file per touched day. Models and compact records are accepted,
+        columns a compact record does not have get the default of the model field.
+        Trades repeated by the loader on page boundaries are written once,
+        a file overlapping files already in its day is merged with them (see `_merge_part`).
+
+        :return: number of written rows
+        """
+        schema = SCHEMAS[source]
+        defaults = DEFAULTS[source]
+        deduplicate = 'trade_id' in schema.names
+        last_trade_id = None
+        writer: pq.ParquetWriter | None = None
+        current_day = None
+        columns: dict[str, list] = {name: [] for name in schema.names}
+        column_values = list(columns.values())
+        written = 0
+        path = None
+        blocks: list[tuple[int, int, str, int, int]] = []
+        removed: list[str] = []
+
+        def flush():
+            nonlocal written
+            timestamps = columns['timestamp']
+            if timestamps:
+                writer.write_table(pa.table(columns, schema=schema))
+                written += len(timestamps)
+                for values in columns.values():
+                    values.clear()
+
+        def close():
+            flush()
+            writer.close()
+            part_blocks, superseded = self._merge_part(path, 'trade_id' if deduplicate else 'timestamp')
+            blocks.extend(part_blocks)
+            removed.extend(superseded)
+
+        try:
+            for item in data:
+                if deduplicate and last_trade_id is not None and item.trade_id <= last_trade_id:
+                    continue
+
+                timestamp = as_timestamp(item.timestamp)
+                day = timestamp // MS_PER_DAY
+                if day != current_day or len(columns['timestamp']) >= self._batch_size:
+                    if day != current_day:
+                        if writer is not None:
+                            close()
+                        current_day = day
+                        # written aside until it is merged into the partition
+                        path = self.partition(source, symbol, _to_date(day)) / f'part-{timestamp}.parquet.tmp'
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        writer = pq.ParquetWriter(path, schema, compression='zstd')
+                    else:
+                        flush()
+
+                # the row is complete before it is appended, an error inside a row leaves the columns aligned
+                row = [
+                    timestamp if name == 'timestamp'
+                    else getattr(item, name, defaults[name]) if name in defaults
+                    else getattr(item, name)
+                    for name in schema.names
+                ]
+                for values, value in zip(column_values, row):
+                    values.append(value)
+                if deduplicate:
+                    last_trade_id = item.trade_id
+        finally:
+            # data taken before an interruption is written, a checkpointed loader resumes after it
+            if writer is not None:
+                close()
+                self._update_index(source, symbol, blocks, removed)
+        return written
+
+    def _merge_part(self, new_part: Path, key: str) -> tuple[list[tuple[int, int, str, int, int]], list[str]]:
+        """
+        Moves a newly written file into its partition. Files of the partition overlapping its time range
+        (e.g. a window loaded again) are merged with it into one file sorted by `key` with every `key` once,
+        rows of the new file win, so the files of a partition never overlap.
+
+        :return: index entries of the resulting file and paths of the superseded files
+        """
+        new_blocks = list(self._footer_blocks(new_part))
+        first_timestamp = min(block[0] for block in new_blocks)
+        last_timestamp = max(block[1] for block in new_blocks)
+        overlapping = [
+            part for part in sorted(new_part.parent.glob('part-*.parquet'))
+            if any(
+                block[0] <= last_timestamp and first_timestamp <= block[1] for block in self._footer_blocks(part)
+            )
+        ]
+        if not overlapping:
+            path = new_part.with_name(f'part-{first_timestamp}.parquet')
+            new_part.replace(path)
+            return [(*block[:2], path.relative_to(self._root).as_posix(), *block[3:]) for block in new_blocks], []
+
+        table = pa.concat_tables([pq.read_table(part) for part in (new_part, *overlapping)])
+        # the sort is stable, the first row of a key comes from the new file
+        table = table.take(pc.sort_indices(table, sort_keys=[(key, 'ascending')]))
+        keys = table.column(key).to_numpy()
+        table = table.filter(pa.array(np.concatenate(([True], keys[1:] != keys[:-1]))))
+
+        path = new_part.with_name(f'part-{table.column("timestamp")[0].as_py()}.parquet')
+        pq.write_table(table, new_part, row_group_size=self._batch_size, compression='zstd')
+        new_part.replace(path)
+        superseded = [part for part in overlapping if part != path]
+        for part in superseded:
+            part.unlink()
+        return list(self._footer_blocks(path)), [part.relative_to(self._root).as_posix() for part in superseded]
+
+    def read(
+        self, source: str, symbol: str, start_time: int, end_time: int, columns: Sequence[str] | None = None,
+    ) -> pa.Table:
+        """
+        Reads rows with start_time <= timestamp <= end_time (milliseconds) in timestamp order,
+        only row groups overlapping the window and only requested columns are read
+        """
+        schema = SCHEMAS[source]
+        names = list(columns) if columns is not None else schema.names
+        read_names = names if 'timestamp' in names else [*names, 'timestamp']
+        tables = []
+        for path, row_groups in self._find_blocks(source, symbol, start_time, end_time).items():
+            table = pq.ParquetFile(self._root / path).read_row_groups(row_groups, columns=read_names)
+            timestamp = table.column('timestamp')
+            tables.append(table.filter(
+                pc.and_(pc.greater_equal(timestamp, start_time), pc.less_equal(timestamp, end_time))
+            ))
+        if not tables:
+            return schema.empty_table().select(names)
+        return pa.concat_tables(tables).select(names)
+
+    def read_index(self, source: str, symbol: str) -> pa.Table:
+        """
+        Returns the time index of a source and symbol, it is built from parquet footers when missing
+        """
+        path = self.index_path(source, symbol)
+        if not path.exists():
+            self._update_index(source, symbol, [])
+        with pa.memory_map(str(path)) as index_file:
+            return pa.ipc.open_file(index_file).read_all()
+
+    def _find_blocks(self, source: str, symbol: str, start_time: int, end_time: int) -> dict[str, list[int]]:
+        """
+        Returns row groups overlapping the window by file in timestamp order, found by binary search over the index
+        """
+        index = self.read_index(source, symbol)
+        first_timestamps = index.column('first_timestamp').to_numpy()
+        # files of a partition do not overlap, the running max only guards an index of overlapping files
+        last_timestamps = np.maximum.accumulate(index.column('last_timestamp').to_numpy())
+        lo = np.searchsorted(last_timestamps, start_time, side='left')
+        hi = np.searchsorted(first_timestamps, end_time, side='right')
+        blocks: dict[str, list[int]] = {}
+        for block in index.slice(lo, max(hi - lo, 0)).to_pylist():
+            if block['last_timestamp'] >= start_time:
+                blocks.setdefault(block['path'], []).append(block['row_group'])
+        return blocks
+
+    def _update_index(
+        self, source: str, symbol: str, blocks: list[tuple[int, int, str, int, int]], removed: Sequence[str] = (),
+    ):
+        """
+        Replaces index entries of rewritten files with `blocks` and drops entries of `removed` files,
+        entries of other files come from the saved index or, without one, from parquet footers
+        """
+        path = self.index_path(source, symbol)
+        if path.exists():
+            with pa.memory_map(str(path)) as index_file:
+                entries = pa.ipc.open_file(index_file).read_all().to_pylist()
+        else:
+            entries = [
+                {name: value for name, value in zip(INDEX_SCHEMA.names, block)}
+                for part in sorted(path.parent.glob('date=*/part-*.parquet'))
+                for block in self._footer_blocks(part)
+            ]
+        rewritten = {block[2] for block in blocks} | set(removed)
+        entries = [entry for entry in entries if entry['path'] not in rewritten]
+        entries += [{name: value for name, value in zip(INDEX_SCHEMA.names, block)} for block in blocks]
+        entries.sort(key=lambda entry: (entry['first_timestamp'], entry['path'], entry['row_group']))
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix('.tmp')
+        with pa.ipc.new_file(temporary_path, INDEX_SCHEMA) as writer:
+            writer.write_table(pa.Table.from_pylist(entries, schema=INDEX_SCHEMA))
+        temporary_path.replace(path)
+
+    def _footer_blocks(self, part: Path) -> Iterable[tuple[int, int, str, int, int]]:
+        metadata = pq.ParquetFile(part).metadata
+        column = metadata.schema.to_arrow_schema().get_field_index('timestamp')
+        for row_group in range(metadata.num_row_groups):
+            row_group_metadata = metadata.row_group(row_group)
+            statistics = row_group_metadata.column(column).statistics
+            if row_group_metadata.num_rows:
+                yield (
+                    statistics.min, statistics.max, part.relative_to(self._root).as_posix(), row_group,
+                    row_group_metadata.num_rows,
+                )
+
+    def read_arrays(
+        self, source: str, symbol: str, start_time: int, end_time: int, columns: Sequence[str] | None = None,
+    ) -> dict[str, np.ndarray]:
+        table = self.read(source, symbol, start_time, end_time, columns)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+
+def _to_date(day: int) -> date:
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=day)).date()
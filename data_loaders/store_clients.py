@@ -0,0 +1,50 @@
+from typing import Iterable
+
+from data_loaders.clients import IClient, TData
+from data_loaders.models.funding_rate import FundingRate
+from data_loaders.models.open_interest import OpenInterest
+from data_loaders.models.trade import Trade, FutureTrade
+from data_loaders.store import ColumnarStore
+
+
+class StoreClient(IClient[TData]):
+    """
+    Serves data saved to a `ColumnarStore` without touching the network,
+    a window is read from the row groups found in the store time index
+    """
+    model: type[TData]
+    source: str
+
+    def __init__(self, store: ColumnarStore, limit: int | None = None):
+        """
+        :param limit: max rows per `get` like the exchange page limit, whole window if None
+        """
+        self._store = store
+        self._limit = limit
+
+    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[TData]:
+        table = self._store.read(self.source, symbol, start_time, end_time)
+        if self._limit is not None:
+            table = table.slice(0, self._limit)
+        for row in table.to_pylist():
+            yield self.model.model_validate({**row, 'symbol': symbol})
+
+
+class StoreSpotClient(StoreClient[Trade]):
+    model = Trade
+    source = 'spot'
+
+
+class StorePerpClient(StoreClient[FutureTrade]):
+    model = FutureTrade
+    source = 'perp'
+
+
+class StoreOpenInterestClient(StoreClient[OpenInterest]):
+    model = OpenInterest
+    source = 'open_interest'
+
+
+class StoreFundingRateClient(StoreClient[FundingRate]):
+    model = FundingRate
+    source = 'funding_rate'
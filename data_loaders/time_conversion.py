@@ -1,14 +1,42 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from data_loaders.models.open_interest import Period
+
+EPOCH = datetime(year=1970, month=1, day=1, tzinfo=timezone.utc)
 
 
 def to_timestamp(date: datetime) -> int:
     return int(date.timestamp() * 1000)
 
 
-def to_minute_timeframe(dt: datetime, interval=5) -> datetime:
+def from_timestamp(timestamp: int) -> datetime:
+    return EPOCH + timedelta(milliseconds=timestamp)
+
+
+def as_timestamp(value: datetime | int) -> int:
+    """
+    Milliseconds of a model timestamp, compact records already keep milliseconds
+    """
+    return value if isinstance(value, int) else to_timestamp(value)
+
+
+def to_timeframe(dt: datetime, interval: timedelta) -> datetime:
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
-    dt = dt.replace(second=0, microsecond=0)
-    minute = (dt.minute // interval) * interval
-    dt = dt.replace(minute=minute)
-    return dt
+    return dt - (dt - EPOCH) % interval
+
+
+def sort_periods(periods: Iterable[Period]) -> list[Period]:
+    """
+    Returns unique periods from the finest to the coarsest,
+    coarser periods must be multiples of the finest to be rolled up from it
+    """
+    periods = sorted(set(periods), key=lambda period: period.duration)
+    if not periods:
+        raise ValueError('At least one period is required')
+    finest = periods[0]
+    for period in periods[1:]:
+        if period.duration % finest.duration:
+            raise ValueError(f'Period {period} is not a multiple of {finest}')
+    return periods
@@ -0,0 +1,133 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Callable, Iterable
+
+from data_loaders.cache import DiskCache
+from data_loaders.clients import (
+    SpotClient, PerpClient, OpenInterestClient,
+    FundingRateClient,
+)
+from data_loaders.rate_limit import RequestScheduler, DEFAULT_BUDGETS
+from data_loaders.time_conversion import to_timeframe
+from data_processors.candle_filler import CandleFiller
+from data_processors.lazy import LazyCandleProcessor
+from data_processors.models.candles import Candle
+from paths import PROCESSED_DIR
+
+# shards are half-open, the last millisecond before the next shard belongs to the previous one
+SHARD_END_OFFSET = timedelta(milliseconds=1)
+
+
+def live_processor(workers: int = 1) -> LazyCandleProcessor:
+    """
+    :param workers: processes requesting at the same time from one IP, each gets an equal share of the budgets,
+        so the exchange limits of the IP hold for all of them together
+    """
+    import binance
+
+    client = binance.Client()
+    cache = DiskCache()
+    scheduler = RequestScheduler(budgets={pool: budget // workers for pool, budget in DEFAULT_BUDGETS.items()})
+    return LazyCandleProcessor(
+        spot_client=SpotClient(client=client, cache=cache, scheduler=scheduler),
+        perp_client=PerpClient(client=client, cache=cache, scheduler=scheduler),
+        open_interest_client=OpenInterestClient(client=client, cache=cache, scheduler=scheduler),
+        funding_rate_client=FundingRateClient(client=client, cache=cache, scheduler=scheduler),
+        candle_filler=CandleFiller(),
+    )
+
+
+def split_shards(
+    start_time: datetime, end_time: datetime, shard_duration: timedelta, interval: timedelta,
+) -> list[tuple[datetime, datetime]]:
+    """
+    Splits [start_time, end_time] into shards with inclusive bounds,
+    every shard but the first starts on a candle bucket, so no candle is split between shards
+    """
+    if shard_duration % interval:
+        raise ValueError(f'Shard duration {shard_duration} is not a multiple of candle interval {interval}')
+    shards = []
+    shard_start = start_time
+    shard_end = to_timeframe(start_time, interval) + shard_duration
+    while shard_end <= end_time:
+        shards.append((shard_start, shard_end - SHARD_END_OFFSET))
+        shard_start = shard_end
+        shard_end += shard_duration
+    if shard_start <= end_time:
+        shards.append((shard_start, end_time))
+    return shards
+
+
+def _process_shard(
+    processor_factory: Callable[[], LazyCandleProcessor], start_time: datetime, end_time: datetime,
+) -> list[Candle]:
+    return list(processor_factory().process(start_time=start_time, end_time=end_time))
+
+
+class ShardedBackfill:
+    """
+    Processes a long time range as candle aligned shards in a process pool
+    and yields candles of all shards in time order
+    """
+    def __init__(
+        self,
+        processor_factory: Callable[[], LazyCandleProcessor] | None = None,
+        shard_duration: timedelta = timedelta(hours=6),
+        interval: timedelta = timedelta(minutes=5),
+        max_workers: int | None = None,
+    ):
+        """
+        :param processor_factory: picklable callable creating the processor inside a worker process,
+            `live_processor` with the request budgets split between the workers if None.
+            Every worker has its own scheduler, a factory of network clients must split the budgets the same way
+        :param shard_duration: time range of one shard, a multiple of `interval`
+        :param interval: candle interval of the processor
+        :param max_workers: worker processes, cpu count if None
+        """
+        self._max_workers = max_workers if max_workers is not None else os.cpu_count() or 1
+        self._processor_factory = (
+            processor_factory if processor_factory is not None else partial(live_processor, workers=self._max_workers)
+        )
+        self._shard_duration = shard_duration
+        self._interval = interval
+
+    def process(self, start_time: datetime, end_time: datetime) -> Iterable[Candle]:
+        shards = split_shards(start_time, end_time, self._shard_duration, self._interval)
+        previous_timestamp = None
+        with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+            for candles in executor.map(
+                _process_shard,
+                [self._processor_factory] * len(shards),
+                [shard_start for shard_start, _ in shards],
+                [shard_end for _, shard_end in shards],
+            ):
+                for candle in candles:
+                    if previous_timestamp is not None and candle.timestamp <= previous_timestamp:
+                        raise ValueError(f'Candle {candle.timestamp} is out of order after {previous_timestamp}')
+                    previous_timestamp = candle.timestamp
+                    yield candle
+
+
+if __name__ == '__main__':
+    backfill = ShardedBackfill()
+
+    now = datetime(
+        year=2024, month=9, day=13, hour=7, minute=0, second=0, tzinfo=timezone.utc
+    )
+    start = now - timedelta(days=30)
+    end = now
+    candles = backfill.process(start_time=start, end_time=end)
+
+    fieldnames = list(Candle.__fields__.keys())
+    fieldnames.remove('open_timestamp')
+    fieldnames.remove('close_timestamp')
+
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    with open(PROCESSED_DIR / 'result_backfill.csv', mode="w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+
+        writer.writeheader()
+        writer.writerows((candle.dict(exclude=['open_timestamp', 'close_timestamp']) for candle in candles))
@@ -0,0 +1,129 @@
+from datetime import datetime
+from typing import Any
+
+from data_loaders.models.compact_trade import CompactTrade, CompactFutureTrade
+from data_loaders.models.funding_rate import FundingRate
+from data_loaders.models.open_interest import OpenInterest
+from data_loaders.models.trade import Trade, FutureTrade
+from data_loaders.time_conversion import from_timestamp
+from data_processors.models.candles import Candle
+
+# Slots of a market block, the block of a market starts at its offset in the row
+(
+    OPEN, HIGH, LOW, CLOSE, VOLUME, BUY_VOLUME, SELL_VOLUME, TRADES, BUY_TRADES, SELL_TRADES,
+    OPEN_TIMESTAMP, CLOSE_TIMESTAMP,
+) = range(12)
+MARKET_SLOTS = 12
+TOTAL, SPOT, PERP = (index * MARKET_SLOTS for index in range(3))
+OPEN_INTEREST, FUNDING_RATE = range(3 * MARKET_SLOTS, 3 * MARKET_SLOTS + 2)
+ROW_SIZE = FUNDING_RATE + 1
+
+_EMPTY_MARKET = [None, float('-inf'), float('inf'), None, 0.0, 0.0, 0.0, 0, 0, 0, None, None]
+_EMPTY_ROW = _EMPTY_MARKET * 3 + [None] * 2
+
+
+class CandleAccumulator:
+    """
+    Accumulates the open candle in a flat row with one slot per field,
+    a `Candle` is built only when the candle is closed.
+    Open and close prices are those of the first and the last trade of every market, so trades of different markets
+    can come in any order, trades of one market must come in time order
+    """
+    def __init__(self):
+        self._row = list(_EMPTY_ROW)
+        self._handlers = {
+            Trade: self._add_spot_trade,
+            CompactTrade: self._add_spot_trade,
+            FutureTrade: self._add_perp_trade,
+            CompactFutureTrade: self._add_perp_trade,
+            OpenInterest: self._add_open_interest,
+            FundingRate: self._add_funding_rate,
+        }
+
+    def add(self, data: Any):
+        handler = self._handlers.get(type(data))
+        if handler is None:
+            raise NotImplementedError(f'Data of type {type(data)} is not yet supported')
+        handler(data)
+
+    def close(self, timestamp: datetime) -> Candle:
+        """
+        Builds the candle of the accumulated data and starts a new empty one
+        """
+        row = self._row
+        self._row = list(_EMPTY_ROW)
+        # totals are summed per market, so they do not depend on how trades of the markets interleave
+        for slot in (VOLUME, BUY_VOLUME, SELL_VOLUME, TRADES, BUY_TRADES, SELL_TRADES):
+            row[TOTAL + slot] = row[SPOT + slot] + row[PERP + slot]
+
+        fields = {
+            'timestamp': timestamp,
+            'open_timestamp': _to_datetime(row[TOTAL + OPEN_TIMESTAMP]),
+            'close_timestamp': _to_datetime(row[TOTAL + CLOSE_TIMESTAMP]),
+            'open_interest': row[OPEN_INTEREST],
+            'funding_rate': row[FUNDING_RATE],
+        }
+        for market, offset in (('total', TOTAL), ('spot', SPOT), ('perp', PERP)):
+            trades, buy_trades, sell_trades = row[offset + TRADES], row[offset + BUY_TRADES], row[offset + SELL_TRADES]
+            fields[f'volume_{market}'] = row[offset + VOLUME] if trades else None
+            fields[f'trades_{market}'] = trades or None
+            fields[f'buy_volume_{market}'] = row[offset + BUY_VOLUME] if buy_trades else None
+            fields[f'buy_trades_{market}'] = buy_trades or None
+            fields[f'sell_volume_{market}'] = row[offset + SELL_VOLUME] if sell_trades else None
+            fields[f'sell_trades_{market}'] = sell_trades or None
+            if offset != TOTAL:
+                fields[f'open_{market}'] = row[offset + OPEN]
+                fields[f'close_{market}'] = row[offset + CLOSE]
+                fields[f'high_{market}'] = row[offset + HIGH] if trades else None
+                fields[f'low_{market}'] = row[offset + LOW] if trades else None
+        return Candle(**fields)
+
+    def _add_spot_trade(self, data: Trade | CompactTrade):
+        self._add_trade(SPOT, data.timestamp, data.price, data.quantity, data.is_buyer_maker)
+
+    def _add_perp_trade(self, data: FutureTrade | CompactFutureTrade):
+        self._add_trade(PERP, data.timestamp, data.price, data.quantity, data.is_buyer_maker)
+
+    def _add_trade(self, offset: int, timestamp: datetime | int, price: float, quantity: float, is_buyer_maker: bool):
+        row = self._row
+        open_timestamp = row[offset + OPEN_TIMESTAMP]
+        if open_timestamp is None or timestamp < open_timestamp:
+            row[offset + OPEN_TIMESTAMP] = timestamp
+            row[offset + OPEN] = price
+            total_open_timestamp = row[OPEN_TIMESTAMP]
+            if total_open_timestamp is None or timestamp < total_open_timestamp:
+                row[OPEN_TIMESTAMP] = timestamp
+        close_timestamp = row[offset + CLOSE_TIMESTAMP]
+        if close_timestamp is None or timestamp >= close_timestamp:
+            row[offset + CLOSE_TIMESTAMP] = timestamp
+            row[offset + CLOSE] = price
+            total_close_timestamp = row[CLOSE_TIMESTAMP]
+            if total_close_timestamp is None or timestamp > total_close_timestamp:
+                row[CLOSE_TIMESTAMP] = timestamp
+
+        if price > row[offset + HIGH]:
+            row[offset + HIGH] = price
+        if price < row[offset + LOW]:
+            row[offset + LOW] = price
+
+        row[offset + VOLUME] += quantity
+        row[offset + TRADES] += 1
+        # buy and sell are taker sides, the taker of a buyer maker trade sold
+        if not is_buyer_maker:
+            row[offset + BUY_VOLUME] += quantity
+            row[offset + BUY_TRADES] += 1
+        else:
+            row[offset + SELL_VOLUME] += quantity
+            row[offset + SELL_TRADES] += 1
+
+    def _add_open_interest(self, data: OpenInterest):
+        self._row[OPEN_INTEREST] = data.sum_open_interest
+
+    def _add_funding_rate(self, data: FundingRate):
+        self._row[FUNDING_RATE] = data.funding_rate
+
+
+def _to_datetime(timestamp: datetime | int | None) -> datetime | None:
+    if isinstance(timestamp, int):
+        return from_timestamp(timestamp)
+    return timestamp
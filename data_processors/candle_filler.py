@@ -1,13 +1,21 @@
 from functools import singledispatch, singledispatchmethod
 from typing import Any
 
+from data_loaders.models.compact_trade import CompactTrade, CompactFutureTrade
 from data_loaders.models.funding_rate import FundingRate
 from data_loaders.models.open_interest import OpenInterest
 from data_loaders.models.trade import Trade, FutureTrade
+from data_loaders.time_conversion import from_timestamp
 from data_processors.models.candles import Candle
 
 
 class CandleFiller:
+    _SUMMED_FIELDS = tuple(
+        f'{name}_{market}'
+        for name in ('volume', 'buy_volume', 'sell_volume', 'trades', 'buy_trades', 'sell_trades')
+        for market in ('total', 'spot', 'perp')
+    )
+
     @singledispatchmethod
     def fill_candle(self, data: Any, candle: Candle):
         raise NotImplementedError(f'Data of type {type(data)} is not yet supported')
@@ -27,7 +35,7 @@ class CandleFiller:
         candle.volume_spot = data.quantity if not candle.volume_spot else candle.volume_spot + data.quantity
         candle.trades_spot = 1 if not candle.trades_spot else candle.trades_spot + 1
 
-        if data.is_buyer_maker:
+        if not data.is_buyer_maker:
             candle.buy_volume_spot = data.quantity if not candle.buy_volume_spot else candle.buy_volume_spot + data.quantity
             candle.buy_trades_spot = 1 if not candle.buy_trades_spot else candle.buy_trades_spot + 1
         else:
@@ -49,13 +57,21 @@ class CandleFiller:
         candle.volume_perp = data.quantity if not candle.volume_perp else candle.volume_perp + data.quantity
         candle.trades_perp = 1 if not candle.trades_perp else candle.trades_perp + 1
 
-        if data.is_buyer_maker:
+        if not data.is_buyer_maker:
             candle.buy_volume_perp = data.quantity if not candle.buy_volume_perp else candle.buy_volume_perp + data.quantity
             candle.buy_trades_perp = 1 if not candle.buy_trades_perp else candle.buy_trades_perp + 1
         else:
             candle.sell_volume_perp = data.quantity if not candle.sell_volume_perp else candle.sell_volume_perp + data.quantity
             candle.sell_trades_perp = 1 if not candle.sell_trades_perp else candle.sell_trades_perp + 1
 
+    @fill_candle.register(CompactTrade)
+    def fill_candle_compact_trade(self, data: CompactTrade, candle: Candle):
+        self.fill_candle_trade(data._replace(timestamp=from_timestamp(data.timestamp)), candle)
+
+    @fill_candle.register(CompactFutureTrade)
+    def fill_candle_compact_future_trade(self, data: CompactFutureTrade, candle: Candle):
+        self.fill_candle_future_trade(data._replace(timestamp=from_timestamp(data.timestamp)), candle)
+
     @fill_candle.register(FundingRate)
     def fill_candle_funding_rate(self, data: FundingRate, candle: Candle):
         candle.funding_rate = data.funding_rate
@@ -64,7 +80,43 @@ class CandleFiller:
     def fill_candle_open_interest(self, data: OpenInterest, candle: Candle):
         candle.open_interest = data.sum_open_interest
 
+    @fill_candle.register(Candle)
+    def fill_candle_candle(self, data: Candle, candle: Candle):
+        """
+        Rolls a finer candle up into a coarser one, finer candles must come in time order
+        """
+        if data.open_timestamp is not None:
+            candle.open_timestamp = min(candle.open_timestamp or data.open_timestamp, data.open_timestamp)
+        if data.close_timestamp is not None:
+            candle.close_timestamp = max(candle.close_timestamp or data.close_timestamp, data.close_timestamp)
+
+        for market in ('spot', 'perp'):
+            open_name, high_name, low_name, close_name = (
+                f'{name}_{market}' for name in ('open', 'high', 'low', 'close')
+            )
+            if getattr(candle, open_name) is None:
+                setattr(candle, open_name, getattr(data, open_name))
+            if getattr(data, close_name) is not None:
+                setattr(candle, close_name, getattr(data, close_name))
+            if getattr(data, high_name) is not None:
+                setattr(candle, high_name, max(getattr(candle, high_name) or getattr(data, high_name), getattr(data, high_name)))
+            if getattr(data, low_name) is not None:
+                setattr(candle, low_name, min(getattr(candle, low_name) or getattr(data, low_name), getattr(data, low_name)))
+
+        for name in self._SUMMED_FIELDS:
+            value = getattr(data, name)
+            if value is not None:
+                setattr(candle, name, value if not getattr(candle, name) else getattr(candle, name) + value)
+
+        if data.open_interest is not None:
+            candle.open_interest = data.open_interest
+        if data.funding_rate is not None:
+            candle.funding_rate = data.funding_rate
+
     def _base_process_candle_trade(self, data: Trade, candle: Candle):
+        """
+        Buy and sell are taker sides, a trade with buyer maker is a sell
+        """
         candle.open_timestamp = min(
             candle.open_timestamp or data.timestamp, data.timestamp
         )
@@ -75,7 +127,7 @@ class CandleFiller:
         candle.volume_total = data.quantity if not candle.volume_total else candle.volume_total + data.quantity
         candle.trades_total = 1 if not candle.trades_total else candle.trades_total + 1
 
-        if data.is_buyer_maker:
+        if not data.is_buyer_maker:
             candle.buy_volume_total = data.quantity if not candle.buy_volume_total else candle.buy_volume_total + data.quantity
             candle.buy_trades_total = 1 if not candle.buy_trades_total else candle.buy_trades_total + 1
         else:
@@ -0,0 +1,222 @@
+import csv
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from pydantic import BaseModel, Field
+
+from data_loaders.cache import DiskCache
+from data_loaders.clients import (
+    IClient, IFromIdClient, SpotClient, PerpClient, OpenInterestClient,
+    FundingRateClient, TData,
+)
+from data_loaders.rate_limit import RequestScheduler
+from data_loaders.time_conversion import to_timeframe, to_timestamp, as_timestamp
+from data_processors.candle_filler import CandleFiller
+from data_processors.lazy import LazyCandleProcessor
+from data_processors.models.candles import Candle
+from paths import PROCESSED_DIR
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from data_processors.pandas_dataframe import PandasCandleProcessor
+
+# runs process half-open windows, the last millisecond before the open candle is the end
+WINDOW_END_OFFSET = timedelta(milliseconds=1)
+
+
+class Watermark(BaseModel):
+    closed_until: datetime = Field(description="End of the last closed candle, start of the open candle")
+    last_trade_ids: dict[str, int] = Field(
+        default_factory=dict, description="Last aggregate trade id inside closed candles per source"
+    )
+    output_size: int = Field(0, description="Size of the output file in bytes after the last run")
+
+
+class _ResumingClient(IClient[TData]):
+    """
+    Skips trades that were already processed and remembers the last trade id before `closed_until`
+    """
+    def __init__(self, client: IClient[TData], last_trade_id: int | None, closed_until: datetime):
+        self._client = client
+        self._closed_until = to_timestamp(closed_until)
+        self._last_seen_trade_id = last_trade_id
+        self.last_trade_id = last_trade_id
+
+    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[TData]:
+        return self._resume(self._client.get(symbol=symbol, start_time=start_time, end_time=end_time))
+
+    def _resume(self, page: Iterable[TData]) -> Iterable[TData]:
+        for data in page:
+            # trade ids grow with time, anything not above the last seen id was already processed
+            if self._last_seen_trade_id is not None and data.trade_id <= self._last_seen_trade_id:
+                continue
+            self._last_seen_trade_id = data.trade_id
+            if as_timestamp(data.timestamp) < self._closed_until:
+                self.last_trade_id = data.trade_id
+            yield data
+
+
+class _ResumingFromIdClient(_ResumingClient[TData], IFromIdClient[TData]):
+    """
+    `_ResumingClient` of a client paging by trade id, so the loader keeps paging by id
+    """
+    _client: IFromIdClient[TData]
+
+    def get_from_id(self, symbol: str, from_id: int) -> Iterable[TData]:
+        return self._resume(self._client.get_from_id(symbol=symbol, from_id=from_id))
+
+
+def _resuming_client(client: IClient[TData], last_trade_id: int | None, closed_until: datetime) -> _ResumingClient:
+    resuming_client = _ResumingFromIdClient if isinstance(client, IFromIdClient) else _ResumingClient
+    return resuming_client(client, last_trade_id, closed_until)
+
+
+def lazy_processor(
+    spot_client: IClient, perp_client: IClient, open_interest_client: IClient, funding_rate_client: IClient,
+) -> LazyCandleProcessor:
+    return LazyCandleProcessor(
+        spot_client=spot_client,
+        perp_client=perp_client,
+        open_interest_client=open_interest_client,
+        funding_rate_client=funding_rate_client,
+        candle_filler=CandleFiller(),
+    )
+
+
+def pandas_processor(
+    spot_client: IClient, perp_client: IClient, open_interest_client: IClient, funding_rate_client: IClient,
+) -> 'PandasCandleProcessor':
+    from data_processors.pandas_dataframe import PandasCandleProcessor
+
+    return PandasCandleProcessor(
+        spot_client=spot_client,
+        perp_client=perp_client,
+        open_interest_client=open_interest_client,
+        funding_rate_client=funding_rate_client,
+    )
+
+
+class IncrementalCandleRunner:
+    """
+    Processes only data after a persisted watermark and appends the newly closed candles to the output,
+    so the work of a scheduled run depends on new data only and not on the history length
+    """
+    def __init__(
+        self,
+        spot_client: SpotClient,
+        perp_client: PerpClient,
+        open_interest_client: OpenInterestClient,
+        funding_rate_client: FundingRateClient,
+        state_path: Path,
+        output_path: Path,
+        processor_factory: Callable[..., 'LazyCandleProcessor | PandasCandleProcessor'] = lazy_processor,
+        interval: timedelta = timedelta(minutes=5),
+    ):
+        """
+        :param state_path: json file with the watermark
+        :param output_path: csv file the closed candles are appended to
+        :param processor_factory: creates the processor from the four clients
+        :param interval: candle interval of the processor
+        """
+        self._spot_client = spot_client
+        self._perp_client = perp_client
+        self._open_interest_client = open_interest_client
+        self._funding_rate_client = funding_rate_client
+        self._state_path = state_path
+        self._output_path = output_path
+        self._processor_factory = processor_factory
+        self._interval = interval
+
+    def load_watermark(self) -> Watermark | None:
+        if not self._state_path.exists():
+            return None
+        return Watermark.model_validate_json(self._state_path.read_text())
+
+    def run(self, start_time: datetime, end_time: datetime) -> int:
+        """
+        Appends candles closed by `end_time`, `start_time` is used only when there is no watermark yet
+
+        :return: number of appended candles
+        """
+        watermark = self.load_watermark()
+        if watermark is None:
+            watermark = Watermark(closed_until=to_timeframe(start_time, self._interval))
+        closed_until = to_timeframe(end_time, self._interval)
+        if closed_until <= watermark.closed_until:
+            return 0
+
+        spot_client = _resuming_client(self._spot_client, watermark.last_trade_ids.get('spot'), closed_until)
+        perp_client = _resuming_client(self._perp_client, watermark.last_trade_ids.get('perp'), closed_until)
+        processor = self._processor_factory(
+            spot_client=spot_client,
+            perp_client=perp_client,
+            open_interest_client=self._open_interest_client,
+            funding_rate_client=self._funding_rate_client,
+        )
+        candles = processor.process(start_time=watermark.closed_until, end_time=closed_until - WINDOW_END_OFFSET)
+
+        # drops rows appended by a run that failed before saving its watermark
+        self._output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._output_path, mode='a', newline='') as output_file:
+            output_file.truncate(watermark.output_size)
+        appended = self._append(candles)
+
+        last_trade_ids = dict(watermark.last_trade_ids)
+        for source, client in (('spot', spot_client), ('perp', perp_client)):
+            if client.last_trade_id is not None:
+                last_trade_ids[source] = client.last_trade_id
+        self._save_watermark(Watermark(
+            closed_until=closed_until,
+            last_trade_ids=last_trade_ids,
+            output_size=self._output_path.stat().st_size,
+        ))
+        return appended
+
+    def _append(self, candles: 'Iterable[Candle] | pd.DataFrame') -> int:
+        write_header = self._output_path.stat().st_size == 0
+        # a dataframe can only come from a processor that imported pandas
+        pd = sys.modules.get('pandas')
+        if pd is not None and isinstance(candles, pd.DataFrame):
+            candles.to_csv(self._output_path, mode='a', header=write_header, index=False)
+            return len(candles)
+
+        fieldnames = list(Candle.__fields__.keys())
+        fieldnames.remove('open_timestamp')
+        fieldnames.remove('close_timestamp')
+        appended = 0
+        with open(self._output_path, mode='a', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            if write_header:
+                writer.writeheader()
+            for candle in candles:
+                writer.writerow(candle.dict(exclude=['open_timestamp', 'close_timestamp']))
+                appended += 1
+        return appended
+
+    def _save_watermark(self, watermark: Watermark):
+        temporary_path = self._state_path.with_suffix('.tmp')
+        temporary_path.write_text(watermark.model_dump_json())
+        temporary_path.replace(self._state_path)
+
+
+if __name__ == '__main__':
+    import binance
+
+    client = binance.Client()
+    cache = DiskCache()
+    scheduler = RequestScheduler()
+    runner = IncrementalCandleRunner(
+        spot_client=SpotClient(client=client, cache=cache, scheduler=scheduler),
+        perp_client=PerpClient(client=client, cache=cache, scheduler=scheduler),
+        open_interest_client=OpenInterestClient(client=client, cache=cache, scheduler=scheduler),
+        funding_rate_client=FundingRateClient(client=client, cache=cache, scheduler=scheduler),
+        state_path=PROCESSED_DIR / 'incremental_state.json',
+        output_path=PROCESSED_DIR / 'result_incremental.csv',
+    )
+
+    now = datetime.now(timezone.utc)
+    appended = runner.run(start_time=now - timedelta(days=1), end_time=now)
+    print(f'Appended {appended} candles')
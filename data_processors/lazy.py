@@ -1,41 +1,29 @@
-import csv
 import time
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Iterator, Iterable
-
-import binance
+from typing import Iterator, Iterable, Literal
 
+from data_loaders.cache import DiskCache
 from data_loaders.clients import (
     SpotClient, PerpClient, OpenInterestClient,
     FundingRateClient, TData,
 )
 from data_loaders.loader import Loader
-from data_loaders.time_conversion import to_minute_timeframe
+from data_loaders.merge import merge_sources
+from data_loaders.metrics import (
+    CANDLE_PROCESS_SECONDS, CANDLE_AGGREGATE_SECONDS, CANDLE_EMIT_LAG_SECONDS, CANDLES_TOTAL,
+)
+from data_loaders.models.open_interest import Period
+from data_loaders.prefetch import PrefetchIterator
+from data_loaders.rate_limit import RequestScheduler
+from data_loaders.time_conversion import sort_periods, to_timestamp, from_timestamp
+from data_processors.candle_accumulator import CandleAccumulator
 from data_processors.candle_filler import CandleFiller
 from data_processors.models.candles import Candle
+from data_processors.roll_up import PeriodRollUp
 from paths import PROCESSED_DIR
 
-
-class CommitIterator(Iterator[TData]):
-    """
-    Iterator that repeats the last element if it was not committed
-    """
-    def __init__(self, iterator: Iterator[TData]):
-        self._iterator = iterator
-        self._uncommitted: TData | None = None
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if self._uncommitted is None:
-            self._uncommitted = next(self._iterator)
-        return self._uncommitted
-
-    def commit(self):
-        if self._uncommitted is None:
-            raise ValueError('No uncommitted data')
-        self._uncommitted = None
+GapPolicy = Literal['skip', 'ffill']
 
 
 class LazyCandleProcessor:
@@ -49,81 +37,161 @@ class LazyCandleProcessor:
         open_interest_client: OpenInterestClient,
         funding_rate_client: FundingRateClient,
         candle_filler: CandleFiller,
+        periods: Iterable[Period] = (Period.FIVE_MINUTES,),
+        prefetch_size: int | None = None,
+        symbol: str = 'BTCUSDT',
+        executor: Executor | None = None,
+        gap_policy: GapPolicy = 'skip',
     ):
-        self._spot_loader = Loader(data_client=spot_client)
-        self._perp_loader = Loader(data_client=perp_client)
-        self._open_interest_loader = Loader(data_client=open_interest_client)
-        self._funding_rate_loader = Loader(data_client=funding_rate_client)
+        """
+        :param candle_filler: rolls finer candles up into coarser periods, trades are accumulated by `CandleAccumulator`
+        :param periods: candle periods emitted by `process_periods`, coarser ones are rolled up from the finest
+        :param prefetch_size: when set, every source is fetched by its own thread into a buffer of this many items,
+            so I/O waits of the sources overlap instead of adding up
+        :param executor: requests the next page of every source on it while the current page is consumed,
+            unlike `prefetch_size` no thread is held per source, so one executor can serve many processors
+        :param gap_policy: buckets without data of any source are left out (`skip`) or yielded as candles
+            with prices, open interest and funding rate of the last candle and no volume (`ffill`)
+        """
+        self._spot_loader = Loader(data_client=spot_client, symbol=symbol, executor=executor)
+        self._perp_loader = Loader(data_client=perp_client, symbol=symbol, executor=executor)
+        self._open_interest_loader = Loader(data_client=open_interest_client, symbol=symbol, executor=executor)
+        self._funding_rate_loader = Loader(data_client=funding_rate_client, symbol=symbol, executor=executor)
         self._candle_filler = candle_filler
-
-    def _get_commit_iterator(self, start_time: datetime, end_time: datetime, loader: Loader) -> CommitIterator:
-        return CommitIterator(
-            iter(
-                loader.load(
-                    start_time=start_time,
-                    end_time=end_time,
-                )
-            )
-        )
+        self._periods = sort_periods(periods)
+        self._interval = self._periods[0].duration
+        self._prefetch_size = prefetch_size
+        self._gap_policy = gap_policy
+        self._symbol = symbol
+
+    def _get_iterator(self, data: Iterable[TData], executor: Executor | None) -> Iterator[TData]:
+        data = iter(data)
+        if executor is not None:
+            data = PrefetchIterator(data, executor=executor, buffer_size=self._prefetch_size)
+        return data
 
     def process(self, start_time: datetime, end_time: datetime) -> Iterable[Candle]:
-        spot_iterator = self._get_commit_iterator(start_time, end_time, self._spot_loader)
-        perp_iterator = self._get_commit_iterator(start_time, end_time, self._perp_loader)
-        open_interest_iterator = self._get_commit_iterator(start_time, end_time, self._open_interest_loader)
-        funding_rate_iterator = self._get_commit_iterator(start_time, end_time, self._funding_rate_loader)
-
-        yield from self._fill_candles(
-            end_time, funding_rate_iterator, open_interest_iterator, perp_iterator,
-            spot_iterator, start_time
-        )
-
-    def _fill_candles(
-        self, end_time: datetime, funding_rate_iterator: CommitIterator, open_interest_iterator: CommitIterator, perp_iterator: CommitIterator, spot_iterator: CommitIterator, start_time: datetime
-    ):
-        current_timeframe = to_minute_timeframe(start_time)
-        next_timeframe = to_minute_timeframe(start_time + timedelta(minutes=5))
-        current_candle = Candle(timestamp=current_timeframe)
-        while current_timeframe - end_time < timedelta(seconds=1):
-            was_filled = False
-            was_filled = self._fill_with_iterator(current_candle, current_timeframe, spot_iterator, next_timeframe) or was_filled
-            was_filled = self._fill_with_iterator(current_candle, current_timeframe, perp_iterator, next_timeframe) or was_filled
-            was_filled = self._fill_with_iterator(current_candle, current_timeframe, open_interest_iterator, next_timeframe) or was_filled
-            was_filled = self._fill_with_iterator(current_candle, current_timeframe, funding_rate_iterator, next_timeframe) or was_filled
-
-            if not was_filled:
-                continue
-
-            yield current_candle
-
-            current_timeframe = next_timeframe
-            next_timeframe = current_timeframe + timedelta(minutes=5)
-
-            current_candle = Candle(timestamp=current_timeframe)
-
-    def _fill_with_iterator(
-        self, current_candle: Candle, current_timeframe: datetime, iterator: CommitIterator, next_timeframe: datetime
-    ):
-        was_filled = False
-        while True:
-            try:
-                data = next(iterator)
-                if current_timeframe <= data.timestamp < next_timeframe:
-                    iterator.commit()
-                    self._candle_filler.fill_candle(data, current_candle)
-                    was_filled = True
-                else:
+        """
+        Yields candles of the finest period, with an `executor` the first pages are requested right away
+        """
+        sources = [
+            loader.load(start_time=start_time, end_time=end_time)
+            for loader in (self._spot_loader, self._perp_loader, self._open_interest_loader, self._funding_rate_loader)
+        ]
+        return self._process(start_time, end_time, sources)
+
+    def _process(self, start_time: datetime, end_time: datetime, sources: list[Iterable[TData]]) -> Iterable[Candle]:
+        executor = None
+        if self._prefetch_size is not None:
+            executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix=self.__class__.__name__)
+        events = merge_sources({
+            name: self._get_iterator(data, executor)
+            for name, data in zip(('spot', 'perp', 'open_interest', 'funding_rate'), sources)
+        })
+
+        try:
+            yield from self._fill_candles(events, end_time)
+        finally:
+            events.close()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def process_periods(self, start_time: datetime, end_time: datetime) -> Iterable[tuple[Period, Candle]]:
+        """
+        Yields candles of every period in one pass over the data. A coarser candle is yielded right after
+        the finer candle closing its period. With `gap_policy='skip'` the finer buckets at the end of a period
+        can be empty, then the coarser candle is yielded after the next finer candle, which opens a later period,
+        or at the end of the data
+        """
+        roll_up = PeriodRollUp(self._periods, self._candle_filler, self._symbol)
+        for candle in self.process(start_time, end_time):
+            yield from roll_up.add(candle)
+        yield from roll_up.flush()
+
+    def _fill_candles(self, events: Iterator[tuple[int, str, TData]], end_time: datetime) -> Iterable[Candle]:
+        """
+        Fills a candle per bucket from the merged stream of all sources, buckets without data are jumped over.
+        Metrics are observed once per candle, never per data, the aggregation time of a candle sums the time
+        spent in the accumulator and leaves out the waits on the sources
+        """
+        interval = self._interval // timedelta(milliseconds=1)
+        # buckets starting less than a second after the end are still filled
+        end_timestamp = to_timestamp(end_time) + 1000
+        process_seconds = CANDLE_PROCESS_SECONDS.labels(processor='lazy', symbol=self._symbol)
+        aggregate_seconds = CANDLE_AGGREGATE_SECONDS.labels(processor='lazy', symbol=self._symbol)
+        emit_lag = CANDLE_EMIT_LAG_SECONDS.labels(processor='lazy', symbol=self._symbol)
+        candles_total = CANDLES_TOTAL.labels(processor='lazy', symbol=self._symbol)
+        accumulator = CandleAccumulator()
+        add = accumulator.add
+        bucket = None
+        bucket_end = None
+        bucket_start = None
+        aggregate_time = 0.0
+        perf_counter = time.perf_counter
+        for timestamp, _, data in events:
+            if bucket_end is None or timestamp >= bucket_end:
+                next_bucket = timestamp - timestamp % interval
+                if next_bucket >= end_timestamp:
                     break
-            except StopIteration:
-                break
-        return was_filled
+                if bucket is not None:
+                    close_start = perf_counter()
+                    last_candle = accumulator.close(from_timestamp(bucket))
+                    process_seconds.observe(perf_counter() - bucket_start)
+                    aggregate_seconds.observe(aggregate_time + perf_counter() - close_start)
+                    emit_lag.observe(time.time() - bucket_end / 1000)
+                    candles_total.inc()
+                    yield last_candle
+                    if self._gap_policy == 'ffill':
+                        for gap_bucket in range(bucket_end, next_bucket, interval):
+                            emit_lag.observe(time.time() - (gap_bucket + interval) / 1000)
+                            candles_total.inc()
+                            yield self._forward_fill(last_candle, from_timestamp(gap_bucket))
+                bucket = next_bucket
+                bucket_end = bucket + interval
+                bucket_start = perf_counter()
+                aggregate_time = 0.0
+            add_start = perf_counter()
+            add(data)
+            aggregate_time += perf_counter() - add_start
+
+        if bucket is not None:
+            close_start = perf_counter()
+            last_candle = accumulator.close(from_timestamp(bucket))
+            process_seconds.observe(perf_counter() - bucket_start)
+            aggregate_seconds.observe(aggregate_time + perf_counter() - close_start)
+            emit_lag.observe(time.time() - bucket_end / 1000)
+            candles_total.inc()
+            yield last_candle
+
+    @staticmethod
+    def _forward_fill(candle: Candle, timestamp: datetime) -> Candle:
+        """
+        Candle of an empty bucket, prices stay at the close of the last candle
+        """
+        fields = {
+            'timestamp': timestamp,
+            'open_interest': candle.open_interest,
+            'funding_rate': candle.funding_rate,
+        }
+        for market in ('spot', 'perp'):
+            close = getattr(candle, f'close_{market}')
+            for price in ('open', 'high', 'low', 'close'):
+                fields[f'{price}_{market}'] = close
+        return Candle(**fields)
 
 
 if __name__ == '__main__':
+    import binance
+
+    from data_processors.sinks import ArrowCandleSink
+
     client = binance.Client()
-    spot_client = SpotClient(client=client)
-    perp_client = PerpClient(client=client)
-    open_interest_client = OpenInterestClient(client=client)
-    funding_rate_client = FundingRateClient(client=client)
+    cache = DiskCache()
+    scheduler = RequestScheduler()
+    spot_client = SpotClient(client=client, cache=cache, scheduler=scheduler)
+    perp_client = PerpClient(client=client, cache=cache, scheduler=scheduler)
+    open_interest_client = OpenInterestClient(client=client, cache=cache, scheduler=scheduler)
+    funding_rate_client = FundingRateClient(client=client, cache=cache, scheduler=scheduler)
     candle_filler = CandleFiller()
     processor = LazyCandleProcessor(
         spot_client=spot_client,
@@ -140,13 +208,5 @@ if __name__ == '__main__':
     end = start + timedelta(days=1)
     candles = processor.process(start_time=start, end_time=end)
 
-    fieldnames = list(Candle.__fields__.keys())
-    fieldnames.remove('open_timestamp')
-    fieldnames.remove('close_timestamp')
-
-    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-    with open(PROCESSED_DIR / 'result_lazy.csv', mode="w", newline="") as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-
-        writer.writeheader()
-        writer.writerows((candle.dict(exclude=['open_timestamp', 'close_timestamp']) for candle in candles))
+    with ArrowCandleSink(PROCESSED_DIR / 'result_lazy.arrow') as sink:
+        sink.write_candles(candles)
@@ -0,0 +1,150 @@
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from data_loaders.time_conversion import EPOCH
+from data_processors.models.candles import Candle
+from paths import SHARED_MEMORY_DIR
+
+MAGIC = int.from_bytes(b'CNDLRING', 'little')
+VERSION = 1
+
+# Header of 8-byte words, the sequence counter has a cache line of its own
+HEADER_SIZE = 128
+MAGIC_WORD, VERSION_WORD, CAPACITY_WORD, COLUMNS_WORD = range(4)
+SEQUENCE_WORD = 8
+
+INT_NULL = np.iinfo(np.int64).min
+
+TIMESTAMP_FIELDS = frozenset(
+    name for name, field in Candle.model_fields.items() if field.annotation in (datetime, datetime | None)
+)
+INT_FIELDS = frozenset(name for name, field in Candle.model_fields.items() if field.annotation == int | None)
+COLUMNS = {
+    name: np.int64 if name in TIMESTAMP_FIELDS or name in INT_FIELDS else np.float64
+    for name in Candle.model_fields
+}
+
+
+def ring_size(capacity: int) -> int:
+    return HEADER_SIZE + len(COLUMNS) * capacity * 8
+
+
+def map_columns(buffer: np.ndarray, capacity: int) -> dict[str, np.ndarray]:
+    """
+    Column arrays of a ring buffer, every column is `capacity` 8-byte values one after another
+    """
+    return {
+        name: np.frombuffer(buffer, dtype=dtype, count=capacity, offset=HEADER_SIZE + index * capacity * 8)
+        for index, (name, dtype) in enumerate(COLUMNS.items())
+    }
+
+
+def map_header(buffer: np.ndarray) -> np.ndarray:
+    return np.frombuffer(buffer, dtype=np.uint64, count=HEADER_SIZE // 8)
+
+
+def has_layout(header: np.ndarray) -> bool:
+    return (
+        header[MAGIC_WORD] == MAGIC
+        and header[VERSION_WORD] == VERSION
+        and header[COLUMNS_WORD] == len(COLUMNS)
+    )
+
+
+def encode_timestamp(value: datetime | None) -> int:
+    return INT_NULL if value is None else (value - EPOCH) // timedelta(microseconds=1)
+
+
+def decode_timestamp(value: int) -> datetime | None:
+    return None if value == INT_NULL else EPOCH + timedelta(microseconds=value)
+
+
+class CandleRingReader:
+    """
+    Reads candles published by `SharedMemoryCandleSink` from a memory-mapped ring buffer.
+    Columns hold `capacity` candles and the header counts published candles, the candle with sequence `n`
+    is in slot `n % capacity`. A reader falling more than `capacity` candles behind skips the overwritten ones
+    and counts them in `lost`
+    """
+    def __init__(self, path: Path, from_oldest: bool = False):
+        """
+        :param from_oldest: start at the oldest candle still in the ring instead of the next published one
+        """
+        self._buffer = np.memmap(path, dtype=np.uint8, mode='r')
+        self._header = map_header(self._buffer)
+        if not has_layout(self._header):
+            raise ValueError(f'{path} is not a candle ring of version {VERSION}')
+        self.capacity = int(self._header[CAPACITY_WORD])
+        self._columns = map_columns(self._buffer, self.capacity)
+        published = self.published
+        self._sequence = max(published - self.capacity, 0) if from_oldest else published
+        self.lost = 0
+
+    @property
+    def published(self) -> int:
+        """
+        Number of candles published to the ring so far
+        """
+        return int(self._header[SEQUENCE_WORD])
+
+    def read_columns(self) -> dict[str, np.ndarray]:
+        """
+        Returns candles published since the last read as column arrays in publish order,
+        timestamps are microseconds, nulls are NaN or `INT_NULL`.
+        Arrays are views into the shared memory unless the read wraps around the end of the ring,
+        views are overwritten once `capacity` more candles are published
+        """
+        return self._read()[1]
+
+    def read(self) -> list[Candle]:
+        """
+        Returns candles published since the last read, candles overwritten while being decoded are dropped
+        """
+        sequence, columns = self._read()
+        values = [
+            [decode_timestamp(value) for value in column.tolist()] if name in TIMESTAMP_FIELDS
+            else [None if value == INT_NULL else value for value in column.tolist()] if name in INT_FIELDS
+            else [None if value != value else value for value in column.tolist()]
+            for name, column in columns.items()
+        ]
+        torn = min(max(self.published - self.capacity - sequence, 0), len(values[0]))
+        self.lost += torn
+        return [Candle.model_construct(**dict(zip(COLUMNS, row))) for row in zip(*values)][torn:]
+
+    def follow(self, poll_interval: timedelta = timedelta(microseconds=50)) -> Iterator[Candle]:
+        """
+        Yields candles as they are published, the sequence counter is polled every `poll_interval`,
+        a zero interval spins for the lowest latency at the cost of a busy core
+        """
+        interval = poll_interval.total_seconds()
+        while True:
+            candles = self.read()
+            if candles:
+                yield from candles
+            elif interval:
+                time.sleep(interval)
+
+    def _read(self) -> tuple[int, dict[str, np.ndarray]]:
+        published = self.published
+        start = max(self._sequence, published - self.capacity)
+        self.lost += start - self._sequence
+        self._sequence = published
+
+        first = start % self.capacity
+        last = first + published - start
+        if last <= self.capacity:
+            return start, {name: column[first:last] for name, column in self._columns.items()}
+        wrapped = last - self.capacity
+        return start, {
+            name: np.concatenate((column[first:], column[:wrapped])) for name, column in self._columns.items()
+        }
+
+
+if __name__ == '__main__':
+    reader = CandleRingReader(SHARED_MEMORY_DIR / 'candles_BTCUSDT')
+    for candle in reader.follow():
+        print(candle.model_dump_json())
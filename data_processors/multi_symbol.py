@@ -0,0 +1,160 @@
+import csv
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Iterable, Sequence
+
+from data_loaders.cache import DiskCache
+from data_loaders.clients import (
+    IClient, SpotClient, PerpClient, OpenInterestClient,
+    FundingRateClient,
+)
+from data_loaders.models.open_interest import Period
+from data_loaders.rate_limit import RequestScheduler
+from data_loaders.time_conversion import sort_periods
+from data_processors.candle_filler import CandleFiller
+from data_processors.lazy import LazyCandleProcessor, GapPolicy
+from data_processors.models.candles import Candle
+from data_processors.roll_up import PeriodRollUp
+from paths import PROCESSED_DIR
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from data_processors.pandas_dataframe import PandasCandleProcessor
+
+
+class MultiSymbolCandleProcessor:
+    """
+    Processes a universe of symbols through shared clients and one I/O pool,
+    so connections, the cache and the rate limits are shared instead of running a pipeline per symbol
+    """
+    def __init__(
+        self,
+        spot_client: IClient,
+        perp_client: IClient,
+        open_interest_client: IClient,
+        funding_rate_client: IClient,
+        symbols: Sequence[str],
+        candle_filler: CandleFiller,
+        periods: Iterable[Period] = (Period.FIVE_MINUTES,),
+        max_workers: int = 32,
+        gap_policy: GapPolicy = 'skip',
+    ):
+        """
+        :param symbols: the symbol universe, candles with the same timestamp are yielded in this order
+        :param max_workers: threads requesting pages, every source of every symbol has at most one page in flight
+        :param gap_policy: how `process` treats buckets without data of a symbol, see `LazyCandleProcessor`
+        """
+        self._clients = {
+            'spot_client': spot_client,
+            'perp_client': perp_client,
+            'open_interest_client': open_interest_client,
+            'funding_rate_client': funding_rate_client,
+        }
+        self._symbols = list(symbols)
+        self._candle_filler = candle_filler
+        self._periods = sort_periods(periods)
+        self._max_workers = max_workers
+        self._gap_policy = gap_policy
+
+    def process(self, start_time: datetime, end_time: datetime) -> Iterable[tuple[str, Candle]]:
+        """
+        Yields (symbol, candle) of the finest period in time order across symbols,
+        one candle per symbol is held in memory while pages of all symbols are fetched concurrently
+        """
+        executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=self.__class__.__name__)
+        try:
+            streams = [
+                self._keyed(symbol, self._lazy_processor(symbol, executor).process(start_time, end_time))
+                for symbol in self._symbols
+            ]
+            yield from heapq.merge(*streams, key=lambda item: item[1].timestamp)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def process_periods(self, start_time: datetime, end_time: datetime) -> Iterable[tuple[str, Period, Candle]]:
+        """
+        Yields (symbol, period, candle) of every period, coarser candles are rolled up per symbol
+        """
+        roll_ups = {symbol: PeriodRollUp(self._periods, self._candle_filler, symbol) for symbol in self._symbols}
+        for symbol, candle in self.process(start_time, end_time):
+            for period, period_candle in roll_ups[symbol].add(candle):
+                yield symbol, period, period_candle
+        for symbol, roll_up in roll_ups.items():
+            for period, period_candle in roll_up.flush():
+                yield symbol, period, period_candle
+
+    def process_dataframe(self, start_time: datetime, end_time: datetime, max_frames: int = 4) -> 'pd.DataFrame':
+        """
+        Returns candles of the finest period of every symbol as one dataframe with a symbol column,
+        up to `max_frames` symbols are aggregated at a time while pages are fetched on the shared I/O pool
+        """
+        import pandas as pd
+
+        with (
+            ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=self.__class__.__name__) as executor,
+            ThreadPoolExecutor(max_workers=max_frames) as aggregation_executor,
+        ):
+            frames = aggregation_executor.map(
+                lambda symbol: self._pandas_processor(symbol, executor).process(start_time, end_time),
+                self._symbols,
+            )
+            frames = [frame.assign(symbol=symbol) for symbol, frame in zip(self._symbols, frames) if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=['symbol', 'timestamp'])
+        df = pd.concat(frames, ignore_index=True)
+        df = df[['symbol', *df.columns.drop('symbol')]]
+        return df.sort_values('timestamp', kind='stable', ignore_index=True)
+
+    def _lazy_processor(self, symbol: str, executor: ThreadPoolExecutor) -> LazyCandleProcessor:
+        return LazyCandleProcessor(
+            **self._clients,
+            candle_filler=self._candle_filler,
+            periods=self._periods,
+            symbol=symbol,
+            executor=executor,
+            gap_policy=self._gap_policy,
+        )
+
+    def _pandas_processor(self, symbol: str, executor: ThreadPoolExecutor) -> 'PandasCandleProcessor':
+        from data_processors.pandas_dataframe import PandasCandleProcessor
+
+        return PandasCandleProcessor(**self._clients, periods=self._periods, symbol=symbol, executor=executor)
+
+    @staticmethod
+    def _keyed(symbol: str, candles: Iterable[Candle]) -> Iterable[tuple[str, Candle]]:
+        for candle in candles:
+            yield symbol, candle
+
+
+if __name__ == '__main__':
+    import binance
+
+    client = binance.Client()
+    cache = DiskCache()
+    scheduler = RequestScheduler()
+    processor = MultiSymbolCandleProcessor(
+        spot_client=SpotClient(client=client, cache=cache, scheduler=scheduler),
+        perp_client=PerpClient(client=client, cache=cache, scheduler=scheduler),
+        open_interest_client=OpenInterestClient(client=client, cache=cache, scheduler=scheduler),
+        funding_rate_client=FundingRateClient(client=client, cache=cache, scheduler=scheduler),
+        symbols=['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'BNBUSDT', 'XRPUSDT'],
+        candle_filler=CandleFiller(),
+    )
+
+    now = datetime(
+        year=2024, month=9, day=13, hour=7, minute=0, second=0, tzinfo=timezone.utc
+    )
+    start = now - timedelta(hours=1)
+    end = now
+
+    fieldnames = ['symbol', *Candle.model_fields.keys()]
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    with open(PROCESSED_DIR / 'result_multi_symbol.csv', mode="w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+
+        writer.writeheader()
+        writer.writerows(
+            {'symbol': symbol, **candle.model_dump()} for symbol, candle in processor.process(start_time=start, end_time=end)
+        )
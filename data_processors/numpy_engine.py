@@ -0,0 +1,342 @@
+import time
+from concurrent.futures import Executor
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Mapping
+
+import numpy as np
+import pandas as pd
+
+from data_loaders.cache import DiskCache
+from data_loaders.clients import (
+    SpotClient, PerpClient, OpenInterestClient,
+    FundingRateClient,
+)
+from data_loaders.loader import Loader
+from data_loaders.metrics import CANDLE_AGGREGATE_SECONDS, CANDLES_TOTAL
+from data_loaders.models.open_interest import Period
+from data_loaders.models.timedata import TimeData
+from data_loaders.rate_limit import RequestScheduler
+from data_loaders.time_conversion import to_timestamp, as_timestamp, sort_periods
+from data_processors.models.candles import Candle
+from paths import PROCESSED_DIR
+
+INTERVAL_MS = 5 * 60 * 1000
+
+TRADE_COLUMNS = ('timestamp', 'trade_id', 'price', 'quantity', 'is_buyer_maker')
+NAT = np.iinfo(np.int64).min
+
+
+class NumpyCandleProcessor:
+    """
+    Processes data with numpy bucket reductions and fills candles.
+    Every column is computed for all buckets at once, no python code runs per bucket or per trade.
+    """
+    def __init__(
+        self,
+        spot_client: SpotClient,
+        perp_client: PerpClient,
+        open_interest_client: OpenInterestClient,
+        funding_rate_client: FundingRateClient,
+        periods: Iterable[Period] = (Period.FIVE_MINUTES,),
+        symbol: str = 'BTCUSDT',
+        executor: Executor | None = None,
+    ):
+        """
+        :param periods: candle periods returned by `process_periods`, coarser ones are rolled up from the finest
+        :param executor: requests the next page of every source on it while the current page is consumed
+        """
+        self._spot_loader = Loader(data_client=spot_client, symbol=symbol, executor=executor)
+        self._perp_loader = Loader(data_client=perp_client, symbol=symbol, executor=executor)
+        self._open_interest_loader = Loader(data_client=open_interest_client, symbol=symbol, executor=executor)
+        self._funding_rate_loader = Loader(data_client=funding_rate_client, symbol=symbol, executor=executor)
+        self._periods = sort_periods(periods)
+        self._aggregate_seconds = CANDLE_AGGREGATE_SECONDS.labels(processor='numpy', symbol=symbol)
+        self._candles_total = CANDLES_TOTAL.labels(processor='numpy', symbol=symbol)
+
+    def process(self, start_time: datetime, end_time: datetime) -> pd.DataFrame:
+        """
+        Returns candles of the finest period
+        """
+        return self.process_periods(start_time, end_time)[self._periods[0]]
+
+    def process_periods(self, start_time: datetime, end_time: datetime) -> dict[Period, pd.DataFrame]:
+        """
+        Returns candles of every period, coarser candles are reduced from the finest ones instead of trades
+        """
+        finest, *coarser = self._periods
+        sources = {
+            'spot': self._load_arrays(start_time, end_time, self._spot_loader, TRADE_COLUMNS),
+            'perp': self._load_arrays(start_time, end_time, self._perp_loader, TRADE_COLUMNS),
+            'open_interest': self._load_arrays(
+                start_time, end_time, self._open_interest_loader, ('timestamp', 'sum_open_interest')
+            ),
+            'funding_rate': self._load_arrays(
+                start_time, end_time, self._funding_rate_loader, ('timestamp', 'funding_rate')
+            ),
+        }
+        # loading is timed by the client metrics, only the reductions over the loaded arrays are timed here
+        aggregate_start = time.perf_counter()
+        columns = _aggregate_columns(
+            start_time=to_timestamp(start_time),
+            end_time=to_timestamp(end_time),
+            **sources,
+            interval=_to_milliseconds(finest.duration),
+        )
+        frames = {finest: _to_frame(columns)}
+        for period in coarser:
+            frames[period] = _to_frame(roll_up(columns, _to_milliseconds(period.duration)))
+        self._aggregate_seconds.observe(time.perf_counter() - aggregate_start)
+        self._candles_total.inc(len(frames[finest]))
+        return frames
+
+    def _load_arrays(
+        self, start_time: datetime, end_time: datetime, loader: Loader, columns: Iterable[str],
+    ) -> dict[str, np.ndarray]:
+        values: dict[str, list] = {column: [] for column in columns}
+        data: TimeData
+        for data in loader.load(start_time=start_time, end_time=end_time):
+            for column, column_values in values.items():
+                column_values.append(
+                    as_timestamp(data.timestamp) if column == 'timestamp' else getattr(data, column)
+                )
+        return {column: np.asarray(column_values) for column, column_values in values.items()}
+
+
+def aggregate_candles(
+    start_time: int,
+    end_time: int,
+    spot: Mapping[str, np.ndarray],
+    perp: Mapping[str, np.ndarray],
+    open_interest: Mapping[str, np.ndarray],
+    funding_rate: Mapping[str, np.ndarray],
+    interval: int = INTERVAL_MS,
+) -> pd.DataFrame:
+    """
+    Aggregates column arrays (e.g. from `ColumnarStore.read_arrays`) into candles with `Candle` columns.
+    Timestamps are int64 milliseconds, the window is [start_time, end_time] like `IClient.get`.
+
+    Every bucket of the window is present: prices are NaN and volumes are 0 for a market without trades,
+    open interest and funding rate are the last value inside the bucket.
+    Buy and sell are taker sides, a trade with buyer maker is a sell.
+    """
+    return _to_frame(_aggregate_columns(start_time, end_time, spot, perp, open_interest, funding_rate, interval))
+
+
+def roll_up(columns: Mapping[str, np.ndarray], interval: int) -> dict[str, np.ndarray]:
+    """
+    Reduces candle columns into candles of a coarser interval (milliseconds),
+    the interval must be a multiple of the interval of the columns
+    """
+    starts, bucket_ids = _segments(columns['timestamp'] // interval)
+    ends = np.append(starts[1:], len(columns['timestamp']))
+    result = {'timestamp': bucket_ids * interval}
+    for name, values in columns.items():
+        if name == 'timestamp':
+            continue
+        if name == 'open_timestamp':
+            no_timestamp = np.iinfo(np.int64).max
+            open_timestamps = np.minimum.reduceat(np.where(values == NAT, no_timestamp, values), starts)
+            result[name] = np.where(open_timestamps == no_timestamp, NAT, open_timestamps)
+        elif name == 'close_timestamp':
+            result[name] = np.maximum.reduceat(values, starts)
+        elif name in ('open_interest', 'funding_rate') or name.startswith('close_'):
+            result[name] = _last_valid(values, starts, ends)
+        elif name.startswith('open_'):
+            result[name] = _first_valid(values, starts, ends)
+        elif name.startswith('high_'):
+            result[name] = np.fmax.reduceat(values, starts)
+        elif name.startswith('low_'):
+            result[name] = np.fmin.reduceat(values, starts)
+        else:
+            result[name] = np.add.reduceat(values, starts)
+    return result
+
+
+def _aggregate_columns(
+    start_time: int,
+    end_time: int,
+    spot: Mapping[str, np.ndarray],
+    perp: Mapping[str, np.ndarray],
+    open_interest: Mapping[str, np.ndarray],
+    funding_rate: Mapping[str, np.ndarray],
+    interval: int,
+) -> dict[str, np.ndarray]:
+    origin = start_time - start_time % interval
+    buckets = (end_time - origin) // interval + 1
+
+    spot_columns = _aggregate_trades(spot, start_time, end_time, origin, interval, buckets)
+    perp_columns = _aggregate_trades(perp, start_time, end_time, origin, interval, buckets)
+
+    columns = {'timestamp': origin + np.arange(buckets, dtype=np.int64) * interval}
+    columns['open_timestamp'] = _combine_timestamps(
+        spot_columns.pop('open_timestamp'), perp_columns.pop('open_timestamp'), np.minimum,
+    )
+    columns['close_timestamp'] = _combine_timestamps(
+        spot_columns.pop('close_timestamp'), perp_columns.pop('close_timestamp'), np.maximum,
+    )
+    for name in ('open', 'high', 'low', 'close'):
+        columns[f'{name}_spot'] = spot_columns[name]
+        columns[f'{name}_perp'] = perp_columns[name]
+    for name in ('volume', 'buy_volume', 'sell_volume', 'trades', 'buy_trades', 'sell_trades'):
+        columns[f'{name}_total'] = spot_columns[name] + perp_columns[name]
+        columns[f'{name}_spot'] = spot_columns[name]
+        columns[f'{name}_perp'] = perp_columns[name]
+    columns['open_interest'] = _last_values(
+        open_interest, 'sum_open_interest', start_time, end_time, origin, interval, buckets,
+    )
+    columns['funding_rate'] = _last_values(
+        funding_rate, 'funding_rate', start_time, end_time, origin, interval, buckets,
+    )
+    return columns
+
+
+def _to_frame(columns: Mapping[str, np.ndarray]) -> pd.DataFrame:
+    df = pd.DataFrame({name: columns[name] for name in Candle.model_fields})
+    for name in ('timestamp', 'open_timestamp', 'close_timestamp'):
+        df[name] = pd.to_datetime(df[name].to_numpy().view('datetime64[ms]'), utc=True)
+    return df
+
+
+def _to_milliseconds(interval: timedelta) -> int:
+    return int(interval.total_seconds() * 1000)
+
+
+def _select(
+    data: Mapping[str, np.ndarray], start_time: int, end_time: int, origin: int, interval: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns positions of rows inside the window and their bucket index
+    """
+    timestamps = np.asarray(data['timestamp'], dtype=np.int64)
+    rows = np.flatnonzero((timestamps >= start_time) & (timestamps <= end_time))
+    return rows, (timestamps[rows] - origin) // interval
+
+
+def _segments(bucket_index: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns start offsets of runs of equal bucket index in sorted data and the bucket of each run
+    """
+    starts = np.flatnonzero(np.diff(bucket_index, prepend=-1))
+    return starts, bucket_index[starts]
+
+
+def _scatter(buckets: int, bucket_ids: np.ndarray, values: np.ndarray, fill) -> np.ndarray:
+    result = np.full(buckets, fill, dtype=np.result_type(values, type(fill)))
+    result[bucket_ids] = values
+    return result
+
+
+def _aggregate_trades(
+    trades: Mapping[str, np.ndarray], start_time: int, end_time: int, origin: int, interval: int, buckets: int,
+) -> dict[str, np.ndarray]:
+    trade_ids = np.asarray(trades.get('trade_id', ()))
+    if len(trade_ids) > 1:
+        # aggregate trade ids grow with time, the loader repeats trades on page boundaries
+        if not np.all(trade_ids[1:] > trade_ids[:-1]):
+            order = np.argsort(trade_ids, kind='stable')
+            order = order[np.diff(trade_ids[order], prepend=trade_ids[order[0]] - 1) != 0]
+            trades = {name: np.asarray(values)[order] for name, values in trades.items()}
+
+    rows, bucket_index = _select(trades, start_time, end_time, origin, interval)
+    timestamps = np.asarray(trades['timestamp'], dtype=np.int64)[rows]
+    prices = np.asarray(trades['price'], dtype=np.float64)[rows]
+    quantities = np.asarray(trades['quantity'], dtype=np.float64)[rows]
+    is_buy = ~np.asarray(trades['is_buyer_maker'], dtype=bool)[rows]
+
+    if not len(rows):
+        empty_prices = np.full(buckets, np.nan)
+        zero_volumes = np.zeros(buckets)
+        zero_trades = np.zeros(buckets, dtype=np.int64)
+        no_timestamps = np.full(buckets, NAT)
+        return {
+            'open': empty_prices, 'high': empty_prices, 'low': empty_prices, 'close': empty_prices,
+            'open_timestamp': no_timestamps, 'close_timestamp': no_timestamps,
+            'volume': zero_volumes, 'buy_volume': zero_volumes, 'sell_volume': zero_volumes,
+            'trades': zero_trades, 'buy_trades': zero_trades, 'sell_trades': zero_trades,
+        }
+
+    starts, bucket_ids = _segments(bucket_index)
+    ends = np.append(starts[1:], len(rows))
+    buy_quantities = np.where(is_buy, quantities, 0.0)
+    buy_trades = np.add.reduceat(is_buy.astype(np.int64), starts)
+    trade_counts = ends - starts
+
+    return {
+        'open': _scatter(buckets, bucket_ids, prices[starts], np.nan),
+        'high': _scatter(buckets, bucket_ids, np.maximum.reduceat(prices, starts), np.nan),
+        'low': _scatter(buckets, bucket_ids, np.minimum.reduceat(prices, starts), np.nan),
+        'close': _scatter(buckets, bucket_ids, prices[ends - 1], np.nan),
+        'open_timestamp': _scatter(buckets, bucket_ids, timestamps[starts], NAT),
+        'close_timestamp': _scatter(buckets, bucket_ids, timestamps[ends - 1], NAT),
+        'volume': _scatter(buckets, bucket_ids, np.add.reduceat(quantities, starts), 0.0),
+        'buy_volume': _scatter(buckets, bucket_ids, np.add.reduceat(buy_quantities, starts), 0.0),
+        'sell_volume': _scatter(buckets, bucket_ids, np.add.reduceat(quantities - buy_quantities, starts), 0.0),
+        'trades': _scatter(buckets, bucket_ids, trade_counts, 0),
+        'buy_trades': _scatter(buckets, bucket_ids, buy_trades, 0),
+        'sell_trades': _scatter(buckets, bucket_ids, trade_counts - buy_trades, 0),
+    }
+
+
+def _combine_timestamps(spot: np.ndarray, perp: np.ndarray, combine) -> np.ndarray:
+    spot_missing = spot == NAT
+    perp_missing = perp == NAT
+    return np.where(spot_missing, perp, np.where(perp_missing, spot, combine(spot, perp)))
+
+
+def _first_valid(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    valid = np.flatnonzero(~np.isnan(values))
+    if not len(valid):
+        return np.full(len(starts), np.nan)
+    positions = np.searchsorted(valid, starts)
+    rows = valid[np.minimum(positions, len(valid) - 1)]
+    return np.where((positions < len(valid)) & (rows < ends), values[rows], np.nan)
+
+
+def _last_valid(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    valid = np.flatnonzero(~np.isnan(values))
+    if not len(valid):
+        return np.full(len(starts), np.nan)
+    positions = np.searchsorted(valid, ends) - 1
+    rows = valid[np.maximum(positions, 0)]
+    return np.where((positions >= 0) & (rows >= starts), values[rows], np.nan)
+
+
+def _last_values(
+    data: Mapping[str, np.ndarray], column: str, start_time: int, end_time: int,
+    origin: int, interval: int, buckets: int,
+) -> np.ndarray:
+    rows, bucket_index = _select(data, start_time, end_time, origin, interval)
+    if not len(rows):
+        return np.full(buckets, np.nan)
+    starts, bucket_ids = _segments(bucket_index)
+    ends = np.append(starts[1:], len(rows))
+    values = np.asarray(data[column], dtype=np.float64)[rows]
+    return _scatter(buckets, bucket_ids, values[ends - 1], np.nan)
+
+
+if __name__ == '__main__':
+    import binance
+
+    client = binance.Client()
+    cache = DiskCache()
+    scheduler = RequestScheduler()
+    spot_client = SpotClient(client=client, cache=cache, scheduler=scheduler)
+    perp_client = PerpClient(client=client, cache=cache, scheduler=scheduler)
+    open_interest_client = OpenInterestClient(client=client, cache=cache, scheduler=scheduler)
+    funding_rate_client = FundingRateClient(client=client, cache=cache, scheduler=scheduler)
+    processor = NumpyCandleProcessor(
+        spot_client=spot_client,
+        perp_client=perp_client,
+        open_interest_client=open_interest_client,
+        funding_rate_client=funding_rate_client,
+    )
+
+    now = datetime(
+        year=2024, month=9, day=13, hour=7, minute=0, second=0, tzinfo=timezone.utc
+    )
+    start = now - timedelta(days=1)
+    end = start + timedelta(days=1)
+    candles: pd.DataFrame = processor.process(start_time=start, end_time=end)
+
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    candles.to_feather(PROCESSED_DIR / 'result_numpy.feather')
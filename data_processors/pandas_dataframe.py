@@ -1,40 +1,49 @@
 import csv
 import time
+from concurrent.futures import Executor
 from datetime import datetime, timedelta, timezone
-from typing import Iterator
+from typing import Iterator, Iterable
 
-import binance
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
 
+from data_loaders.cache import DiskCache
 from data_loaders.clients import (
     SpotClient, PerpClient, OpenInterestClient,
     FundingRateClient, TData,
 )
 from data_loaders.loader import Loader
+from data_loaders.merge import CommitIterator
+from data_loaders.metrics import CANDLE_AGGREGATE_SECONDS, CANDLES_TOTAL
+from data_loaders.models.open_interest import Period
+from data_loaders.rate_limit import RequestScheduler
+from data_loaders.time_conversion import sort_periods, to_timeframe, to_timestamp, as_timestamp
 from data_processors.models.candles import Candle
 from paths import PROCESSED_DIR
 
 
-class CommitIterator(Iterator[TData]):
+def _take_until(iterator: CommitIterator, end_timestamp: int) -> Iterator[TData]:
     """
-    Iterator that repeats the last element if it was not committed
+    Yields data before the end, the first data at or after it stays uncommitted for the next chunk
     """
-    def __init__(self, iterator: Iterator[TData]):
-        self._iterator = iterator
-        self._uncommitted: TData | None = None
+    for data in iterator:
+        if as_timestamp(data.timestamp) >= end_timestamp:
+            return
+        iterator.commit()
+        yield data
 
-    def __iter__(self):
-        return self
 
-    def __next__(self):
-        if self._uncommitted is None:
-            self._uncommitted = next(self._iterator)
-        return self._uncommitted
+def _to_df(data: Iterable[TData]) -> pd.DataFrame:
+    data = [data._asdict() if isinstance(data, tuple) else data.dict() for data in data]
+    if not data:
+        return pd.DataFrame(columns=['timestamp'])
+    return pd.DataFrame(data)
 
-    def commit(self):
-        if self._uncommitted is None:
-            raise ValueError('No uncommitted data')
-        self._uncommitted = None
+
+def _to_datetime(timestamps: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(timestamps):
+        return pd.to_datetime(timestamps, unit='ms', utc=True)
+    return pd.to_datetime(timestamps)
 
 
 class PandasCandleProcessor:
@@ -47,40 +56,124 @@ class PandasCandleProcessor:
         perp_client: PerpClient,
         open_interest_client: OpenInterestClient,
         funding_rate_client: FundingRateClient,
+        periods: Iterable[Period] = (Period.FIVE_MINUTES,),
+        symbol: str = 'BTCUSDT',
+        executor: Executor | None = None,
     ):
-        self._spot_loader = Loader(data_client=spot_client)
-        self._perp_loader = Loader(data_client=perp_client)
-        self._open_interest_loader = Loader(data_client=open_interest_client)
-        self._funding_rate_loader = Loader(data_client=funding_rate_client)
+        """
+        :param periods: candle periods returned by `process_periods`, coarser ones are rolled up from the finest
+        :param executor: requests the next page of every source on it while the current page is consumed
+        """
+        self._spot_loader = Loader(data_client=spot_client, symbol=symbol, executor=executor)
+        self._perp_loader = Loader(data_client=perp_client, symbol=symbol, executor=executor)
+        self._open_interest_loader = Loader(data_client=open_interest_client, symbol=symbol, executor=executor)
+        self._funding_rate_loader = Loader(data_client=funding_rate_client, symbol=symbol, executor=executor)
+        self._periods = sort_periods(periods)
+        self._interval = pd.Timedelta(self._periods[0].duration)
+        self._aggregate_seconds = CANDLE_AGGREGATE_SECONDS.labels(processor='pandas', symbol=symbol)
+        self._candles_total = CANDLES_TOTAL.labels(processor='pandas', symbol=symbol)
 
     def _get_data_df(self, start_time: datetime, end_time: datetime, loader: Loader) -> pd.DataFrame:
-        data = [
-            data.dict() for data in loader.load(
-                start_time=start_time,
-                end_time=end_time,
-            )
-        ]
-        if not data:
-            return pd.DataFrame(columns=['timestamp'])
-        return pd.DataFrame(data)
+        return _to_df(loader.load(
+            start_time=start_time,
+            end_time=end_time,
+        ))
 
     def process(self, start_time: datetime, end_time: datetime) -> pd.DataFrame:
-        spot_df = self._get_data_df(start_time, end_time, self._spot_loader)
-        perp_df = self._get_data_df(start_time, end_time, self._perp_loader)
-        open_interest_df = self._get_data_df(start_time, end_time, self._open_interest_loader)
-        funding_rate_df = self._get_data_df(start_time, end_time, self._funding_rate_loader)
+        """
+        Returns candles of the finest period
+        """
+        return self.process_periods(start_time, end_time)[self._periods[0]]
+
+    def process_periods(self, start_time: datetime, end_time: datetime) -> dict[Period, pd.DataFrame]:
+        """
+        Returns candles of every period, coarser candles are resampled from the finest ones instead of trades
+        """
+        finest, *coarser = self._periods
+        data_frames = [
+            self._get_data_df(start_time, end_time, loader)
+            for loader in (self._spot_loader, self._perp_loader, self._open_interest_loader, self._funding_rate_loader)
+        ]
+        # loading is timed by the client metrics, only the aggregation of the loaded frames is timed here
+        aggregate_start = time.perf_counter()
+        combined_df = self._combine_frames(*data_frames)
+        frames = {finest: combined_df}
+        for period in coarser:
+            frames[period] = combined_df.resample(pd.Timedelta(period.duration)).agg({
+                column: _roll_up_aggregation(column) for column in combined_df.columns
+            })
 
+        for frame in frames.values():
+            frame.reset_index(inplace=True)
+            frame.ffill(inplace=True)
+        self._aggregate_seconds.observe(time.perf_counter() - aggregate_start)
+        self._candles_total.inc(len(frames[finest]))
+        return frames
+
+    def process_chunks(
+        self, start_time: datetime, end_time: datetime, chunk_candles: int = 288,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields candles of the finest period in dataframes of up to `chunk_candles` candles.
+        Every source is read once and only the data of one chunk is held at a time,
+        so peak memory is set by the chunk size and not by the time range.
+        Chunks end on candle boundaries, only the last row is carried over to forward fill the next chunk
+        """
+        iterators = [
+            CommitIterator(iter(loader.load(start_time=start_time, end_time=end_time)))
+            for loader in (self._spot_loader, self._perp_loader, self._open_interest_loader, self._funding_rate_loader)
+        ]
+        chunk_duration = self._interval * chunk_candles
+        chunk_end = pd.Timestamp(to_timeframe(start_time, self._periods[0].duration)) + chunk_duration
+        last_row = None
+        while chunk_end - chunk_duration <= end_time:
+            chunk_end_timestamp = to_timestamp(chunk_end)
+            frames = [_to_df(_take_until(iterator, chunk_end_timestamp)) for iterator in iterators]
+            chunk_end += chunk_duration
+            if all(df.empty for df in frames):
+                continue
+
+            aggregate_start = time.perf_counter()
+            combined_df = self._combine_frames(*frames)
+            combined_df.reset_index(inplace=True)
+            if last_row is not None:
+                # timestamp columns without any value in this chunk are not typed as timestamps
+                for column in combined_df.columns.intersection(last_row.columns):
+                    if is_datetime64_any_dtype(last_row[column]) and combined_df[column].isna().all():
+                        combined_df[column] = pd.Series(pd.NaT, index=combined_df.index, dtype=last_row[column].dtype)
+                combined_df = pd.concat([last_row, combined_df], ignore_index=True).ffill().iloc[1:]
+            else:
+                combined_df.ffill(inplace=True)
+            last_row = combined_df.iloc[[-1]]
+            combined_df = combined_df.reset_index(drop=True)
+            self._aggregate_seconds.observe(time.perf_counter() - aggregate_start)
+            self._candles_total.inc(len(combined_df))
+            yield combined_df
+
+    def _combine_frames(
+        self, spot_df: pd.DataFrame, perp_df: pd.DataFrame, open_interest_df: pd.DataFrame,
+        funding_rate_df: pd.DataFrame,
+    ) -> pd.DataFrame:
         for df in [spot_df, perp_df]:
             if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
+                df['timestamp'] = _to_datetime(df['timestamp'])
                 df.set_index('timestamp', inplace=True, drop=False)
 
         for df in [open_interest_df, funding_rate_df]:
             if not df.empty:
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
+                df['timestamp'] = _to_datetime(df['timestamp'])
                 df.set_index('timestamp', inplace=True)
 
         def _aggregation(group):
+            if group.empty:
+                # a bucket without trades of this market between buckets with trades is forward filled
+                # like a bucket outside the trades of the market
+                return pd.Series({
+                    'open': float('nan'), 'open_timestamp': pd.NaT, 'high': float('nan'), 'low': float('nan'),
+                    'close': float('nan'), 'close_timestamp': pd.NaT, 'volume': float('nan'), 'trades': float('nan'),
+                    'buy_volume': float('nan'), 'sell_volume': float('nan'), 'buy_trades': float('nan'),
+                    'sell_trades': float('nan'),
+                })
             total_quantity = group['quantity'].sum()
             total_trades = group['trade_id'].nunique()
             open_price = group['price'].iloc[0]
@@ -115,7 +208,7 @@ class PandasCandleProcessor:
             return pd.Series(result)
 
         if not spot_df.empty:
-            spot_resampled = spot_df.resample('5min').apply(_aggregation)
+            spot_resampled = spot_df.resample(self._interval).apply(_aggregation)
             spot_resampled = spot_resampled.rename(columns={
                 'open': 'open_spot',
                 'open_timestamp': 'open_timestamp_spot',
@@ -134,7 +227,7 @@ class PandasCandleProcessor:
             spot_resampled = pd.DataFrame()
 
         if not perp_df.empty:
-            perp_resampled = perp_df.resample('5min').apply(_aggregation)
+            perp_resampled = perp_df.resample(self._interval).apply(_aggregation)
             perp_resampled = perp_resampled.rename(columns={
                 'open': 'open_perp',
                 'open_timestamp': 'open_timestamp_perp',
@@ -154,7 +247,7 @@ class PandasCandleProcessor:
 
         if not open_interest_df.empty:
             numeric_cols_oi = open_interest_df.select_dtypes(include='number').columns
-            open_interest_resampled = open_interest_df[numeric_cols_oi].resample('5min').mean()
+            open_interest_resampled = open_interest_df[numeric_cols_oi].resample(self._interval).mean()
             if 'sum_open_interest' in open_interest_resampled.columns:
                 open_interest_resampled.rename(columns={'sum_open_interest': 'open_interest'}, inplace=True)
         else:
@@ -162,7 +255,7 @@ class PandasCandleProcessor:
 
         if not funding_rate_df.empty:
             numeric_cols_fr = funding_rate_df.select_dtypes(include='number').columns
-            funding_rate_resampled = funding_rate_df[numeric_cols_fr].resample('5min').mean()
+            funding_rate_resampled = funding_rate_df[numeric_cols_fr].resample(self._interval).mean()
             if 'funding_rate_column_name' in funding_rate_resampled.columns:
                 funding_rate_resampled.rename(columns={'funding_rate_column_name': 'funding_rate'}, inplace=True)
         else:
@@ -170,34 +263,58 @@ class PandasCandleProcessor:
 
         combined_df = spot_resampled.join(perp_resampled, how='outer')
 
-        combined_df['volume_total'] = combined_df[['volume_spot', 'volume_perp']].sum(axis=1, skipna=True)
-        combined_df['buy_volume_total'] = combined_df[['buy_volume_spot', 'buy_volume_perp']].sum(axis=1, skipna=True)
-        combined_df['sell_volume_total'] = combined_df[['sell_volume_spot', 'sell_volume_perp']].sum(axis=1, skipna=True)
-        combined_df['trades_total'] = combined_df[['trades_spot', 'trades_perp']].sum(axis=1, skipna=True)
-        combined_df['buy_trades_total'] = combined_df[['buy_trades_spot', 'buy_trades_perp']].sum(axis=1, skipna=True)
-        combined_df['sell_trades_total'] = combined_df[['sell_trades_spot', 'sell_trades_perp']].sum(axis=1, skipna=True)
+        combined_df['volume_total'] = combined_df.reindex(columns=['volume_spot', 'volume_perp']).sum(axis=1, skipna=True)
+        combined_df['buy_volume_total'] = combined_df.reindex(columns=['buy_volume_spot', 'buy_volume_perp']).sum(axis=1, skipna=True)
+        combined_df['sell_volume_total'] = combined_df.reindex(columns=['sell_volume_spot', 'sell_volume_perp']).sum(axis=1, skipna=True)
+        combined_df['trades_total'] = combined_df.reindex(columns=['trades_spot', 'trades_perp']).sum(axis=1, skipna=True)
+        combined_df['buy_trades_total'] = combined_df.reindex(columns=['buy_trades_spot', 'buy_trades_perp']).sum(axis=1, skipna=True)
+        combined_df['sell_trades_total'] = combined_df.reindex(columns=['sell_trades_spot', 'sell_trades_perp']).sum(axis=1, skipna=True)
 
-        combined_df['open_timestamp'] = combined_df[['open_timestamp_spot', 'open_timestamp_perp']].min(axis=1)
-        combined_df['close_timestamp'] = combined_df[['close_timestamp_spot', 'close_timestamp_perp']].max(axis=1)
+        combined_df['open_timestamp'] = combined_df.reindex(columns=['open_timestamp_spot', 'open_timestamp_perp']).min(axis=1)
+        combined_df['close_timestamp'] = combined_df.reindex(columns=['close_timestamp_spot', 'close_timestamp_perp']).max(axis=1)
 
         if not open_interest_resampled.empty:
             combined_df = combined_df.join(open_interest_resampled, how='outer')
         if not funding_rate_resampled.empty:
             combined_df = combined_df.join(funding_rate_resampled, how='outer')
 
-        combined_df.reset_index(inplace=True)
+        return combined_df
+
 
-        combined_df.ffill(inplace=True)
+_ROLL_UP_AGGREGATIONS = (
+    ('open_timestamp', 'min'),
+    ('close_timestamp', 'max'),
+    ('open_interest', 'mean'),
+    ('open_', 'first'),
+    ('high_', 'max'),
+    ('low_', 'min'),
+    ('close_', 'last'),
+    ('volume_', 'sum'),
+    ('buy_', 'sum'),
+    ('sell_', 'sum'),
+    ('trades_', 'sum'),
+)
 
-        return combined_df
+
+def _roll_up_aggregation(column: str) -> str:
+    for prefix, aggregation in _ROLL_UP_AGGREGATIONS:
+        if column.startswith(prefix):
+            return aggregation
+    return 'mean'
 
 
 if __name__ == '__main__':
+    import binance
+
+    from data_processors.sinks import ArrowCandleSink
+
     client = binance.Client()
-    spot_client = SpotClient(client=client)
-    perp_client = PerpClient(client=client)
-    open_interest_client = OpenInterestClient(client=client)
-    funding_rate_client = FundingRateClient(client=client)
+    cache = DiskCache()
+    scheduler = RequestScheduler()
+    spot_client = SpotClient(client=client, cache=cache, scheduler=scheduler)
+    perp_client = PerpClient(client=client, cache=cache, scheduler=scheduler)
+    open_interest_client = OpenInterestClient(client=client, cache=cache, scheduler=scheduler)
+    funding_rate_client = FundingRateClient(client=client, cache=cache, scheduler=scheduler)
     processor = PandasCandleProcessor(
         spot_client=spot_client,
         perp_client=perp_client,
@@ -211,7 +328,7 @@ if __name__ == '__main__':
     start = now - timedelta(days=1)
     # end = start + timedelta(days=1)
     end = start + timedelta(minutes=20)
-    candles: pd.DataFrame = processor.process(start_time=start, end_time=end)
 
-    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-    candles.to_feather(PROCESSED_DIR / 'result_pandas.feather')
+    with ArrowCandleSink(PROCESSED_DIR / 'result_pandas.arrow') as sink:
+        for chunk in processor.process_chunks(start_time=start, end_time=end):
+            sink.write_frame(chunk)
@@ -0,0 +1,56 @@
+import time
+from typing import Iterable, Iterator
+
+from data_loaders.metrics import CANDLE_FILL_SECONDS
+from data_loaders.models.open_interest import Period
+from data_loaders.time_conversion import to_timeframe
+from data_processors.candle_filler import CandleFiller
+from data_processors.models.candles import Candle
+
+
+class PeriodRollUp:
+    """
+    Rolls candles of the finest period up into coarser periods, candles must come in time order
+    """
+    def __init__(self, periods: list[Period], candle_filler: CandleFiller, symbol: str = 'BTCUSDT'):
+        """
+        :param periods: periods from the finest to the coarsest as returned by `sort_periods`
+        :param symbol: symbol of the candles, labels the fill metrics
+        """
+        self._finest, *self._coarser = periods
+        self._candle_filler = candle_filler
+        self._open_candles: dict[Period, Candle] = {}
+        self._fill_seconds = {
+            period: CANDLE_FILL_SECONDS.labels(period=period.value, symbol=symbol) for period in self._coarser
+        }
+
+    def add(self, candle: Candle) -> Iterator[tuple[Period, Candle]]:
+        """
+        Yields the finest candle and then every coarser candle it completes,
+        or that ended before it when candles of empty buckets are skipped
+        """
+        yield self._finest, candle
+
+        candle_end = candle.timestamp + self._finest.duration
+        for period in self._coarser:
+            timeframe = to_timeframe(candle.timestamp, period.duration)
+            rolled_candle = self._open_candles.get(period)
+            if rolled_candle is not None and rolled_candle.timestamp != timeframe:
+                yield period, self._open_candles.pop(period)
+                rolled_candle = None
+            if rolled_candle is None:
+                rolled_candle = self._open_candles[period] = Candle(timestamp=timeframe)
+
+            start = time.perf_counter()
+            self._candle_filler.fill_candle(candle, rolled_candle)
+            self._fill_seconds[period].observe(time.perf_counter() - start)
+            if candle_end == timeframe + period.duration:
+                yield period, self._open_candles.pop(period)
+
+    def flush(self) -> Iterable[tuple[Period, Candle]]:
+        """
+        Yields coarser candles left incomplete at the end of the data
+        """
+        for period in self._coarser:
+            if period in self._open_candles:
+                yield period, self._open_candles.pop(period)
@@ -0,0 +1,183 @@
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Literal
+
+import numpy as np
+import pyarrow as pa
+
+from data_loaders.metrics import SINK_WRITE_SECONDS
+from data_processors.models import candle_ring
+from data_processors.models.candles import Candle
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+_ARROW_TYPES = {
+    'timestamp': pa.timestamp('us', tz='UTC'),
+    'open_timestamp': pa.timestamp('us', tz='UTC'),
+    'close_timestamp': pa.timestamp('us', tz='UTC'),
+}
+CANDLE_SCHEMA = pa.schema([
+    (name, _ARROW_TYPES.get(name, pa.int64() if field.annotation == int | None else pa.float64()))
+    for name, field in Candle.model_fields.items()
+])
+
+SinkFormat = Literal['ipc', 'stream', 'parquet']
+
+
+class ArrowCandleSink:
+    """
+    Appends candles column by column and writes them as Arrow record batches of `batch_size` candles:
+    an Arrow IPC file (`ipc`, the Feather v2 format), an IPC stream (`stream`) or parquet (`parquet`).
+    Uncompressed IPC files can be memory-mapped by readers without a parse step
+    """
+    def __init__(self, path: Path, format: SinkFormat = 'ipc', batch_size: int = 4096):
+        self._path = path
+        self._format = format
+        self._batch_size = batch_size
+        self._columns: dict[str, list] = {name: [] for name in CANDLE_SCHEMA.names}
+        self._writer = None
+        self._write_seconds = SINK_WRITE_SECONDS.labels(sink=format)
+        self.written = 0
+
+    def __enter__(self) -> 'ArrowCandleSink':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, candle: Candle):
+        values = candle.__dict__
+        for name, column in self._columns.items():
+            column.append(values[name])
+        if len(self._columns['timestamp']) >= self._batch_size:
+            self.flush()
+
+    def write_candles(self, candles: Iterable[Candle]):
+        for candle in candles:
+            self.write(candle)
+
+    def write_frame(self, df: 'pd.DataFrame'):
+        """
+        Writes candles of a processor dataframe, columns which are not candle fields are left out
+        """
+        self.flush()
+        columns = [name for name in CANDLE_SCHEMA.names if name in df.columns]
+        table = pa.Table.from_pandas(df[columns], preserve_index=False)
+        arrays = [
+            table.column(name).cast(field.type) if name in columns else pa.nulls(len(df), field.type)
+            for name, field in zip(CANDLE_SCHEMA.names, CANDLE_SCHEMA)
+        ]
+        self._write_table(pa.Table.from_arrays(arrays, schema=CANDLE_SCHEMA))
+
+    def flush(self):
+        if not self._columns['timestamp']:
+            return
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(self._columns.values(), CANDLE_SCHEMA)],
+            schema=CANDLE_SCHEMA,
+        )
+        for column in self._columns.values():
+            column.clear()
+        self._write_table(pa.Table.from_batches([batch]))
+
+    def close(self):
+        self.flush()
+        if self._writer is None:
+            self._write_table(CANDLE_SCHEMA.empty_table())
+        self._writer.close()
+
+    def _write_table(self, table: pa.Table):
+        if self._writer is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            if self._format == 'parquet':
+                import pyarrow.parquet as pq
+
+                self._writer = pq.ParquetWriter(self._path, CANDLE_SCHEMA, compression='zstd')
+            elif self._format == 'stream':
+                self._writer = pa.ipc.new_stream(self._path, CANDLE_SCHEMA)
+            else:
+                self._writer = pa.ipc.new_file(self._path, CANDLE_SCHEMA)
+        with self._write_seconds.time():
+            self._writer.write_table(table)
+        self.written += table.num_rows
+
+
+class SharedMemoryCandleSink:
+    """
+    Publishes candles into a memory-mapped ring buffer of `capacity` candles read by `CandleRingReader`,
+    e.g. a file in `/dev/shm` shared with reader processes on the host.
+    Every candle is written to its slot first and then made visible by incrementing the sequence counter
+    """
+    def __init__(self, path: Path, capacity: int = 65536):
+        """
+        :param capacity: candles kept for readers, a ring of the same layout and capacity is continued
+        """
+        size = candle_ring.ring_size(capacity)
+        mode = 'r+' if path.exists() and path.stat().st_size == size else 'w+'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._buffer = np.memmap(path, dtype=np.uint8, mode=mode, shape=size)
+        self._header = candle_ring.map_header(self._buffer)
+        if mode == 'r+' and not (
+            candle_ring.has_layout(self._header) and self._header[candle_ring.CAPACITY_WORD] == capacity
+        ):
+            self._header[:] = 0
+        if not self._header[candle_ring.MAGIC_WORD]:
+            self._header[candle_ring.CAPACITY_WORD] = capacity
+            self._header[candle_ring.COLUMNS_WORD] = len(candle_ring.COLUMNS)
+            self._header[candle_ring.VERSION_WORD] = candle_ring.VERSION
+            self._header[candle_ring.MAGIC_WORD] = candle_ring.MAGIC
+        self._capacity = capacity
+        self._write_seconds = SINK_WRITE_SECONDS.labels(sink='ring')
+        self._columns = [
+            (name, column, self._encoder(name))
+            for name, column in candle_ring.map_columns(self._buffer, capacity).items()
+        ]
+        self.written = 0
+
+    def __enter__(self) -> 'SharedMemoryCandleSink':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, candle: Candle):
+        start = time.perf_counter()
+        values = candle.__dict__
+        sequence = int(self._header[candle_ring.SEQUENCE_WORD])
+        slot = sequence % self._capacity
+        for name, column, encode in self._columns:
+            column[slot] = encode(values[name])
+        self._header[candle_ring.SEQUENCE_WORD] = sequence + 1
+        self.written += 1
+        self._write_seconds.observe(time.perf_counter() - start)
+
+    def write_candles(self, candles: Iterable[Candle]):
+        for candle in candles:
+            self.write(candle)
+
+    def close(self):
+        self._buffer.flush()
+
+    @staticmethod
+    def _encoder(name: str):
+        if name in candle_ring.TIMESTAMP_FIELDS:
+            return candle_ring.encode_timestamp
+        if name in candle_ring.INT_FIELDS:
+            return lambda value: candle_ring.INT_NULL if value is None else value
+        return lambda value: np.nan if value is None else value
+
+
+def read_candles(path: Path, format: SinkFormat = 'ipc') -> pa.Table:
+    """
+    Reads candles written by `ArrowCandleSink` in the `format` of the sink,
+    IPC files and streams are memory-mapped and their columns are not copied
+    """
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path, schema=CANDLE_SCHEMA)
+    with pa.memory_map(str(path)) as source:
+        if format == 'stream':
+            return pa.ipc.open_stream(source).read_all()
+        return pa.ipc.open_file(source).read_all()
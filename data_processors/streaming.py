@@ -0,0 +1,187 @@
+import asyncio
+import csv
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Iterable
+
+from data_loaders.feeds import IFeed, BinanceFeed
+from data_loaders.metrics import CANDLE_AGGREGATE_SECONDS, CANDLE_EMIT_LAG_SECONDS, CANDLES_TOTAL
+from data_loaders.models.open_interest import Period
+from data_loaders.time_conversion import sort_periods, to_timestamp, from_timestamp, as_timestamp
+from data_processors.candle_accumulator import CandleAccumulator
+from data_processors.candle_filler import CandleFiller
+from data_processors.models.candles import Candle
+from data_processors.roll_up import PeriodRollUp
+from paths import PROCESSED_DIR, SHARED_MEMORY_DIR
+
+_END = object()
+_TIMEOUT = object()
+
+
+def wall_clock() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class StreamingCandleProcessor:
+    """
+    Builds candles from a push feed and yields each candle as soon as its bucket is closed
+    """
+    def __init__(
+        self,
+        feed: IFeed,
+        candle_filler: CandleFiller,
+        periods: Iterable[Period] = (Period.FIVE_MINUTES,),
+        lateness: timedelta = timedelta(milliseconds=250),
+        clock: Callable[[], datetime] | None = wall_clock,
+        symbol: str = 'BTCUSDT',
+    ):
+        """
+        :param candle_filler: rolls finer candles up into coarser periods
+        :param lateness: how long a bucket is kept open after its end for data arriving out of order,
+            data of an already closed bucket is dropped and counted in `late_count`
+        :param clock: closes buckets when the time passes their end and `lateness` even if the feed is quiet,
+            `None` closes buckets on data timestamps only, e.g. when a feed replays past data
+        :param symbol: symbol of the feed, labels the metrics
+        """
+        self._feed = feed
+        self._candle_filler = candle_filler
+        self._periods = sort_periods(periods)
+        self._interval_ms = self._periods[0].duration // timedelta(milliseconds=1)
+        self._lateness_ms = lateness // timedelta(milliseconds=1)
+        self._clock = clock
+        self._symbol = symbol
+        self._emit_lag = CANDLE_EMIT_LAG_SECONDS.labels(processor='streaming', symbol=symbol)
+        self._aggregate_seconds = CANDLE_AGGREGATE_SECONDS.labels(processor='streaming', symbol=symbol)
+        # time spent in the accumulator of every open bucket
+        self._aggregate_times: dict[int, float] = {}
+        self._candles_total = CANDLES_TOTAL.labels(processor='streaming', symbol=symbol)
+        self.late_count = 0
+
+    async def process(self) -> AsyncIterator[Candle]:
+        """
+        Yields candles of the finest period until the feed ends
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        pump = asyncio.create_task(self._pump(queue))
+        buckets: dict[int, CandleAccumulator] = {}
+        closed_until = None
+        watermark = None
+        try:
+            while True:
+                data = await self._next(queue, buckets)
+                if data is _TIMEOUT:
+                    for candle in self._close(buckets, to_timestamp(self._clock()) - self._lateness_ms):
+                        closed_until = to_timestamp(candle.timestamp)
+                        yield candle
+                    continue
+                if data is _END:
+                    break
+                if isinstance(data, BaseException):
+                    raise data
+
+                timestamp = as_timestamp(data.timestamp)
+                bucket = timestamp - timestamp % self._interval_ms
+                if closed_until is not None and bucket <= closed_until:
+                    self.late_count += 1
+                    continue
+                add_start = time.perf_counter()
+                accumulator = buckets.get(bucket)
+                if accumulator is None:
+                    accumulator = buckets[bucket] = CandleAccumulator()
+                    self._aggregate_times[bucket] = 0.0
+                accumulator.add(data)
+                self._aggregate_times[bucket] += time.perf_counter() - add_start
+
+                if watermark is None or timestamp > watermark:
+                    watermark = timestamp
+                    for candle in self._close(buckets, watermark - self._lateness_ms):
+                        closed_until = to_timestamp(candle.timestamp)
+                        yield candle
+
+            for candle in self._close(buckets, None):
+                yield candle
+        finally:
+            pump.cancel()
+
+    async def process_periods(self) -> AsyncIterator[tuple[Period, Candle]]:
+        """
+        Yields candles of every period, a coarser candle is yielded right after the finer candle closing its period,
+        or when buckets without data end the period after the next finer candle or at the end of the feed
+        """
+        roll_up = PeriodRollUp(self._periods, self._candle_filler, self._symbol)
+        async for candle in self.process():
+            for period_candle in roll_up.add(candle):
+                yield period_candle
+        for period_candle in roll_up.flush():
+            yield period_candle
+
+    async def _pump(self, queue: asyncio.Queue):
+        iterator = aiter(self._feed)
+        try:
+            async for data in iterator:
+                await queue.put(data)
+            await queue.put(_END)
+        except Exception as error:
+            await queue.put(error)
+        finally:
+            if hasattr(iterator, 'aclose'):
+                await iterator.aclose()
+
+    async def _next(self, queue: asyncio.Queue, buckets: dict[int, CandleAccumulator]):
+        """
+        Waits for the next data of the feed but not past the time the oldest open bucket must be closed
+        """
+        if not queue.empty() or not buckets or self._clock is None:
+            return await queue.get()
+        close_at = min(buckets) + self._interval_ms + self._lateness_ms
+        timeout = (close_at - to_timestamp(self._clock())) / 1000
+        if timeout <= 0:
+            return _TIMEOUT
+        try:
+            return await asyncio.wait_for(queue.get(), timeout)
+        except TimeoutError:
+            return _TIMEOUT
+
+    def _close(self, buckets: dict[int, CandleAccumulator], watermark: int | None) -> Iterable[Candle]:
+        """
+        Closes buckets ending at the watermark or before it in time order, all of them without a watermark
+        """
+        for bucket in sorted(buckets):
+            if watermark is not None and bucket + self._interval_ms > watermark:
+                break
+            close_start = time.perf_counter()
+            candle = buckets.pop(bucket).close(from_timestamp(bucket))
+            self._aggregate_seconds.observe(self._aggregate_times.pop(bucket) + time.perf_counter() - close_start)
+            self._emit_lag.observe(time.time() - (bucket + self._interval_ms) / 1000)
+            self._candles_total.inc()
+            yield candle
+
+
+async def main():
+    from binance import AsyncClient
+
+    from data_processors.sinks import SharedMemoryCandleSink
+
+    client = await AsyncClient.create()
+    processor = StreamingCandleProcessor(feed=BinanceFeed(client=client), candle_filler=CandleFiller())
+
+    fieldnames = list(Candle.model_fields.keys())
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        with (
+            open(PROCESSED_DIR / 'result_stream.csv', mode='a', newline='') as csv_file,
+            SharedMemoryCandleSink(SHARED_MEMORY_DIR / 'candles_BTCUSDT') as ring,
+        ):
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            if csv_file.tell() == 0:
+                writer.writeheader()
+            async for candle in processor.process():
+                ring.write(candle)
+                writer.writerow(candle.model_dump())
+                csv_file.flush()
+    finally:
+        await client.close_connection()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
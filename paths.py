@@ -3,3 +3,8 @@ from pathlib import Path
 ROOT_DIR = Path(__file__).parent
 DATA_DIR = ROOT_DIR / 'data'
 PROCESSED_DIR = ROOT_DIR / 'processed_data'
+BENCHMARK_DATA_DIR = DATA_DIR / 'benchmarks'
+STORE_DIR = DATA_DIR / 'store'
+CACHE_DIR = DATA_DIR / 'cache'
+CHECKPOINT_DIR = DATA_DIR / 'checkpoints'
+SHARED_MEMORY_DIR = Path('/dev/shm')
@@ -0,0 +1,114 @@
+from bisect import bisect_left
+from datetime import timedelta
+from typing import Iterable
+
+from data_loaders.clients import IClient, IFromIdClient, TRADES_PAGE_LIMIT
+from data_loaders.models.compact_trade import CompactTrade
+from data_loaders.time_conversion import from_timestamp
+from data_processors.models.candles import Candle
+
+START_TIMESTAMP = 1726124400000
+
+
+class EmptyClient(IClient):
+    """
+    Client of a source without data in any window
+    """
+    def get(self, symbol: str, start_time: int, end_time: int) -> list:
+        return []
+
+
+class StubTradeClient(IFromIdClient[CompactTrade]):
+    """
+    Serves `count` trades with consecutive ids, one trade every `step` milliseconds from `START_TIMESTAMP`,
+    every `buyer_maker_every`-th trade is a buyer maker one. A `gap` of (index, milliseconds) moves the trades
+    from the index on later by the milliseconds, their ids stay consecutive
+    """
+    def __init__(
+            self, count: int = 20_000, first_id: int = 0, step: int = 1,
+            trade_class: type[CompactTrade] = CompactTrade, buyer_maker_every: int = 2, gap: tuple[int, int] = (0, 0),
+    ):
+        gap_index, gap_milliseconds = gap
+        self._trades = [
+            trade_class(
+                START_TIMESTAMP + index * step + (gap_milliseconds if index >= gap_index else 0), first_id + index,
+                100.0 + index % 7, 0.5, index % buyer_maker_every == 0,
+            )
+            for index in range(count)
+        ]
+        self._timestamps = [trade.timestamp for trade in self._trades]
+        self._first_id = first_id
+        self.requests: list[tuple] = []
+
+    def get(self, symbol: str, start_time: int, end_time: int) -> Iterable[CompactTrade]:
+        self.requests.append(('get', symbol, start_time, end_time))
+        first = bisect_left(self._timestamps, start_time)
+        return [trade for trade in self._trades[first:first + TRADES_PAGE_LIMIT] if trade.timestamp <= end_time]
+
+    def get_from_id(self, symbol: str, from_id: int) -> Iterable[CompactTrade]:
+        self.requests.append(('get_from_id', symbol, from_id))
+        first = max(from_id - self._first_id, 0)
+        return self._trades[first:first + TRADES_PAGE_LIMIT]
+
+
+class FakeTime:
+    """
+    Clock of a scheduler that only moves when the scheduler sleeps
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def clock(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubBinanceClient:
+    """
+    Stands in for `binance.Client`: serves `count` raw aggregate trades one every `step` milliseconds
+    from `START_TIMESTAMP` on the spot and futures endpoints, open interest and funding rates are empty
+    """
+    def __init__(self, count: int = 5_000, step: int = 100):
+        self._trades = [
+            {'a': trade_id, 'p': str(100.0 + trade_id % 7), 'q': '0.5', 'f': trade_id, 'l': trade_id,
+             'T': START_TIMESTAMP + trade_id * step, 'm': trade_id % 2 == 0, 'M': True}
+            for trade_id in range(count)
+        ]
+
+    def get_aggregate_trades(self, symbol: str, limit: int = TRADES_PAGE_LIMIT, **params) -> list[dict]:
+        if 'fromId' in params:
+            page = [trade for trade in self._trades if trade['a'] >= params['fromId']]
+        else:
+            page = [trade for trade in self._trades if params['startTime'] <= trade['T'] <= params['endTime']]
+        return page[:limit]
+
+    futures_aggregate_trades = get_aggregate_trades
+
+    def futures_open_interest_hist(self, **params) -> list[dict]:
+        return []
+
+    def futures_funding_rate(self, **params) -> list[dict]:
+        return []
+
+
+def candles(first: int, count: int) -> list[Candle]:
+    """
+    Candles of consecutive 5 minute buckets from `START_TIMESTAMP`
+    """
+    start = from_timestamp(START_TIMESTAMP)
+    return [
+        Candle(
+            timestamp=start + timedelta(minutes=5 * index),
+            open_timestamp=start + timedelta(minutes=5 * index, seconds=1),
+            close_timestamp=start + timedelta(minutes=5 * index + 4, seconds=59),
+            open_spot=100.0 + index, close_spot=101.0 + index, volume_spot=0.5 * index, trades_spot=index,
+            # every third candle has no perp trades
+            open_perp=None if index % 3 == 0 else 200.0 + index,
+            trades_perp=None if index % 3 == 0 else 2 * index,
+        )
+        for index in range(first, first + count)
+    ]
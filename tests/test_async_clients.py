@@ -0,0 +1,67 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from data_loaders.async_clients import AsyncLoader, AsyncSpotClient, AsyncTransport
+from data_loaders.rate_limit import RequestScheduler
+from data_loaders.time_conversion import from_timestamp
+from tests.stubs import FakeTime, START_TIMESTAMP
+
+# one trade every 10 ms, the loaded window ends at the last one
+TRADES = [
+    {'a': trade_id, 'p': '100.0', 'q': '0.5', 'f': trade_id, 'l': trade_id, 'T': START_TIMESTAMP + trade_id * 10,
+     'm': trade_id % 2 == 0, 'M': True}
+    for trade_id in range(4_001)
+]
+
+
+def stub_app(throttle_every: int) -> web.Application:
+    """
+    Serves `TRADES` on the spot aggregate trades path, every `throttle_every`-th request is throttled
+    """
+    requests = 0
+
+    async def aggregate_trades(request: web.Request) -> web.Response:
+        nonlocal requests
+        requests += 1
+        if requests % throttle_every == 0:
+            return web.json_response(
+                {'code': -1003, 'msg': 'Too many requests'}, status=429, headers={'Retry-After': '3'},
+            )
+        limit = int(request.query['limit'])
+        if 'fromId' in request.query:
+            from_id = int(request.query['fromId'])
+            page = [trade for trade in TRADES if trade['a'] >= from_id]
+        else:
+            start_time, end_time = int(request.query['startTime']), int(request.query['endTime'])
+            page = [trade for trade in TRADES if start_time <= trade['T'] <= end_time]
+        return web.json_response(page[:limit])
+
+    app = web.Application()
+    app.router.add_get('/api/v3/aggTrades', aggregate_trades)
+    return app
+
+
+async def load(throttle_every: int, fake_time: FakeTime) -> list:
+    scheduler = RequestScheduler(clock=fake_time.clock, sleep=fake_time.sleep)
+    async with TestServer(stub_app(throttle_every)) as server:
+        base_url = str(server.make_url('')).rstrip('/')
+        async with AsyncTransport(base_urls={'spot': base_url}, scheduler=scheduler) as transport:
+            loader = AsyncLoader(AsyncSpotClient(transport, compact=True), pages_in_flight=3)
+            start, end = from_timestamp(START_TIMESTAMP), from_timestamp(TRADES[-1]['T'])
+            return [trade async for trade in loader.load(start_time=start, end_time=end)]
+
+
+def test_async_loader_pages_by_id():
+    trades = asyncio.run(load(throttle_every=1_000, fake_time=FakeTime()))
+
+    assert [trade.trade_id for trade in trades] == list(range(4_001))
+
+
+def test_async_loader_retries_throttled_pages():
+    fake_time = FakeTime()
+    trades = asyncio.run(load(throttle_every=2, fake_time=fake_time))
+
+    assert [trade.trade_id for trade in trades] == list(range(4_001))
+    assert fake_time.sleeps and all(seconds <= 3.0 for seconds in fake_time.sleeps)
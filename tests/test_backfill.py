@@ -0,0 +1,8 @@
+from data_processors.backfill import ShardedBackfill, live_processor
+
+
+def test_default_factory_splits_budgets_between_workers():
+    processor_factory = ShardedBackfill(max_workers=4)._processor_factory
+
+    assert processor_factory.func is live_processor
+    assert processor_factory.keywords == {'workers': 4}
@@ -0,0 +1,42 @@
+import sqlite3
+
+from data_loaders.cache import DiskCache
+
+PAGE = [{'a': trade_id, 'p': '100.0', 'q': '0.5', 'T': trade_id} for trade_id in range(100)]
+
+
+def total_bytes(path) -> tuple[int, int]:
+    with sqlite3.connect(path) as connection:
+        running, = connection.execute('SELECT bytes FROM total_size').fetchone()
+        summed, = connection.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()
+    return running, summed
+
+
+def test_running_size_follows_inserts_replaces_and_evictions(tmp_path):
+    path = tmp_path / 'responses.sqlite'
+    cache = DiskCache(path, max_bytes=10 ** 9)
+    for start_time in range(10):
+        cache.set(('aggTrades', 'BTCUSDT', start_time, start_time + 1), PAGE)
+    cache.set(('aggTrades', 'BTCUSDT', 0, 1), PAGE[:10])
+    running, summed = total_bytes(path)
+    assert running == summed > 0
+
+    # a smaller budget evicts the least recently used pages on the next set
+    cache = DiskCache(path, max_bytes=summed // 2)
+    assert cache.get(('aggTrades', 'BTCUSDT', 9, 10)) == PAGE
+    cache.set(('aggTrades', 'BTCUSDT', 10, 11), PAGE)
+    running, summed = total_bytes(path)
+    assert running == summed <= cache._max_bytes
+    assert cache.get(('aggTrades', 'BTCUSDT', 9, 10)) == PAGE
+    assert cache.get(('aggTrades', 'BTCUSDT', 1, 2)) is None
+
+
+def test_running_size_is_seeded_from_an_existing_cache(tmp_path):
+    path = tmp_path / 'responses.sqlite'
+    DiskCache(path).set(('aggTrades', 'BTCUSDT', 0, 1), PAGE)
+    with sqlite3.connect(path) as connection:
+        connection.execute('DROP TABLE total_size')
+
+    DiskCache(path)
+    running, summed = total_bytes(path)
+    assert running == summed > 0
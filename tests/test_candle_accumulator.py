@@ -0,0 +1,46 @@
+from data_loaders.models.compact_trade import CompactFutureTrade, CompactTrade
+from data_loaders.time_conversion import from_timestamp
+from data_processors.candle_accumulator import CandleAccumulator
+from tests.stubs import START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+
+
+def test_interleaved_markets_open_and_close_per_market():
+    accumulator = CandleAccumulator()
+    # the perp market opens before and closes after the spot one, spot trades come between them
+    for data in (
+        CompactFutureTrade(START_TIMESTAMP, 100, 200.0, 1.0, True),
+        CompactTrade(START_TIMESTAMP + 10, 0, 100.0, 0.5, False),
+        CompactFutureTrade(START_TIMESTAMP + 20, 101, 210.0, 1.0, False),
+        CompactTrade(START_TIMESTAMP + 30, 1, 90.0, 0.5, True),
+        CompactTrade(START_TIMESTAMP + 40, 2, 95.0, 0.5, False),
+        CompactFutureTrade(START_TIMESTAMP + 50, 102, 190.0, 2.0, True),
+    ):
+        accumulator.add(data)
+    candle = accumulator.close(START)
+
+    assert candle.timestamp == START
+    assert candle.open_timestamp == from_timestamp(START_TIMESTAMP)
+    assert candle.close_timestamp == from_timestamp(START_TIMESTAMP + 50)
+    assert (candle.open_spot, candle.high_spot, candle.low_spot, candle.close_spot) == (100.0, 100.0, 90.0, 95.0)
+    assert (candle.open_perp, candle.high_perp, candle.low_perp, candle.close_perp) == (200.0, 210.0, 190.0, 190.0)
+    assert (candle.trades_spot, candle.buy_trades_spot, candle.sell_trades_spot) == (3, 2, 1)
+    assert (candle.volume_perp, candle.buy_volume_perp, candle.sell_volume_perp) == (4.0, 1.0, 3.0)
+    assert (candle.trades_total, candle.buy_trades_total, candle.sell_trades_total) == (6, 3, 3)
+    assert candle.volume_total == 5.5
+
+
+def test_closing_starts_an_empty_candle():
+    accumulator = CandleAccumulator()
+    accumulator.add(CompactTrade(START_TIMESTAMP, 0, 100.0, 0.5, False))
+    accumulator.close(START)
+    accumulator.add(CompactFutureTrade(START_TIMESTAMP + 10, 100, 200.0, 1.0, True))
+    candle = accumulator.close(START)
+
+    assert candle.open_timestamp == candle.close_timestamp == from_timestamp(START_TIMESTAMP + 10)
+    assert candle.open_spot is candle.close_spot is candle.volume_spot is candle.trades_spot is None
+    assert candle.high_spot is candle.low_spot is None
+    assert (candle.open_perp, candle.close_perp, candle.sell_trades_perp, candle.buy_trades_perp) == (
+        200.0, 200.0, 1, None,
+    )
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+import numpy as np
+
+from data_loaders.time_conversion import from_timestamp
+from data_processors.models.candle_ring import CandleRingReader, INT_NULL
+from data_processors.sinks import SharedMemoryCandleSink
+from tests.stubs import candles
+
+
+def test_ring_round_trip(tmp_path):
+    path = tmp_path / 'candles_BTCUSDT'
+    written = candles(0, 5)
+    with SharedMemoryCandleSink(path, capacity=8) as sink:
+        reader = CandleRingReader(path)
+        sink.write_candles(written)
+        columns = reader.read_columns()
+
+    assert columns['trades_spot'].tolist() == [candle.trades_spot for candle in written]
+    # missing values are NaN in float columns and INT_NULL in int ones
+    assert np.isnan(columns['open_perp']).tolist() == [candle.open_perp is None for candle in written]
+    assert (columns['trades_perp'] == INT_NULL).tolist() == [candle.trades_perp is None for candle in written]
+    assert reader.read() == []
+    assert reader.lost == 0
+
+
+def test_ring_overrun_wraps_around_and_counts_lost_candles(tmp_path):
+    path = tmp_path / 'candles_BTCUSDT'
+    with SharedMemoryCandleSink(path, capacity=8) as sink:
+        reader = CandleRingReader(path)
+        sink.write_candles(candles(0, 5))
+        assert reader.read_columns()['trades_spot'].tolist() == list(range(5))
+        # 13 more candles overrun the 8 slots, the 5 oldest unread ones are overwritten
+        sink.write_candles(candles(5, 13))
+        columns = reader.read_columns()
+
+    assert reader.lost == 5
+    assert reader.published == 18
+    # the read starts in slot 2 and wraps around the end of the ring
+    assert columns['trades_spot'].tolist() == list(range(10, 18))
+    assert columns['timestamp'].tolist() == [
+        (candle.timestamp - from_timestamp(0)) // timedelta(microseconds=1) for candle in candles(10, 8)
+    ]
+    assert CandleRingReader(path, from_oldest=True).read() == candles(10, 8)
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+import pytest
+
+import cli
+from data_loaders.clients import SpotClient, PerpClient, OpenInterestClient, FundingRateClient
+from data_loaders.store import ColumnarStore
+from data_loaders.time_conversion import from_timestamp
+from tests.stubs import StubBinanceClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+
+
+def test_unknown_dataset_is_a_usage_error(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(['process', '--source', 'recorded', '--dataset', 'nope'])
+
+    assert exit_info.value.code == 2
+    assert "invalid choice: 'nope' (choose from 1d, 1h, 30d)" in capsys.readouterr().err
+
+
+def test_load_writes_compact_trades_to_the_store(tmp_path, monkeypatch):
+    client = StubBinanceClient(count=5_000)
+    monkeypatch.setattr(cli, 'api_clients', lambda: {
+        'spot': SpotClient(client=client, compact=True),
+        'perp': PerpClient(client=client, compact=True),
+        'open_interest': OpenInterestClient(client=client),
+        'funding_rate': FundingRateClient(client=client),
+    })
+
+    cli.main([
+        'load', '--store', str(tmp_path / 'store'), '--checkpoints', str(tmp_path / 'checkpoints'),
+        '--start', START.isoformat(), '--end', (START + timedelta(minutes=10)).isoformat(),
+    ])
+
+    store = ColumnarStore(root=tmp_path / 'store')
+    for source in ('spot', 'perp'):
+        table = store.read(source, 'BTCUSDT', START_TIMESTAMP, START_TIMESTAMP + 10 * 60 * 1000)
+        assert table.column('trade_id').to_pylist() == list(range(5_000))
@@ -0,0 +1,91 @@
+import pytest
+from binance.exceptions import BinanceAPIException
+
+from data_loaders import rate_limit
+from data_loaders.clients import SpotClient
+from data_loaders.rate_limit import RequestScheduler
+from tests.stubs import FakeTime
+
+PAGE = [{'a': 1, 'p': '100.0', 'q': '0.5', 'f': 1, 'l': 1, 'T': 1726124400000, 'm': True, 'M': True}]
+
+
+class Response:
+    def __init__(self, headers: dict):
+        self.headers = headers
+        self.text = ''
+
+
+class ThrottledBinanceClient:
+    """
+    Answers `get_aggregate_trades` with the given error responses before the page, throttling ones by default
+    """
+    def __init__(
+            self, *responses: Response, status_code: int = 429,
+            body: str = '{"code": -1003, "msg": "Too many requests"}',
+    ):
+        self._responses = list(responses)
+        self._status_code = status_code
+        self._body = body
+        self.calls = 0
+
+    def get_aggregate_trades(self, **params) -> list[dict]:
+        self.calls += 1
+        if self._responses:
+            raise BinanceAPIException(self._responses.pop(0), self._status_code, self._body)
+        return PAGE
+
+
+@pytest.fixture
+def fake_time(monkeypatch) -> FakeTime:
+    fake_time = FakeTime()
+    monkeypatch.setattr(rate_limit, '_default_scheduler', RequestScheduler(clock=fake_time.clock, sleep=fake_time.sleep))
+    return fake_time
+
+
+def test_default_client_retries_throttled_request(fake_time):
+    binance_client = ThrottledBinanceClient(Response({}))
+    trades = SpotClient(client=binance_client).get('BTCUSDT', 1726124400000, 1726124460000)
+
+    assert [trade.trade_id for trade in trades] == [1]
+    assert binance_client.calls == 2
+    assert len(fake_time.sleeps) <= 1
+
+
+def test_retry_after_is_honoured(fake_time):
+    binance_client = ThrottledBinanceClient(Response({'Retry-After': '7'}))
+    trades = SpotClient(client=binance_client).get_from_id('BTCUSDT', 1)
+
+    assert [trade.trade_id for trade in trades] == [1]
+    assert binance_client.calls == 2
+    assert fake_time.sleeps == [7.0]
+
+
+def test_transient_server_errors_are_retried(fake_time):
+    binance_client = ThrottledBinanceClient(
+        Response({}), Response({}), status_code=503,
+        body='{"code": -1001, "msg": "Internal error; unable to process your request. Please try again."}',
+    )
+    trades = SpotClient(client=binance_client).get('BTCUSDT', 1726124400000, 1726124460000)
+
+    assert [trade.trade_id for trade in trades] == [1]
+    assert binance_client.calls == 3
+    assert len(fake_time.sleeps) <= 2
+
+
+def test_client_errors_are_raised(fake_time):
+    binance_client = ThrottledBinanceClient(
+        Response({}), status_code=400, body='{"code": -1121, "msg": "Invalid symbol."}',
+    )
+    with pytest.raises(BinanceAPIException, match='Invalid symbol'):
+        SpotClient(client=binance_client).get('BTCUSDT', 1726124400000, 1726124460000)
+
+    assert binance_client.calls == 1
+    assert fake_time.sleeps == []
+
+
+def test_server_error_retries_are_bounded(fake_time):
+    binance_client = ThrottledBinanceClient(*(Response({}) for _ in range(20)), status_code=502, body='Bad Gateway')
+    with pytest.raises(BinanceAPIException):
+        SpotClient(client=binance_client).get('BTCUSDT', 1726124400000, 1726124460000)
+
+    assert binance_client.calls == 9
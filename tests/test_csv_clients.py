@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+import pytest
+
+from data_loaders import csv_clients
+from data_loaders.csv_clients import CsvSpotClient
+from data_loaders.loader import save_csv
+from data_loaders.models.trade import Trade
+from data_loaders.time_conversion import from_timestamp
+from tests.stubs import START_TIMESTAMP
+
+# one trade every 100 ms, ids are even so that some requested ids fall between trades
+COUNT = 5_000
+FIRST_ID = 1_000
+LAST_TIMESTAMP = START_TIMESTAMP + (COUNT - 1) * 100
+
+
+@pytest.fixture(params=[1, csv_clients.SCAN_BYTES], ids=['bisect', 'scan'])
+def trades_csv(request, tmp_path, monkeypatch):
+    # a single byte scan window bisects down to the line, the default one bisects and then reads lines
+    monkeypatch.setattr(csv_clients, 'SCAN_BYTES', request.param)
+    path = tmp_path / 'spot.csv'
+    save_csv((
+        Trade(
+            trade_id=FIRST_ID + 2 * index, price=100.0 + index % 7, quantity=0.5,
+            timestamp=from_timestamp(START_TIMESTAMP + index * 100), is_buyer_maker=index % 2 == 0,
+        )
+        for index in range(COUNT)
+    ), path)
+    return path
+
+
+def trade_ids(trades) -> list[int]:
+    return [trade.trade_id for trade in trades]
+
+
+def test_window_before_the_first_row(trades_csv):
+    client = CsvSpotClient(trades_csv)
+
+    assert trade_ids(client.get('BTCUSDT', START_TIMESTAMP - 10_000, START_TIMESTAMP - 1)) == []
+    assert trade_ids(client.get('BTCUSDT', START_TIMESTAMP - 10_000, START_TIMESTAMP + 250)) == [1_000, 1_002, 1_004]
+
+
+def test_window_after_the_last_row(trades_csv):
+    client = CsvSpotClient(trades_csv)
+
+    assert trade_ids(client.get('BTCUSDT', LAST_TIMESTAMP + 1, LAST_TIMESTAMP + 10_000)) == []
+    assert trade_ids(client.get('BTCUSDT', LAST_TIMESTAMP - 100, LAST_TIMESTAMP + 10_000)) == [10_996, 10_998]
+
+
+def test_window_between_rows(trades_csv):
+    client = CsvSpotClient(trades_csv)
+    middle = START_TIMESTAMP + 2_500 * 100
+
+    # starts and ends between two trades
+    assert trade_ids(client.get('BTCUSDT', middle + 50, middle + 250)) == [6_002, 6_004]
+    # falls between two trades
+    assert trade_ids(client.get('BTCUSDT', middle + 10, middle + 90)) == []
+
+
+def test_window_is_limited_like_a_page(trades_csv):
+    trades = list(CsvSpotClient(trades_csv, limit=1_000).get('BTCUSDT', START_TIMESTAMP + 1_234 * 100, LAST_TIMESTAMP))
+
+    assert trade_ids(trades) == list(range(FIRST_ID + 2 * 1_234, FIRST_ID + 2 * 2_234, 2))
+    assert trades[0].timestamp == from_timestamp(START_TIMESTAMP) + timedelta(milliseconds=1_234 * 100)
+
+
+def test_get_from_id(trades_csv):
+    client = CsvSpotClient(trades_csv, limit=3)
+
+    assert trade_ids(client.get_from_id('BTCUSDT', 0)) == [1_000, 1_002, 1_004]
+    assert trade_ids(client.get_from_id('BTCUSDT', 4_321)) == [4_322, 4_324, 4_326]
+    assert trade_ids(client.get_from_id('BTCUSDT', 4_322)) == [4_322, 4_324, 4_326]
+    assert trade_ids(client.get_from_id('BTCUSDT', 10_998)) == [10_998]
+    assert trade_ids(client.get_from_id('BTCUSDT', 11_000)) == []
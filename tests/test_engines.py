@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+import pytest
+
+from data_loaders.models.compact_trade import CompactFutureTrade
+from data_loaders.time_conversion import from_timestamp
+from data_processors.candle_filler import CandleFiller
+from data_processors.lazy import LazyCandleProcessor
+from data_processors.numpy_engine import NumpyCandleProcessor
+from data_processors.pandas_dataframe import PandasCandleProcessor
+from tests.stubs import EmptyClient, StubTradeClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+END = START + timedelta(minutes=15, milliseconds=-1)
+COMPARED_FIELDS = tuple(
+    f'{name}_{market}'
+    for market in ('spot', 'perp')
+    for name in (
+        'open', 'high', 'low', 'close', 'volume', 'buy_volume', 'sell_volume', 'trades', 'buy_trades', 'sell_trades',
+    )
+) + tuple(
+    f'{name}_total'
+    for name in ('volume', 'buy_volume', 'sell_volume', 'trades', 'buy_trades', 'sell_trades')
+) + ('timestamp', 'open_timestamp', 'close_timestamp')
+
+
+def process(processor_class, **arguments) -> list[dict]:
+    candles = processor_class(
+        # every third trade is a buyer maker one so that mixed up sides change the candles
+        spot_client=StubTradeClient(count=9_000, step=100, buyer_maker_every=3),
+        perp_client=StubTradeClient(count=6_000, step=150, trade_class=CompactFutureTrade, buyer_maker_every=3),
+        open_interest_client=EmptyClient(),
+        funding_rate_client=EmptyClient(),
+        symbol='BTCUSDT',
+        **arguments,
+    ).process(start_time=START, end_time=END)
+    if processor_class is LazyCandleProcessor:
+        return [{name: getattr(candle, name) for name in COMPARED_FIELDS} for candle in candles]
+    return candles[list(COMPARED_FIELDS)].to_dict('records')
+
+
+def test_engines_build_the_same_candles():
+    lazy_candles = process(LazyCandleProcessor, candle_filler=CandleFiller())
+
+    assert len(lazy_candles) == 3
+    for candle in lazy_candles:
+        # a trade with buyer maker is a sell of the taker
+        assert candle['buy_trades_spot'] == 2 * candle['sell_trades_spot']
+        assert candle['buy_volume_total'] > candle['sell_volume_total']
+    assert process(PandasCandleProcessor) == pytest.approx(lazy_candles)
+    assert process(NumpyCandleProcessor) == pytest.approx(lazy_candles)
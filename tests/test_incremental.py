@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from data_loaders.clients import IFromIdClient
+from data_loaders.time_conversion import from_timestamp
+from data_processors.incremental import IncrementalCandleRunner, _resuming_client
+from tests.stubs import EmptyClient, StubTradeClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+
+
+def test_incremental_runs_page_by_id(tmp_path):
+    # a trade every 100 ms, the first five minutes hold trades 0 to 2999
+    spot_client = StubTradeClient(count=5_000, step=100)
+    runner = IncrementalCandleRunner(
+        spot_client=spot_client,
+        perp_client=StubTradeClient(count=4_000, step=100),
+        open_interest_client=EmptyClient(),
+        funding_rate_client=EmptyClient(),
+        state_path=tmp_path / 'state.json',
+        output_path=tmp_path / 'candles.csv',
+    )
+
+    assert runner.run(start_time=START, end_time=START + timedelta(minutes=5)) == 1
+    assert runner.load_watermark().last_trade_ids == {'spot': 2_999, 'perp': 2_999}
+    assert runner.run(start_time=START, end_time=START + timedelta(minutes=10)) == 1
+    assert runner.load_watermark().last_trade_ids == {'spot': 4_999, 'perp': 3_999}
+    assert spot_client.requests[0][0] == 'get' and spot_client.requests[-1][0] == 'get_from_id'
+
+
+def test_resuming_client_skips_processed_trades_by_id():
+    client = _resuming_client(StubTradeClient(count=3_000), 1_499, from_timestamp(START_TIMESTAMP + 2_500))
+
+    assert isinstance(client, IFromIdClient)
+    assert [trade.trade_id for trade in client.get_from_id('BTCUSDT', 1_000)] == list(range(1_500, 2_000))
+    assert client.last_trade_id == 1_999
+    assert not isinstance(_resuming_client(EmptyClient(), None, START), IFromIdClient)
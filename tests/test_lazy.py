@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from data_loaders.time_conversion import from_timestamp
+from data_processors.candle_filler import CandleFiller
+from data_processors.lazy import LazyCandleProcessor
+from tests.stubs import EmptyClient, StubTradeClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+END = START + timedelta(minutes=35, milliseconds=-1)
+# one trade a second for 10 minutes, then 15 minutes without trades, then 10 minutes of trades again
+GAP = (600, 15 * 60 * 1000)
+
+
+def process(gap_policy: str) -> list:
+    return list(LazyCandleProcessor(
+        spot_client=StubTradeClient(count=1_200, step=1_000, gap=GAP),
+        perp_client=EmptyClient(),
+        open_interest_client=EmptyClient(),
+        funding_rate_client=EmptyClient(),
+        candle_filler=CandleFiller(),
+        gap_policy=gap_policy,
+    ).process(start_time=START, end_time=END))
+
+
+def test_skip_leaves_empty_buckets_out():
+    candles = process('skip')
+
+    assert [candle.timestamp - START for candle in candles] == [timedelta(minutes=minutes) for minutes in (0, 5, 25, 30)]
+    assert [candle.trades_spot for candle in candles] == [300] * 4
+    assert candles[2].open_timestamp == START + timedelta(minutes=25)
+
+
+def test_ffill_yields_empty_buckets_with_the_last_close():
+    candles = process('ffill')
+
+    assert [candle.timestamp - START for candle in candles] == [timedelta(minutes=minutes) for minutes in range(0, 35, 5)]
+    assert [candle.trades_spot for candle in candles] == [300, 300, None, None, None, 300, 300]
+    last_close = candles[1].close_spot
+    for candle in candles[2:5]:
+        assert (candle.open_spot, candle.high_spot, candle.low_spot, candle.close_spot) == (last_close,) * 4
+        assert candle.volume_total is candle.open_timestamp is candle.close_timestamp is None
+    assert candles[5].open_spot == 100.0 + 600 % 7
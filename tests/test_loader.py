@@ -0,0 +1,33 @@
+from datetime import timedelta
+from itertools import islice
+
+from data_loaders.checkpoint import CheckpointStore
+from data_loaders.loader import Loader
+from data_loaders.time_conversion import from_timestamp
+from tests.stubs import StubTradeClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+END = START + timedelta(seconds=20)
+
+
+def test_load_pages_by_id():
+    client = StubTradeClient(count=5_000)
+    trades = list(Loader(data_client=client).load(start_time=START, end_time=END))
+
+    assert [trade.trade_id for trade in trades] == list(range(5_000))
+    assert client.requests[0][0] == 'get'
+    assert all(request[0] == 'get_from_id' for request in client.requests[1:])
+
+
+def test_closed_load_resumes_without_duplicates(tmp_path):
+    checkpoints = CheckpointStore(root=tmp_path)
+    client = StubTradeClient(count=20_000)
+
+    interrupted = Loader(data_client=client, checkpoints=checkpoints).load(start_time=START, end_time=END)
+    first_part = list(islice(interrupted, 2_500))
+    interrupted.close()
+    resumed = list(Loader(data_client=client, checkpoints=checkpoints).load(start_time=START, end_time=END))
+
+    trade_ids = [trade.trade_id for trade in first_part + resumed]
+    assert trade_ids == list(range(20_000))
+    assert not list(tmp_path.rglob('*.json'))
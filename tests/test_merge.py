@@ -0,0 +1,66 @@
+from data_loaders.merge import merge_sources
+from data_loaders.models.compact_trade import CompactTrade
+from tests.stubs import START_TIMESTAMP
+
+
+def trades(*offsets: int, first_id: int = 0) -> list[CompactTrade]:
+    return [
+        CompactTrade(START_TIMESTAMP + offset, trade_id, 100.0, 0.5, False)
+        for trade_id, offset in enumerate(offsets, start=first_id)
+    ]
+
+
+def test_sources_are_merged_in_timestamp_order():
+    merged = list(merge_sources({
+        'spot': trades(0, 10, 20, 30, 31, 32),
+        'perp': trades(5, 15, 40, first_id=100),
+        'empty': [],
+    }))
+
+    assert [timestamp - START_TIMESTAMP for timestamp, _, _ in merged] == [0, 5, 10, 15, 20, 30, 31, 32, 40]
+    assert [(source, data.trade_id) for _, source, data in merged][-2:] == [('spot', 5), ('perp', 102)]
+
+
+def test_equal_timestamps_come_in_source_order():
+    merged = merge_sources({
+        'perp': trades(0, 10, 10, first_id=100),
+        'spot': trades(10, 10, 20),
+        'funding': trades(0, 20, first_id=200),
+    })
+
+    assert [(source, data.trade_id) for _, source, data in merged] == [
+        ('perp', 100), ('funding', 200), ('perp', 101), ('perp', 102), ('spot', 0), ('spot', 1),
+        ('spot', 2), ('funding', 201),
+    ]
+
+
+def test_closing_the_stream_closes_the_sources():
+    closed = []
+
+    def source(name: str, *offsets: int):
+        try:
+            yield from trades(*offsets)
+        finally:
+            closed.append(name)
+
+    merged = merge_sources({'spot': source('spot', 0, 10, 20), 'perp': source('perp', 5, 15)})
+    assert next(merged)[1] == 'spot'
+    assert next(merged)[1] == 'perp'
+    merged.close()
+
+    assert sorted(closed) == ['perp', 'spot']
+
+
+def test_exhausted_sources_are_closed():
+    closed = []
+
+    def source(name: str, *offsets: int):
+        try:
+            yield from trades(*offsets)
+        finally:
+            closed.append(name)
+
+    merged = list(merge_sources({'spot': source('spot', 0, 10), 'perp': source('perp', 5)}))
+
+    assert len(merged) == 3
+    assert sorted(closed) == ['perp', 'spot']
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+import pytest
+
+from data_loaders.metrics import CANDLE_AGGREGATE_SECONDS, CANDLES_TOTAL
+from data_loaders.time_conversion import from_timestamp
+from data_processors.candle_filler import CandleFiller
+from data_processors.lazy import LazyCandleProcessor
+from data_processors.numpy_engine import NumpyCandleProcessor
+from data_processors.pandas_dataframe import PandasCandleProcessor
+from tests.stubs import EmptyClient, StubTradeClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+END = START + timedelta(minutes=10, milliseconds=-1)
+
+
+@pytest.mark.parametrize('engine, processor_class, arguments', [
+    ('lazy', LazyCandleProcessor, {'candle_filler': CandleFiller()}),
+    ('pandas', PandasCandleProcessor, {}),
+    ('numpy', NumpyCandleProcessor, {}),
+])
+def test_aggregation_is_timed_apart_from_loading(engine, processor_class, arguments):
+    symbol = f'{engine.upper()}METRICS'
+    processor = processor_class(
+        spot_client=StubTradeClient(count=5_000, step=100),
+        perp_client=StubTradeClient(count=5_000, step=100),
+        open_interest_client=EmptyClient(),
+        funding_rate_client=EmptyClient(),
+        symbol=symbol,
+        **arguments,
+    )
+    candles = processor.process(start_time=START, end_time=END)
+    count = len(list(candles)) if engine == 'lazy' else len(candles)
+
+    aggregate_seconds = CANDLE_AGGREGATE_SECONDS.labels(processor=engine, symbol=symbol)
+    # one observation per candle for the lazy processor, one per window for the dataframe engines
+    assert sum(aggregate_seconds.counts) == (count if engine == 'lazy' else 1)
+    assert aggregate_seconds.sum > 0
+    assert CANDLES_TOTAL.labels(processor=engine, symbol=symbol).value == count == 2
@@ -0,0 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from data_loaders.time_conversion import from_timestamp
+from data_processors.numpy_engine import NumpyCandleProcessor
+from tests.stubs import EmptyClient, StubTradeClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+
+
+def test_numpy_processor_loads_its_symbol():
+    spot_client, perp_client = StubTradeClient(count=5_000, step=100), StubTradeClient(count=5_000, step=100)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        candles = NumpyCandleProcessor(
+            spot_client=spot_client,
+            perp_client=perp_client,
+            open_interest_client=EmptyClient(),
+            funding_rate_client=EmptyClient(),
+            symbol='ETHUSDT',
+            executor=executor,
+        ).process(start_time=START, end_time=START + timedelta(minutes=10, milliseconds=-1))
+
+    assert len(candles) == 2
+    assert {request[1] for request in spot_client.requests + perp_client.requests} == {'ETHUSDT'}
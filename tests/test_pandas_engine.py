@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from data_loaders.time_conversion import from_timestamp
+from data_processors.pandas_dataframe import PandasCandleProcessor
+from tests.stubs import EmptyClient, StubTradeClient, START_TIMESTAMP
+
+START = from_timestamp(START_TIMESTAMP)
+END = START + timedelta(minutes=35, milliseconds=-1)
+# one trade a second for 10 minutes, then 15 minutes without trades, then 10 minutes of trades again
+GAP = (600, 15 * 60 * 1000)
+
+
+def processor() -> PandasCandleProcessor:
+    return PandasCandleProcessor(
+        spot_client=StubTradeClient(count=1_200, step=1_000, gap=GAP),
+        perp_client=StubTradeClient(count=2_100, step=1_000),
+        open_interest_client=EmptyClient(),
+        funding_rate_client=EmptyClient(),
+    )
+
+
+def test_chunks_add_up_to_the_whole_window():
+    candles = processor().process(start_time=START, end_time=END)
+    # chunks of 15 minutes, the first boundary falls in the gap of the spot trades
+    chunks = list(processor().process_chunks(start_time=START, end_time=END, chunk_candles=3))
+
+    assert len(chunks) == 3
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), candles, check_dtype=False)
@@ -0,0 +1,18 @@
+import pytest
+
+from data_processors.models.candles import Candle
+from data_processors.sinks import ArrowCandleSink, read_candles
+from tests.stubs import candles
+
+
+@pytest.mark.parametrize('format', ['ipc', 'stream', 'parquet'])
+def test_arrow_sink_round_trip(tmp_path, format):
+    written = candles(0, 10)
+    path = tmp_path / f'candles.{format}'
+    # batches of 4 candles leave a partial batch for close
+    with ArrowCandleSink(path, format=format, batch_size=4) as sink:
+        sink.write_candles(written)
+
+    table = read_candles(path, format=format)
+    assert sink.written == table.num_rows == 10
+    assert [Candle(**row) for row in table.to_pylist()] == written
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+from data_loaders.models.compact_trade import CompactTrade
+from data_loaders.models.trade import Trade
+from data_loaders.store import ColumnarStore, MS_PER_DAY
+from data_loaders.time_conversion import from_timestamp
+
+# 10 trades per second, the first written window starts an hour before midnight
+FIRST_TIMESTAMP = 19_978 * MS_PER_DAY - 60 * 60 * 1000
+
+
+def trades(first_id: int, count: int) -> list[Trade]:
+    return [
+        Trade(
+            trade_id=trade_id, price=100.0 + trade_id % 7, quantity=0.5,
+            timestamp=from_timestamp(FIRST_TIMESTAMP + trade_id * 100), is_buyer_maker=trade_id % 2 == 0,
+        )
+        for trade_id in range(first_id, first_id + count)
+    ]
+
+
+def test_overlapping_writes_are_merged(tmp_path):
+    store = ColumnarStore(root=tmp_path, batch_size=1_000)
+    store.write('spot', 'BTCUSDT', trades(0, 30_000))
+    # crosses midnight like the first write and covers a part of it again
+    store.write('spot', 'BTCUSDT', trades(20_000, 20_000))
+    store.write('spot', 'BTCUSDT', trades(5_000, 1_000))
+
+    table = store.read('spot', 'BTCUSDT', FIRST_TIMESTAMP, FIRST_TIMESTAMP + 40_000 * 100)
+    assert table.column('trade_id').to_pylist() == list(range(40_000))
+
+    index = store.read_index('spot', 'BTCUSDT').to_pylist()
+    stored_parts = {part.relative_to(tmp_path).as_posix() for part in tmp_path.rglob('part-*')}
+    assert {entry['path'] for entry in index} == stored_parts
+    assert len(stored_parts) == 2
+    assert sum(entry['rows'] for entry in index) == 40_000
+    assert all(previous['last_timestamp'] < entry['first_timestamp'] for previous, entry in zip(index, index[1:]))
+
+
+def test_window_read_after_overlapping_write(tmp_path):
+    store = ColumnarStore(root=tmp_path, batch_size=1_000)
+    store.write('spot', 'BTCUSDT', trades(0, 20_000))
+    store.write('spot', 'BTCUSDT', trades(10_000, 10_000))
+
+    start_time, end_time = FIRST_TIMESTAMP + 12_345 * 100, FIRST_TIMESTAMP + 15_000 * 100
+    table = store.read('spot', 'BTCUSDT', start_time, end_time)
+    assert table.column('trade_id').to_pylist() == list(range(12_345, 15_001))
+
+
+def test_compact_trades_round_trip(tmp_path):
+    store = ColumnarStore(root=tmp_path, batch_size=1_000)
+    compact_trades = [
+        CompactTrade(FIRST_TIMESTAMP + trade_id * 100, trade_id, 100.0 + trade_id % 7, 0.5, trade_id % 2 == 0)
+        for trade_id in range(3_000)
+    ]
+    assert store.write('spot', 'BTCUSDT', compact_trades) == 3_000
+
+    table = store.read('spot', 'BTCUSDT', FIRST_TIMESTAMP, FIRST_TIMESTAMP + 3_000 * 100)
+    assert [CompactTrade(*row) for row in zip(*(
+        table.column(name).to_pylist() for name in CompactTrade._fields
+    ))] == compact_trades
+    assert set(table.column('first_trade_id').to_pylist()) == {0}
+    assert set(table.column('is_best_price_match').to_pylist()) == {False}
+
+
+def test_error_inside_a_row_keeps_taken_rows(tmp_path):
+    store = ColumnarStore(root=tmp_path, batch_size=1_000)
+
+    def data():
+        yield from trades(0, 1_500)
+        # price is missing
+        yield SimpleNamespace(timestamp=from_timestamp(FIRST_TIMESTAMP + 1_500 * 100), trade_id=1_500, quantity=0.5)
+
+    with pytest.raises(AttributeError, match='price'):
+        store.write('spot', 'BTCUSDT', data())
+
+    table = store.read('spot', 'BTCUSDT', FIRST_TIMESTAMP, FIRST_TIMESTAMP + 2_000 * 100)
+    assert table.column('trade_id').to_pylist() == list(range(1_500))
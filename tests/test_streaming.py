@@ -0,0 +1,94 @@
+import asyncio
+from datetime import timedelta
+
+from data_loaders.feeds import QueueFeed
+from data_loaders.models.compact_trade import CompactTrade
+from data_loaders.time_conversion import from_timestamp
+from data_processors.candle_filler import CandleFiller
+from data_processors.streaming import StreamingCandleProcessor
+from tests.stubs import START_TIMESTAMP
+
+INTERVAL = 5 * 60 * 1000
+
+
+def trade(offset: int, trade_id: int) -> CompactTrade:
+    return CompactTrade(START_TIMESTAMP + offset, trade_id, 100.0 + trade_id, 0.5, False)
+
+
+async def settle():
+    # lets the pump of the processor and the consumer take everything put so far
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+async def stream(processor: StreamingCandleProcessor, candles: list):
+    async for candle in processor.process():
+        candles.append(candle)
+
+
+async def replay() -> tuple[StreamingCandleProcessor, list[list]]:
+    feed = QueueFeed()
+    processor = StreamingCandleProcessor(
+        feed=feed, candle_filler=CandleFiller(), lateness=timedelta(seconds=1), clock=None, symbol='STREAMING',
+    )
+    candles = []
+    consumer = asyncio.create_task(stream(processor, candles))
+    emitted = []
+    for data in (
+        trade(1_000, 0),
+        trade(INTERVAL - 1_000, 1),
+        # opens the next bucket but the watermark is still within the lateness of the first one
+        trade(INTERVAL + 500, 2),
+        # out of order but within the lateness, taken by the first bucket
+        trade(INTERVAL - 500, 3),
+        # moves the watermark past the lateness of the first bucket
+        trade(INTERVAL + 1_500, 4),
+        # the first bucket is closed, the trade is dropped
+        trade(100, 5),
+    ):
+        await feed.put(data)
+        await settle()
+        emitted.append(list(candles))
+    await feed.close()
+    await consumer
+    emitted.append(candles)
+    return processor, emitted
+
+
+def test_buckets_are_closed_by_the_watermark_after_the_lateness():
+    processor, emitted = asyncio.run(replay())
+
+    assert [len(candles) for candles in emitted] == [0, 0, 0, 0, 1, 1, 2]
+    first, second = emitted[-1]
+    assert first.timestamp == from_timestamp(START_TIMESTAMP)
+    assert (first.trades_spot, first.open_spot, first.close_spot) == (3, 100.0, 103.0)
+    assert first.close_timestamp == from_timestamp(START_TIMESTAMP + INTERVAL - 500)
+    assert second.timestamp == from_timestamp(START_TIMESTAMP + INTERVAL)
+    assert second.trades_spot == 2
+    assert processor.late_count == 1
+
+
+async def quiet_feed() -> tuple[StreamingCandleProcessor, list]:
+    feed = QueueFeed()
+    # the clock is already past the end of the first bucket and its lateness
+    now = from_timestamp(START_TIMESTAMP + INTERVAL + 2_000)
+    processor = StreamingCandleProcessor(
+        feed=feed, candle_filler=CandleFiller(), lateness=timedelta(seconds=1), clock=lambda: now,
+        symbol='STREAMING',
+    )
+    candles = []
+    consumer = asyncio.create_task(stream(processor, candles))
+    await feed.put(trade(1_000, 0))
+    await settle()
+    emitted = len(candles)
+    await feed.put(trade(2_000, 1))
+    await feed.close()
+    await consumer
+    return processor, [emitted, len(candles)]
+
+
+def test_clock_closes_buckets_of_a_quiet_feed():
+    processor, emitted = asyncio.run(quiet_feed())
+
+    assert emitted == [1, 1]
+    assert processor.late_count == 1